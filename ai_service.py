@@ -0,0 +1,248 @@
+"""Moondream2 inference service: one model process fed by a request queue.
+
+The indexer submits (request_id, image_path, tasks) and keeps indexing;
+the service process owns the model, works through the queue and hands
+back results that the indexer applies when it next polls. Requests are
+answered one at a time: llama-cpp-python's chat API evaluates a single
+conversation per call, so there is no batched inference. Every prompt for
+one image runs back to back on the same image bytes; llama-cpp-python
+releases whose Llava chat handler keeps the last image's embedding then
+encode it once, older ones encode it per prompt.
+
+The prompt and parsing helpers are also used by sort_screenshots for
+in-process inference (video frames, SCREENSORT_AI_SERVICE=0).
+"""
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import queue
+
+CATEGORIZE = "categorize"
+OCR = "ocr"
+# Bump when a prompt or its parsing changes; invalidates cached AI results
+PROMPT_VERSION = 1
+
+
+def load_model(model_path, mmproj_path, threads):
+    """Load Moondream2 with a fixed thread budget. Returns None if unavailable."""
+    if not os.path.exists(model_path):
+        logging.warning(f"AI model not found at {model_path}. "
+                        "Run download_model.py first.")
+        return None
+    try:
+        from llama_cpp import Llama
+        from llama_cpp.llama_chat_format import MoondreamChatHandler
+        logging.info("Loading Moondream2 Model... (This may take a moment)")
+        chat_handler = MoondreamChatHandler(clip_model_path=mmproj_path)
+        llm = Llama(
+            model_path=model_path,
+            chat_handler=chat_handler,
+            n_ctx=2048,
+            n_gpu_layers=0,
+            n_threads=threads,
+            n_threads_batch=threads,
+            verbose=False
+        )
+        logging.info(f"Moondream2 loaded successfully ({threads} threads).")
+        return llm
+    except ImportError:
+        logging.warning("llama-cpp-python not installed. AI features disabled.")
+        return None
+    except Exception as e:
+        logging.error(f"Failed to load LLM: {e}")
+        return None
+
+
+def image_data_uri(image_path):
+    """Base64 data URI for an image file."""
+    with open(image_path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode('utf-8')
+    ext = os.path.splitext(image_path)[1].lower().replace('.', '')
+    if ext == 'jpg':
+        ext = 'jpeg'
+    return f"data:image/{ext};base64,{encoded}"
+
+
+def pil_data_uri(image, quality=85):
+    """Base64 JPEG data URI for an in-memory PIL image (e.g. a video frame)."""
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode('ascii')
+
+
+def list_objects(llm, data_uri):
+    """Comma-separated objects, people and activities in a video frame."""
+    messages = [
+        {"role": "system",
+         "content": "You identify objects and activities in video frames."},
+        {"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": data_uri}},
+            {"type": "text",
+             "text": "List main objects, people, activities. Comma-separated."}
+        ]}
+    ]
+
+    response = llm.create_chat_completion(messages=messages, max_tokens=80)
+    return response["choices"][0]["message"]["content"]
+
+
+def categorize(llm, data_uri, valid_cats):
+    """Ask for a category from valid_cats and a one-line summary."""
+    cat_list = ", ".join(valid_cats)
+    messages = [
+        {"role": "system",
+         "content": "You are a helpful assistant that categorizes screenshots."},
+        {"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": data_uri}},
+            {"type": "text",
+             "text": f"Analyze this image. Provide a Category from: [{cat_list}]. "
+                     "Then a one-sentence summary. "
+                     "Format: 'Category: <Category> | Summary: <Summary>'"}
+        ]}
+    ]
+
+    response = llm.create_chat_completion(messages=messages, max_tokens=100)
+    content = response["choices"][0]["message"]["content"]
+
+    if "Category:" in content:
+        category = content.split("Category:")[1].split("|")[0].strip()
+        if category not in valid_cats:
+            category = "Unsorted"
+        summary = (content.split("Summary:")[1].strip()
+                   if "Summary:" in content else content)
+    else:
+        category = "Unsorted"
+        summary = content
+    return category, summary
+
+
+def extract_text(llm, data_uri):
+    """Transcribe all visible text."""
+    messages = [
+        {"role": "system",
+         "content": "You are an OCR assistant. Extract ALL visible text accurately."},
+        {"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": data_uri}},
+            {"type": "text",
+             "text": "Read and transcribe ALL text visible in this image. "
+                     "Include every word, number, and symbol. Be thorough."}
+        ]}
+    ]
+
+    response = llm.create_chat_completion(messages=messages, max_tokens=500)
+    return response["choices"][0]["message"]["content"].strip()
+
+
+def run_tasks(llm, image_path, tasks, valid_cats):
+    """Run the requested prompts on one image, back to back.
+
+    Returns a dict with "category"/"summary" and/or "text"; failed tasks
+    are left out.
+    """
+    result = {}
+    try:
+        data_uri = image_data_uri(image_path)
+    except OSError as e:
+        logging.error(f"AI analysis failed for {image_path}: {e}")
+        return result
+    if CATEGORIZE in tasks:
+        try:
+            result["category"], result["summary"] = categorize(llm, data_uri, valid_cats)
+        except Exception as e:
+            logging.error(f"AI analysis failed for {image_path}: {e}")
+    if OCR in tasks:
+        try:
+            result["text"] = extract_text(llm, data_uri)
+        except Exception as e:
+            logging.error(f"AI text extraction failed for {image_path}: {e}")
+    return result
+
+
+def _serve(requests, results, model_path, mmproj_path, threads):
+    """Service process main loop."""
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - [ai] %(message)s')
+    llm = load_model(model_path, mmproj_path, threads)
+    results.put(("ready", llm is not None))
+    if llm is None:
+        return
+
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        request_id, image_path, tasks, valid_cats = request
+        results.put(("result", request_id,
+                     run_tasks(llm, image_path, tasks, valid_cats)))
+
+
+class InferenceService:
+    """Client side of the model process.
+
+    submit() never blocks on inference; poll() returns finished
+    (request_id, result) pairs. At most max_pending requests are in
+    flight, so the queue never holds more work than the indexer can
+    re-submit after a restart.
+    """
+
+    def __init__(self, model_path, mmproj_path, threads=1, max_pending=32):
+        self.model_path = model_path
+        self.mmproj_path = mmproj_path
+        self.threads = threads
+        self.max_pending = max_pending
+        self.in_flight = set()
+        self.available = None  # Unknown until the model process reports
+        self._process = None
+        self._requests = None
+        self._results = None
+
+    def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+        self._process = ctx.Process(
+            target=_serve, name="screensort-ai", daemon=True,
+            args=(self._requests, self._results, self.model_path,
+                  self.mmproj_path, self.threads))
+        self._process.start()
+
+    @property
+    def free_slots(self):
+        return max(0, self.max_pending - len(self.in_flight))
+
+    def submit(self, request_id, image_path, tasks, valid_cats):
+        """Queue one image. Returns False if the service is full or down."""
+        if self.available is False or request_id in self.in_flight or not self.free_slots:
+            return False
+        self._requests.put((request_id, image_path, tuple(tasks), list(valid_cats)))
+        self.in_flight.add(request_id)
+        return True
+
+    def poll(self):
+        """Return the (request_id, result) pairs finished since the last poll."""
+        finished = []
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "ready":
+                self.available = message[1]
+                if not self.available:
+                    self.in_flight.clear()
+            else:
+                _, request_id, result = message
+                self.in_flight.discard(request_id)
+                finished.append((request_id, result))
+        if self.available is not False and not self._process.is_alive():
+            logging.error("AI service process exited; AI analysis disabled.")
+            self.available = False
+            self.in_flight.clear()
+        return finished
+
+    def close(self):
+        if self._process is not None and self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=5)
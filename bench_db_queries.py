@@ -0,0 +1,113 @@
+"""Benchmark the viewer's hot queries with and without the v3 indexes.
+
+Builds synthetic screenshots.db files of increasing size in a temp
+directory and times each query before and after db_schema's index
+migration.
+
+Usage:
+    python bench_db_queries.py                 # 10k, 100k and 1M rows
+    python bench_db_queries.py --sizes 10000 50000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import db_schema
+
+CATEGORIES = ["Finance", "Chats", "Shopping", "Code", "Social", "System",
+              "Events", "Food", "Travel", "Unsorted"]
+
+# (label, sql, params) -- copied from screenshot-viewer/db_bridge.py and
+# the sort_screenshots.py backfills.
+QUERIES = [
+    ("filename lookup",
+     "SELECT path, category FROM screenshots WHERE filename = ?",
+     ("shot_123.png",)),
+    ("category listing",
+     "SELECT filename, path, created_at, ai_summary, amount FROM screenshots "
+     "WHERE category = ? ORDER BY created_at DESC LIMIT 60",
+     ("Finance",)),
+    ("category counts",
+     "SELECT category, count(*) FROM screenshots GROUP BY category",
+     ()),
+    ("hash backfill queue",
+     "SELECT id, filename, path FROM screenshots "
+     "WHERE dct_hash IS NULL AND is_video=0 LIMIT 50",
+     ()),
+    ("dashboard activity",
+     "SELECT strftime('%Y-%m-%d', datetime(created_at/1000, 'unixepoch', 'localtime')) as date, "
+     "count(*) FROM screenshots GROUP BY date ORDER BY date DESC LIMIT 14",
+     ()),
+    ("dashboard spending",
+     "SELECT strftime('%Y-%m-%d', datetime(created_at/1000, 'unixepoch', 'localtime')) as date, "
+     "sum(amount) FROM screenshots WHERE amount IS NOT NULL AND amount > 0 "
+     "GROUP BY date ORDER BY date DESC LIMIT 30",
+     ()),
+    ("recent files",
+     "SELECT * FROM screenshots ORDER BY created_at DESC LIMIT 6",
+     ()),
+]
+
+
+def build_db(path, rows):
+    """Create a database at the pre-index schema version with synthetic rows."""
+    conn = sqlite3.connect(path)
+    db_schema.migrate(conn, target=2)
+    now_ms = int(time.time() * 1000)
+    rng = random.Random(42)
+
+    def gen():
+        for i in range(rows):
+            category = rng.choice(CATEGORIES)
+            created_at = now_ms - rng.randint(0, 365 * 24 * 3600 * 1000)
+            amount = round(rng.uniform(1, 500), 2) if category == "Finance" else None
+            dct_hash = None if rng.random() < 0.01 else rng.getrandbits(63)
+            yield (f"shot_{i}.png", f"/sdcard/Pictures/Screenshots/{category}/shot_{i}.png",
+                   category, "lorem ipsum " * 20, amount, created_at, created_at,
+                   0, dct_hash)
+
+    conn.executemany('''INSERT INTO screenshots
+        (filename, path, category, text, amount, created_at, processed_at,
+         is_video, dct_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', gen())
+    conn.commit()
+    return conn
+
+
+def time_query(conn, sql, params, repeat=5):
+    """Return the median latency of a query in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            print(f"\n=== {rows:,} rows ===")
+            start = time.perf_counter()
+            conn = build_db(os.path.join(tmp, f"bench_{rows}.db"), rows)
+            print(f"(built in {time.perf_counter() - start:.1f}s)")
+            before = {label: time_query(conn, sql, params) for label, sql, params in QUERIES}
+            db_schema.migrate(conn)
+            conn.execute("ANALYZE")
+            print(f"{'query':<22}{'no index':>12}{'indexed':>12}")
+            for label, sql, params in QUERIES:
+                after = time_query(conn, sql, params)
+                print(f"{label:<22}{before[label]:>10.2f}ms{after:>10.2f}ms")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""OCR preprocessing benchmark: accuracy vs latency of legacy and adaptive modes.
+
+Runs tesseract on every image with each preprocess_image() mode and reports
+mean latency, pixels handed to tesseract and word-level similarity to a
+reference text. The reference is <image>.txt when present, the known text
+for --synthetic images, and otherwise the legacy output (so the score is
+agreement with the old pipeline).
+
+    python bench_ocr_quality.py                      # SOURCE_DIR
+    python bench_ocr_quality.py shots/ a.jpg --limit 50
+    python bench_ocr_quality.py --synthetic 12       # no sample images needed
+    python bench_ocr_quality.py --synthetic 12 --engine pytesseract
+"""
+import argparse
+import difflib
+import os
+import statistics
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+import ocr_engine
+import sort_screenshots
+
+MODES = ['legacy', 'adaptive']
+SAMPLE_LINES = [
+    "Payment of Rs 1,250.00 to Sharma Stores via UPI",
+    "Transaction ID 402918374651 completed",
+    "Your order has been shipped and will arrive Friday",
+    "Meeting moved to 4:30 PM, see you in room 12",
+    "Balance available: Rs 18,420.55",
+]
+
+
+def words(text):
+    return [w for w in (text or "").lower().split() if any(c.isalnum() for c in w)]
+
+
+def similarity(text, reference):
+    """Word-sequence similarity in [0, 1]."""
+    return difflib.SequenceMatcher(None, words(text), words(reference)).ratio()
+
+
+def synthetic_screenshot(font_size, width=1080, height=2400):
+    """A phone-sized screenshot with status/nav bars and known text."""
+    img = Image.new('RGB', (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, width, 70), fill=(20, 60, 120))
+    draw.text((40, 14), "10:13", fill="white", font=ImageFont.load_default(size=36))
+    draw.rectangle((0, height - 130, width, height), fill=(0, 0, 0))
+    font = ImageFont.load_default(size=font_size)
+    lines = []
+    y = 120
+    while y < height - 200:
+        line = SAMPLE_LINES[len(lines) % len(SAMPLE_LINES)]
+        draw.text((40, y), line, fill=(30, 30, 30), font=font)
+        lines.append(line)
+        y += int(font_size * 1.6)
+    return img, "\n".join(lines)
+
+
+def collect(paths, limit):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names)
+                             if os.path.splitext(n)[1].lower() in ('.jpg', '.jpeg', '.png'))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files[:limit] if limit else files
+
+
+def run_mode(engine, img, mode):
+    start = time.perf_counter()
+    prepared = sort_screenshots.preprocess_image(img, mode=mode)
+    text = engine.recognize(prepared)
+    return text, time.perf_counter() - start, prepared.width * prepared.height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=[sort_screenshots.SOURCE_DIR],
+                        help='Images or directories to benchmark')
+    parser.add_argument('--limit', type=int, default=0, help='Benchmark at most N images')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Also render N synthetic screenshots (font sizes 12-40px)')
+    parser.add_argument('--engine', default=ocr_engine.AUTO,
+                        choices=[ocr_engine.AUTO, ocr_engine.TESSEROCR, ocr_engine.PYTESSERACT],
+                        help='OCR backend (see ocr_engine.py)')
+    args = parser.parse_args()
+    engine = ocr_engine.get_engine(args.engine)
+
+    samples = []
+    for path in collect(args.paths, args.limit):
+        sidecar = os.path.splitext(path)[0] + ".txt"
+        reference = open(sidecar, encoding="utf-8").read() if os.path.exists(sidecar) else None
+        samples.append((os.path.basename(path), lambda p=path: Image.open(p), reference))
+    for i in range(args.synthetic):
+        size = 12 + (28 * i) // max(1, args.synthetic - 1)
+        img, text = synthetic_screenshot(size)
+        samples.append((f"synthetic-{size}px", lambda img=img: img, text))
+    if not samples:
+        parser.error("no images found")
+
+    stats = {mode: {"latency": [], "pixels": [], "score": []} for mode in MODES}
+    for name, load, reference in samples:
+        gray = load().convert('L')
+        outputs = {mode: run_mode(engine, gray, mode) for mode in MODES}
+        baseline = reference if reference is not None else outputs['legacy'][0]
+        row = [name]
+        for mode in MODES:
+            text, latency, pixels = outputs[mode]
+            score = similarity(text, baseline)
+            stats[mode]["latency"].append(latency)
+            stats[mode]["pixels"].append(pixels)
+            stats[mode]["score"].append(score)
+            row.append(f"{mode} {latency * 1000:6.0f}ms {score:5.2f}")
+        print("  ".join(row))
+
+    print(f"\n{len(samples)} images, {engine.name}")
+    print(f"{'mode':<10} {'latency ms':>11} {'megapixels':>11} {'similarity':>11}")
+    for mode in MODES:
+        s = stats[mode]
+        print(f"{mode:<10} {statistics.mean(s['latency']) * 1000:>11.0f} "
+              f"{statistics.mean(s['pixels']) / 1e6:>11.2f} {statistics.mean(s['score']):>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Keyword classifier: every category scored in one pass over the text.
+
+Matching is token and phrase lookup, not a regex over all keywords (as
+the change that added this module described it). The text is split into
+lowercase word tokens once. Single-word keywords are then a dict lookup
+per distinct token and phrases ("last seen") are checked only where one
+of their first words occurs, longest phrase first. Only keywords with
+punctuation in them ("c++"), which do not survive tokenizing, go through
+a combined regex, and only when the config has any. Matching is on whole words, so "pay" no longer matches
+"display", and a category's place in the config no longer decides the
+result. Each match adds its keyword's weight to every category listing
+it; repeats of a keyword add logarithmically less. The best score wins,
+ties go to the alphabetically first category.
+
+Keywords are given per category as a list (weight 1 per word, so
+phrases count double) or as a {keyword: weight} dict.
+"""
+import collections
+import math
+import re
+
+UNSORTED = "Unsorted"
+
+_WORD = re.compile(r"\w+")
+
+
+def _normalize(keyword):
+    return " ".join(keyword.lower().split())
+
+
+class KeywordClassifier:
+    """Token/phrase lookup tables for one category -> keywords mapping."""
+
+    def __init__(self, categories):
+        self.categories = categories
+        # keyword -> [(category, weight)]
+        self.keywords = {}
+        for category, keywords in categories.items():
+            if not isinstance(keywords, dict):
+                keywords = {k: len(k.split()) for k in keywords}
+            for keyword, weight in keywords.items():
+                keyword = _normalize(keyword)
+                if keyword:
+                    self.keywords.setdefault(keyword, []).append((category, float(weight)))
+
+        # first word -> phrases starting with it as token tuples, longest first
+        self.phrases = {}
+        other = []
+        for keyword in self.keywords:
+            tokens = tuple(_WORD.findall(keyword))
+            if " ".join(tokens) != keyword:
+                other.append(keyword)
+            elif len(tokens) > 1:
+                self.phrases.setdefault(tokens[0], []).append(tokens)
+        for phrases in self.phrases.values():
+            phrases.sort(key=len, reverse=True)
+        alternatives = [r"\s+".join(map(re.escape, k.split()))
+                        for k in sorted(other, key=len, reverse=True)]
+        self.pattern = (re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)",
+                                   re.IGNORECASE)
+                        if alternatives else None)
+
+    def _counts(self, text):
+        """Counter of the keywords in text: tokens, then phrases, then the regex."""
+        tokens = _WORD.findall(text.lower())
+        counts = collections.Counter(tokens)
+        if self.phrases and not counts.keys().isdisjoint(self.phrases):
+            phrases = self.phrases
+            free = 0  # Tokens before this are part of an earlier phrase
+            for i in [i for i, t in enumerate(tokens) if t in phrases]:
+                if i < free:
+                    continue
+                for phrase in phrases[tokens[i]]:
+                    if tuple(tokens[i:i + len(phrase)]) == phrase:
+                        counts[" ".join(phrase)] += 1
+                        counts.subtract(phrase)
+                        free = i + len(phrase)
+                        break
+        if self.pattern is not None:
+            counts.update(_normalize(m.group(0)) for m in self.pattern.finditer(text))
+        return counts
+
+    def scores(self, text):
+        """Return {category: score} for the categories with a match."""
+        if not text:
+            return {}
+        scores = {}
+        for keyword, count in self._counts(text).items():
+            if count <= 0 or keyword not in self.keywords:
+                continue
+            for category, weight in self.keywords[keyword]:
+                scores[category] = scores.get(category, 0.0) + weight * (1 + math.log(count))
+        return scores
+
+    def classify(self, text):
+        """Return (category, confidence).
+
+        confidence is the best category's share of all keyword evidence
+        plus one, so a lone weak hit scores 0.5 and unanimous, repeated
+        evidence approaches 1. No match returns (UNSORTED, 0.0).
+        """
+        scores = self.scores(text)
+        if not scores:
+            return UNSORTED, 0.0
+        best = max(sorted(scores), key=scores.get)
+        return best, round(scores[best] / (sum(scores.values()) + 1), 3)
@@ -0,0 +1,468 @@
+"""Versioned schema migrations for screenshots.db.
+
+Each entry in MIGRATIONS upgrades the schema by one version and runs
+exactly once. The applied version is stored in PRAGMA user_version, so
+startup no longer re-issues ALTER TABLE statements and swallows the
+errors. Shared by sort_screenshots.init_db() and seed_db.py.
+"""
+import logging
+import sqlite3
+
+# Columns of the screenshots table as of v1 (the pre-migration schema).
+# Frozen: later columns are added by their own migrations.
+SCREENSHOT_COLUMNS = [
+    ('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    ('filename', 'TEXT UNIQUE'),
+    ('path', 'TEXT'),
+    ('category', 'TEXT'),
+    ('text', 'TEXT'),
+    ('amount', 'REAL'),
+    ('created_at', 'INTEGER'),
+    ('processed_at', 'INTEGER'),
+    ('ai_category', 'TEXT'),
+    ('ai_summary', 'TEXT'),
+    ('ai_processed_at', 'INTEGER'),
+    ('detected_language', 'TEXT'),
+    ('translated_text', 'TEXT'),
+    ('is_video', 'INTEGER'),
+    ('video_frames_analyzed', 'INTEGER'),
+    ('video_objects', 'TEXT'),
+    ('ocr_method', 'TEXT'),
+    ('ai_extracted_text', 'TEXT'),
+    ('phash', 'TEXT'),  # legacy hex dHash, moved to dhash by v6
+]
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _v1_screenshots(conn):
+    """Base table. Older databases get their missing columns added."""
+    cols = ",\n        ".join(f"{name} {decl}" for name, decl in SCREENSHOT_COLUMNS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS screenshots (\n        {cols}\n    )")
+    existing = _table_columns(conn, "screenshots")
+    for name, decl in SCREENSHOT_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE screenshots ADD COLUMN {name} {decl}")
+
+
+def _v2_scan_journal(conn):
+    """File state of scanned directories (see sort_screenshots.ScanJournal)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS scan_journal (
+        dir TEXT,
+        name TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        inode INTEGER,
+        failed INTEGER DEFAULT 0,
+        PRIMARY KEY (dir, name)
+    )''')
+
+
+def _v3_indexes(conn):
+    """Indexes for the viewer's and the backfills' hot queries.
+
+    filename lookups already use the UNIQUE constraint's index.
+    """
+    # get_category_files: WHERE category = ? ORDER BY created_at; also
+    # serves the GROUP BY category counts and the Finance expense export.
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_category_created
+                    ON screenshots (category, created_at)''')
+    # Dashboard date buckets, spending totals and "recent" lists: covering,
+    # so the GROUP BY walks the index instead of the table.
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_created_amount
+                    ON screenshots (created_at, amount)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_language
+                    ON screenshots (detected_language)
+                    WHERE detected_language IS NOT NULL''')
+    # Backfill work queues stay tiny once the library is caught up.
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_phash_pending
+                    ON screenshots (id) WHERE phash IS NULL AND is_video = 0''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_ai_pending
+                    ON screenshots (id) WHERE ai_processed_at IS NULL''')
+
+
+# Columns indexed for full-text search, in FTS column order: the OCR/AI
+# text indexed since v4, then the category (v14)
+_FTS_V4_COLUMNS = ['text', 'ai_summary', 'ai_extracted_text', 'translated_text',
+                   'video_objects']
+FTS_COLUMNS = _FTS_V4_COLUMNS + ['category']
+
+
+def _create_fts(conn, columns):
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    try:
+        conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS screenshots_fts USING fts5(
+            {cols}, content='screenshots', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"FTS5 unavailable, search will use LIKE scans: {e}")
+        return
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS screenshots_fts_insert
+        AFTER INSERT ON screenshots BEGIN
+            INSERT INTO screenshots_fts (rowid, {cols}) VALUES (new.id, {new_vals});
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS screenshots_fts_delete
+        AFTER DELETE ON screenshots BEGIN
+            INSERT INTO screenshots_fts (screenshots_fts, rowid, {cols})
+            VALUES ('delete', old.id, {old_vals});
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS screenshots_fts_update
+        AFTER UPDATE OF {cols} ON screenshots BEGIN
+            INSERT INTO screenshots_fts (screenshots_fts, rowid, {cols})
+            VALUES ('delete', old.id, {old_vals});
+            INSERT INTO screenshots_fts (rowid, {cols}) VALUES (new.id, {new_vals});
+        END''')
+    conn.execute("INSERT INTO screenshots_fts (screenshots_fts) VALUES ('rebuild')")
+
+
+def _v4_fts(conn):
+    """FTS5 index over the OCR/AI text, kept in sync by triggers.
+
+    External-content table: the text lives only in screenshots, so the
+    index costs tokens, not a second copy of every OCR blob. Skipped with
+    a warning when SQLite was built without FTS5; search then falls back
+    to LIKE scans. Prefix indexes keep search-as-you-type queries cheap.
+    """
+    _create_fts(conn, _FTS_V4_COLUMNS)
+
+
+def _v5_duplicate_index(conn):
+    """Multi-index hash table and near-duplicate pairs (see dup_index.py).
+
+    Rows are written by the indexer; triggers drop them when a screenshot
+    is deleted or its hash changes. Existing hashes are picked up by
+    dup_index.sync() on the next start.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS phash_index (
+        screenshot_id INTEGER PRIMARY KEY,
+        hash INTEGER,
+        c0 INTEGER, c1 INTEGER, c2 INTEGER, c3 INTEGER, c4 INTEGER
+    )''')
+    for i in range(5):
+        conn.execute(f'''CREATE INDEX IF NOT EXISTS idx_phash_index_c{i}
+                         ON phash_index (c{i})''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS phash_pairs (
+        a INTEGER,
+        b INTEGER,
+        distance INTEGER,
+        PRIMARY KEY (a, b)
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_phash_pairs_b ON phash_pairs (b)")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS phash_index_delete
+        AFTER DELETE ON screenshots BEGIN
+            DELETE FROM phash_index WHERE screenshot_id = old.id;
+            DELETE FROM phash_pairs WHERE a = old.id OR b = old.id;
+        END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS phash_index_update
+        AFTER UPDATE OF phash ON screenshots WHEN old.phash IS NOT new.phash BEGIN
+            DELETE FROM phash_index WHERE screenshot_id = old.id;
+            DELETE FROM phash_pairs WHERE a = old.id OR b = old.id;
+        END''')
+
+
+def _hex_to_int64(value):
+    try:
+        h = int(value, 16)
+    except (TypeError, ValueError):
+        return None
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _v6_integer_hashes(conn):
+    """Store perceptual hashes as signed 64-bit INTEGERs instead of hex TEXT.
+
+    Existing hex dHashes move to dhash; every row now lacks a dct_hash, so
+    the hash backfill rehashes all of them, dhash included (see
+    image_hashing.py).
+    """
+    for name in ('dhash', 'ahash', 'dct_hash'):
+        conn.execute(f"ALTER TABLE screenshots ADD COLUMN {name} INTEGER")
+    conn.execute("DROP TRIGGER IF EXISTS phash_index_update")
+    conn.create_function("hex_to_int64", 1, _hex_to_int64, deterministic=True)
+    conn.execute('''UPDATE screenshots SET dhash = hex_to_int64(phash), phash = NULL
+                    WHERE phash IS NOT NULL''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS hash_index_update
+        AFTER UPDATE OF dhash ON screenshots WHEN old.dhash IS NOT new.dhash BEGIN
+            DELETE FROM phash_index WHERE screenshot_id = old.id;
+            DELETE FROM phash_pairs WHERE a = old.id OR b = old.id;
+        END''')
+    conn.execute("DROP INDEX IF EXISTS idx_screenshots_phash_pending")
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_hash_pending
+                    ON screenshots (id) WHERE dct_hash IS NULL AND is_video = 0''')
+
+
+def _v7_content_hash(conn):
+    """BLAKE2b digest of each file's bytes, the key into result_cache.py."""
+    conn.execute("ALTER TABLE screenshots ADD COLUMN content_hash TEXT")
+
+
+def _v8_keyword_confidence(conn):
+    """Confidence of the keyword classifier's category (see classifier.py)."""
+    conn.execute("ALTER TABLE screenshots ADD COLUMN keyword_confidence REAL")
+
+
+def _v9_reclassify(conn):
+    """Key/value meta table (category config version, reclassify cursor)
+    and a flag for categories chosen by hand in the viewer, which
+    reclassification leaves alone.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )''')
+    conn.execute("ALTER TABLE screenshots ADD COLUMN manual_category INTEGER")
+
+
+# Local calendar day of a created_at (ms), as the dashboard buckets it
+def _day(row):
+    return f"strftime('%Y-%m-%d', {row}.created_at / 1000, 'unixepoch', 'localtime')"
+
+
+def _stats_daily(row, sign):
+    return f'''
+        INSERT INTO daily_stats (day, files, spend_files, spent)
+        SELECT {_day(row)}, {sign}, {sign} * IFNULL({row}.amount > 0, 0),
+               {sign} * (CASE WHEN {row}.amount > 0 THEN {row}.amount ELSE 0 END)
+        WHERE {row}.created_at IS NOT NULL
+        ON CONFLICT (day) DO UPDATE SET files = files + excluded.files,
+            spend_files = spend_files + excluded.spend_files,
+            spent = spent + excluded.spent;
+        DELETE FROM daily_stats WHERE day = {_day(row)} AND files <= 0;'''
+
+
+def _stats_counter(table, column, row, sign):
+    return f'''
+        INSERT INTO {table} (key, files) SELECT {row}.{column}, {sign}
+        WHERE {row}.{column} IS NOT NULL
+        ON CONFLICT (key) DO UPDATE SET files = files + excluded.files;
+        DELETE FROM {table} WHERE key = {row}.{column} AND files <= 0;'''
+
+
+def _stats_totals(row, sign):
+    return f'''
+        UPDATE library_stats SET files = files + {sign},
+            text_chars = text_chars + {sign} * IFNULL(length({row}.text), 0);'''
+
+
+def _stats_row(row, sign):
+    return (_stats_daily(row, sign)
+            + _stats_counter("category_stats", "category", row, sign)
+            + _stats_counter("language_stats", "detected_language", row, sign)
+            + _stats_totals(row, sign))
+
+
+def rebuild_stats(conn):
+    """Recompute the dashboard aggregate tables from screenshots."""
+    conn.execute("DELETE FROM daily_stats")
+    conn.execute("DELETE FROM category_stats")
+    conn.execute("DELETE FROM language_stats")
+    conn.execute(f'''INSERT INTO daily_stats (day, files, spend_files, spent)
+                     SELECT {_day("s")} AS d, count(*),
+                            count(CASE WHEN amount > 0 THEN 1 END),
+                            total(CASE WHEN amount > 0 THEN amount END)
+                     FROM screenshots s WHERE created_at IS NOT NULL GROUP BY d''')
+    conn.execute('''INSERT INTO category_stats (key, files)
+                    SELECT category, count(*) FROM screenshots
+                    WHERE category IS NOT NULL GROUP BY category''')
+    conn.execute('''INSERT INTO language_stats (key, files)
+                    SELECT detected_language, count(*) FROM screenshots
+                    WHERE detected_language IS NOT NULL GROUP BY detected_language''')
+    conn.execute('''INSERT OR REPLACE INTO library_stats (id, files, text_chars)
+                    SELECT 0, count(*), total(length(text)) FROM screenshots''')
+
+
+def _v10_dashboard_stats(conn):
+    """Aggregates behind the viewer's dashboard, kept current by triggers.
+
+    Per local day: file count, count and sum of positive amounts. Per
+    category and per language: file count. Library: file count and OCR
+    text size. Every insert, delete or relevant update of a screenshot
+    adjusts them, whoever writes it (indexer, bridge, seed_db), so a
+    dashboard load reads O(days shown) rows instead of grouping the
+    library. Days are bucketed in the writer's local time zone.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,
+        files INTEGER,
+        spend_files INTEGER,
+        spent REAL
+    )''')
+    for table in ("category_stats", "language_stats"):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, files INTEGER)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS library_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        files INTEGER,
+        text_chars INTEGER
+    )''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stats_insert
+        AFTER INSERT ON screenshots BEGIN {_stats_row("new", 1)}
+        END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stats_delete
+        AFTER DELETE ON screenshots BEGIN {_stats_row("old", -1)}
+        END''')
+    updates = [
+        ("daily", "created_at, amount", _stats_daily),
+        ("category", "category",
+         lambda row, sign: _stats_counter("category_stats", "category", row, sign)),
+        ("language", "detected_language",
+         lambda row, sign: _stats_counter("language_stats", "detected_language", row, sign)),
+        ("text", "text", _stats_totals),
+    ]
+    for name, columns, fragment in updates:
+        changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in columns.split(", "))
+        body = fragment("old", -1) + fragment("new", 1)
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stats_update_{name}
+            AFTER UPDATE OF {columns} ON screenshots WHEN {changed} BEGIN {body}
+            END''')
+    rebuild_stats(conn)
+
+
+def _v11_category_pages(conn):
+    """Indexes for the viewer's category pages in name and amount order.
+
+    Date order already uses idx_screenshots_category_created. With the
+    rowid as an implicit last column, each sort mode's (key, id) keyset
+    seeks straight to the next page.
+    """
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_category_filename
+                    ON screenshots (category, filename)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_screenshots_category_amount
+                    ON screenshots (category, amount)''')
+
+
+# Columns rendered into knowledge-base pages (db_bridge.generate_kb)
+REVISION_COLUMNS = ['filename', 'category', 'created_at', 'amount', 'ai_summary', 'text']
+
+
+def _v12_revision(conn):
+    """Per-row revision counter, bumped when a REVISION_COLUMNS value changes.
+
+    Lets exports such as the knowledge base find changed rows from
+    (id, revision) pairs alone, without reading or hashing the text.
+    """
+    conn.execute("ALTER TABLE screenshots ADD COLUMN revision INTEGER DEFAULT 0")
+    columns = ", ".join(REVISION_COLUMNS)
+    changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in REVISION_COLUMNS)
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS revision_update
+        AFTER UPDATE OF {columns} ON screenshots WHEN {changed} BEGIN
+            UPDATE screenshots SET revision = IFNULL(old.revision, 0) + 1 WHERE id = new.id;
+        END''')
+
+
+def _v13_hash_clusters(conn):
+    """Store identical dHashes as clusters instead of pairwise rows.
+
+    phash_index maps screenshot_id -> hash, so a cluster is every id with
+    one hash; phash_hashes holds each distinct hash with its chunks; and
+    phash_pairs links distinct hashes within the threshold. A thousand
+    blank screenshots are one hash, not half a million pairs. The tables
+    are refilled by dup_index.sync() on the next start.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS phash_index_delete")
+    conn.execute("DROP TRIGGER IF EXISTS hash_index_update")
+    conn.execute("DROP TABLE IF EXISTS phash_pairs")
+    conn.execute("DROP TABLE IF EXISTS phash_index")
+    conn.execute('''CREATE TABLE phash_index (
+        screenshot_id INTEGER PRIMARY KEY,
+        hash INTEGER
+    )''')
+    conn.execute("CREATE INDEX idx_phash_index_hash ON phash_index (hash)")
+    conn.execute('''CREATE TABLE phash_hashes (
+        hash INTEGER PRIMARY KEY,
+        c0 INTEGER, c1 INTEGER, c2 INTEGER, c3 INTEGER, c4 INTEGER
+    )''')
+    for i in range(5):
+        conn.execute(f"CREATE INDEX idx_phash_hashes_c{i} ON phash_hashes (c{i})")
+    conn.execute('''CREATE TABLE phash_pairs (
+        a INTEGER,
+        b INTEGER,
+        distance INTEGER,
+        PRIMARY KEY (a, b)
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX idx_phash_pairs_b ON phash_pairs (b)")
+    # The last id with a hash takes the hash and its pairs with it
+    current = "(SELECT hash FROM phash_index WHERE screenshot_id = old.id)"
+    unindex = f'''
+            DELETE FROM phash_hashes WHERE hash = {current}
+                AND NOT EXISTS (SELECT 1 FROM phash_index
+                                WHERE hash = phash_hashes.hash AND screenshot_id != old.id);
+            DELETE FROM phash_pairs WHERE (a = {current} OR b = {current})
+                AND NOT EXISTS (SELECT 1 FROM phash_hashes WHERE hash = {current});
+            DELETE FROM phash_index WHERE screenshot_id = old.id;'''
+    conn.execute(f'''CREATE TRIGGER phash_index_delete
+        AFTER DELETE ON screenshots BEGIN{unindex}
+        END''')
+    conn.execute(f'''CREATE TRIGGER hash_index_update
+        AFTER UPDATE OF dhash ON screenshots WHEN old.dhash IS NOT new.dhash BEGIN{unindex}
+        END''')
+
+
+def _v14_fts_category(conn):
+    """Add the category to the FTS index, so a search for "Finance" finds
+    the Finance screenshots as the old LIKE search did.
+    """
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS screenshots_fts_{trigger}")
+    conn.execute("DROP TABLE IF EXISTS screenshots_fts")
+    _create_fts(conn, FTS_COLUMNS)
+
+
+MIGRATIONS = [
+    _v1_screenshots,
+    _v2_scan_journal,
+    _v3_indexes,
+    _v4_fts,
+    _v5_duplicate_index,
+    _v6_integer_hashes,
+    _v7_content_hash,
+    _v8_keyword_confidence,
+    _v9_reclassify,
+    _v10_dashboard_stats,
+    _v11_category_pages,
+    _v12_revision,
+    _v13_hash_clusters,
+    _v14_fts_category,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    """Return the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def get_meta(conn, key, default=None):
+    """Read a value from the meta table."""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    """Write a value to the meta table (stored as text)."""
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def migrate(conn, target=SCHEMA_VERSION):
+    """Apply pending migrations up to target, each in its own transaction.
+
+    Returns the resulting schema version.
+    """
+    conn.commit()
+    version = schema_version(conn)
+    while version < target:
+        step = MIGRATIONS[version]
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version += 1
+        logging.info(f"Database schema migrated to v{version} ({step.__name__})")
+    return version
@@ -0,0 +1,202 @@
+"""Persisted near-duplicate index over the 64-bit screenshots.dhash column.
+
+Multi-index hashing: each hash is split into HAMMING_THRESHOLD + 1
+disjoint bit chunks. By the pigeonhole principle, two hashes within
+HAMMING_THRESHOLD bits of each other agree exactly on at least one
+chunk, so exact chunk lookups find every near-duplicate with no
+windowing or sampling.
+
+Identical hashes (blank or black screenshots, re-saved copies) form a
+cluster and are stored once, so only distinct hashes are chunked and
+compared. Tables (db_schema v13), hashes stored as signed INTEGERs:
+    phash_index   screenshot_id -> hash; a cluster is every id of one hash
+    phash_hashes  each distinct hash and its chunks (each chunk indexed)
+    phash_pairs   every (a, b) pair of distinct hashes within the threshold
+
+The indexer calls add_hash() as hashes are written; sync() catches up on
+anything missed and falls back to a bulk (NumPy-vectorized when
+available) rebuild when far behind.
+"""
+import logging
+
+HAMMING_THRESHOLD = 4
+HASH_BITS = 64
+_MASK64 = (1 << HASH_BITS) - 1
+
+# (shift, width) of each chunk: 13+13+13+13+12 = 64 bits
+CHUNKS = [(0, 13), (13, 13), (26, 13), (39, 13), (52, 12)]
+
+# Above this many unindexed hashes, sync() rebuilds instead of adding one by one
+BULK_SYNC_THRESHOLD = 2000
+
+
+def parse_hash(value):
+    """Return a hash (signed INTEGER, or legacy hex string) as an unsigned int."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return int(value, 16)
+    return value & _MASK64
+
+
+def to_signed(h):
+    """Map an unsigned 64-bit hash into SQLite's signed INTEGER range."""
+    return h - (1 << HASH_BITS) if h >= 1 << (HASH_BITS - 1) else h
+
+
+def hash_chunks(h):
+    """Split an unsigned 64-bit hash into its CHUNKS values."""
+    return [(h >> shift) & ((1 << width) - 1) for shift, width in CHUNKS]
+
+
+def hamming(a, b):
+    """Number of differing bits between two unsigned hashes."""
+    return bin(a ^ b).count('1')
+
+
+def add_hash(conn, screenshot_id, value):
+    """Index one screenshot's hash and record its hash's near-duplicate pairs.
+
+    A hash that is already indexed only gains a cluster member.
+    """
+    h = parse_hash(value)
+    if h is None:
+        return
+    signed = to_signed(h)
+    if conn.execute("SELECT 1 FROM phash_hashes WHERE hash = ?", (signed,)).fetchone() is None:
+        chunks = hash_chunks(h)
+        where = " OR ".join(f"c{i} = ?" for i in range(len(CHUNKS)))
+        pairs = []
+        for (other,) in conn.execute(f"SELECT hash FROM phash_hashes WHERE {where}", chunks):
+            dist = hamming(h, other & _MASK64)
+            if dist <= HAMMING_THRESHOLD:
+                pairs.append((min(signed, other), max(signed, other), dist))
+        conn.execute("INSERT INTO phash_hashes VALUES (?, ?, ?, ?, ?, ?)", [signed] + chunks)
+        conn.executemany("INSERT OR REPLACE INTO phash_pairs VALUES (?, ?, ?)", pairs)
+    conn.execute("INSERT OR REPLACE INTO phash_index VALUES (?, ?)", (screenshot_id, signed))
+
+
+def _popcount64(np, x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    # SWAR popcount for NumPy < 2.0
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _distinct_pairs_numpy(np, distinct):
+    """Near pairs (i, j, dist) of indexes into a sorted array of distinct hashes."""
+    u = np.asarray(distinct, dtype=np.uint64)
+    n = len(u)
+    found = []
+    positions = np.arange(n)
+    for shift, width in CHUNKS:
+        key = (u >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+        order = np.argsort(key, kind="stable")
+        ks = key[order]
+        # For each sorted slot, how many later slots share its bucket
+        starts = np.flatnonzero(np.r_[True, ks[1:] != ks[:-1]])
+        ends = np.r_[starts[1:], n]
+        bucket = np.cumsum(np.r_[True, ks[1:] != ks[:-1]]) - 1
+        remaining = ends[bucket] - positions - 1
+
+        us = u[order]
+        d = 1
+        active = np.flatnonzero(remaining >= d)
+        while active.size:
+            dist = _popcount64(np, us[active] ^ us[active + d])
+            close = dist <= HAMMING_THRESHOLD
+            if close.any():
+                a = order[active[close]]
+                b = order[active[close] + d]
+                found.append(np.stack([np.minimum(a, b), np.maximum(a, b),
+                                       dist[close].astype(np.int64)], axis=1))
+            d += 1
+            active = active[remaining[active] >= d]
+
+    if not found:
+        return []
+    return [tuple(p) for p in np.unique(np.concatenate(found), axis=0).tolist()]
+
+
+def _distinct_pairs_python(distinct):
+    found = set()
+    for shift, width in CHUNKS:
+        buckets = {}
+        for i, h in enumerate(distinct):
+            buckets.setdefault((h >> shift) & ((1 << width) - 1), []).append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    i, j = members[x], members[y]
+                    dist = hamming(distinct[i], distinct[j])
+                    if dist <= HAMMING_THRESHOLD:
+                        found.add((i, j, dist))
+    return list(found)
+
+
+def clusters(items):
+    """Group (id, unsigned hash) items by hash: {hash: [ids]}."""
+    by_hash = {}
+    for item_id, h in items:
+        by_hash.setdefault(h, []).append(item_id)
+    return by_hash
+
+
+def near_hash_pairs(hashes):
+    """All (a, b, distance) pairs of distinct hashes within HAMMING_THRESHOLD, a < b.
+
+    hashes are unsigned. Exact: every pair of hashes sharing a chunk is
+    compared. Identical hashes are a cluster, not a pair.
+    """
+    distinct = sorted(set(hashes))
+    try:
+        import numpy as np
+        pairs = _distinct_pairs_numpy(np, distinct)
+    except ImportError:
+        pairs = _distinct_pairs_python(distinct)
+    return [(distinct[i], distinct[j], dist) for i, j, dist in pairs]
+
+
+def rebuild(conn):
+    """Recompute the whole index from the screenshots.dhash column."""
+    items = []
+    for row_id, value in conn.execute(
+            "SELECT id, dhash FROM screenshots WHERE dhash IS NOT NULL"):
+        try:
+            items.append((row_id, parse_hash(value)))
+        except ValueError:
+            continue
+    by_hash = clusters(items)
+    conn.execute("DELETE FROM phash_index")
+    conn.execute("DELETE FROM phash_hashes")
+    conn.execute("DELETE FROM phash_pairs")
+    conn.executemany("INSERT INTO phash_index VALUES (?, ?)",
+                     ((row_id, to_signed(h)) for row_id, h in items))
+    conn.executemany("INSERT INTO phash_hashes VALUES (?, ?, ?, ?, ?, ?)",
+                     ([to_signed(h)] + hash_chunks(h) for h in by_hash))
+    conn.executemany("INSERT INTO phash_pairs VALUES (?, ?, ?)",
+                     (sorted((to_signed(a), to_signed(b))) + [dist]
+                      for a, b, dist in near_hash_pairs(by_hash)))
+    logging.info(f"Duplicate index rebuilt over {len(items)} hashes "
+                 f"({len(by_hash)} distinct)")
+
+
+def sync(conn):
+    """Index hashes that were written without going through add_hash()."""
+    missing = conn.execute('''SELECT id, dhash FROM screenshots
+                              WHERE dhash IS NOT NULL
+                              AND id NOT IN (SELECT screenshot_id FROM phash_index)''').fetchall()
+    if not missing:
+        return
+    if len(missing) > BULK_SYNC_THRESHOLD:
+        rebuild(conn)
+    else:
+        for row_id, value in missing:
+            try:
+                add_hash(conn, row_id, value)
+            except ValueError:
+                continue
+    conn.commit()
@@ -0,0 +1,281 @@
+"""Finance expense export to CSV, Parquet or Arrow.
+
+A request covers one or more periods: every month of a "YYYY-MM" range
+(one file per month) or a "YYYY-MM-DD" date range (one file). Periods
+that need writing are read in date order through a single cursor on
+the (category, created_at) index, and rows are handed to each period's
+writers in batches as they stream in. Only the current batch is held in
+memory, whatever the size of the range.
+
+Each file's fingerprint is recorded in the export directory's manifest.
+The fingerprint is the period's row count, max id and revision sum (see
+db_schema v12). It is read from the same index, so re-exporting a closed
+month whose rows have not changed returns the existing file without
+reading any rows.
+
+Parquet and Arrow (IPC file) output need pyarrow (pip install pyarrow).
+"""
+import csv
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+
+CATEGORY = "Finance"
+CSV = "csv"
+PARQUET = "parquet"
+ARROW = "arrow"
+FORMATS = (CSV, PARQUET, ARROW)
+COLUMNS = ['Date', 'Amount', 'Filename', 'Summary', 'Text Snippet']
+BATCH_ROWS = 5000
+MANIFEST = ".export_manifest.json"
+
+# start/end are local-time epoch milliseconds, end exclusive
+Period = namedtuple("Period", "label start end")
+
+_ROWS_QUERY = '''SELECT created_at, amount, filename, ai_summary, substr(text, 1, 100)
+                 FROM screenshots
+                 WHERE category = ? AND created_at >= ? AND created_at < ?
+                 ORDER BY created_at'''
+
+
+def _ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def _next_month(dt):
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1)
+
+
+def month_periods(first, last=None):
+    """One Period per month from first to last ("YYYY-MM"), inclusive."""
+    month = datetime.strptime(first, "%Y-%m")
+    stop = datetime.strptime(last or first, "%Y-%m")
+    if stop < month:
+        raise ValueError(f"{last} is before {first}")
+    periods = []
+    while month <= stop:
+        following = _next_month(month)
+        periods.append(Period(month.strftime("%Y-%m"), _ms(month), _ms(following)))
+        month = following
+    return periods
+
+
+def date_period(first, last):
+    """A single Period covering the days first to last ("YYYY-MM-DD"), inclusive."""
+    start = datetime.strptime(first, "%Y-%m-%d")
+    stop = datetime.strptime(last, "%Y-%m-%d")
+    if stop < start:
+        raise ValueError(f"{last} is before {first}")
+    end = datetime.fromordinal(stop.toordinal() + 1)
+    return Period(f"{first}_{last}", _ms(start), _ms(end))
+
+
+def parse_periods(first, last=None):
+    """Periods for a month ("YYYY-MM"), a month range or a date range."""
+    if len(first) == len("YYYY-MM"):
+        return month_periods(first, last)
+    return [date_period(first, last or first)]
+
+
+def file_name(period, fmt):
+    return f"expenses_{period.label}.{fmt}"
+
+
+def fingerprint(conn, period):
+    """[row count, max id, revision sum] of the period's rows."""
+    has_revision = any(col[1] == 'revision' for col in conn.execute("PRAGMA table_info(screenshots)"))
+    row = conn.execute(f'''SELECT count(*), max(id), {'total(revision)' if has_revision else '0'}
+                           FROM screenshots
+                           WHERE category = ? AND created_at >= ? AND created_at < ?''',
+                       (CATEGORY, period.start, period.end)).fetchone()
+    return [row[0], row[1], row[2]]
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(
+            (datetime.fromtimestamp(created_at / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+             amount if amount else 0,
+             filename,
+             summary or "",
+             (snippet or "").replace('\n', ' '))
+            for created_at, amount, filename, summary, snippet in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowWriter:
+    """Parquet or Arrow IPC file, one record batch per write()."""
+
+    def __init__(self, path, fmt):
+        import pyarrow as pa
+        self.pa = pa
+        self.schema = pa.schema([
+            ('Date', pa.timestamp('ms', tz='UTC')),
+            ('Amount', pa.float64()),
+            ('Filename', pa.string()),
+            ('Summary', pa.string()),
+            ('Text Snippet', pa.string()),
+        ])
+        if fmt == PARQUET:
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        created_at, amount, filename, summary, snippet = zip(*rows)
+        batch = self.pa.record_batch([
+            self.pa.array(created_at, self.pa.timestamp('ms', tz='UTC')),
+            self.pa.array([a or 0.0 for a in amount], self.pa.float64()),
+            self.pa.array(filename, self.pa.string()),
+            self.pa.array(summary, self.pa.string()),
+            self.pa.array([(s or "").replace('\n', ' ') for s in snippet], self.pa.string()),
+        ], schema=self.schema)
+        self.writer.write_table(self.pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.writer.close()
+
+
+def _open_writer(path, fmt):
+    return CsvWriter(path) if fmt == CSV else ArrowWriter(path, fmt)
+
+
+class _PeriodOutput:
+    """The files being written for one period; renamed into place on finish()."""
+
+    def __init__(self, out_dir, period, formats):
+        self.period = period
+        self.count = 0
+        self.paths = [os.path.join(out_dir, file_name(period, fmt)) for fmt in formats]
+        self.writers = []
+        try:
+            for path, fmt in zip(self.paths, formats):
+                self.writers.append(_open_writer(path + ".tmp", fmt))
+        except Exception:
+            self.abort()
+            raise
+
+    def write(self, rows):
+        if rows:
+            for writer in self.writers:
+                writer.write(rows)
+            self.count += len(rows)
+
+    def finish(self):
+        for writer, path in zip(self.writers, self.paths):
+            writer.close()
+            os.replace(path + ".tmp", path)
+
+    def abort(self):
+        for writer, path in zip(self.writers, self.paths):
+            try:
+                writer.close()
+            finally:
+                if os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+
+
+def _export_run(conn, out_dir, run):
+    """Write adjacent periods [(period, formats)] from one cursor; returns row counts."""
+    cursor = conn.execute(_ROWS_QUERY, (CATEGORY, run[0][0].start, run[-1][0].end))
+    counts = []
+    index = 0
+    output = _PeriodOutput(out_dir, *run[0])
+    try:
+        for rows in iter(lambda: cursor.fetchmany(BATCH_ROWS), []):
+            start = 0
+            while start < len(rows):
+                end = output.period.end
+                stop = start
+                while stop < len(rows) and rows[stop][0] < end:
+                    stop += 1
+                output.write(rows[start:stop])
+                start = stop
+                if start < len(rows):
+                    output.finish()
+                    counts.append(output.count)
+                    index += 1
+                    output = _PeriodOutput(out_dir, *run[index])
+        # The last periods of the run may have no rows at all
+        while True:
+            output.finish()
+            counts.append(output.count)
+            index += 1
+            if index == len(run):
+                return counts
+            output = _PeriodOutput(out_dir, *run[index])
+    except BaseException:
+        output.abort()
+        raise
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export(conn, periods, out_dir, formats=(CSV,)):
+    """Export the Finance rows of each period in each format into out_dir.
+
+    Returns one {"name", "path", "period", "format", "count", "cached"}
+    dict per file, in period order. A file is cached when it exists and
+    its period's fingerprint is unchanged since it was written.
+    """
+    formats = list(dict.fromkeys(formats))
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown export format: {', '.join(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = _load_manifest(manifest_path)
+
+    files = {}
+    runs = []  # adjacent periods needing files, each run read by one cursor
+    fingerprints = {}
+    for period in periods:
+        fingerprints[period] = fp = fingerprint(conn, period)
+        todo = []
+        for fmt in formats:
+            name = file_name(period, fmt)
+            path = os.path.join(out_dir, name)
+            if manifest.get(name) == fp and os.path.exists(path):
+                files[name] = {"name": name, "path": path, "period": period.label,
+                               "format": fmt, "count": fp[0], "cached": True}
+            else:
+                todo.append(fmt)
+        if todo:
+            if runs and runs[-1][-1][0].end == period.start:
+                runs[-1].append((period, todo))
+            else:
+                runs.append([(period, todo)])
+
+    try:
+        for run in runs:
+            for (period, todo), count in zip(run, _export_run(conn, out_dir, run)):
+                for fmt in todo:
+                    name = file_name(period, fmt)
+                    manifest[name] = fingerprints[period]
+                    files[name] = {"name": name, "path": os.path.join(out_dir, name),
+                                   "period": period.label, "format": fmt, "count": count,
+                                   "cached": False}
+    finally:
+        if runs:
+            tmp_path = manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, manifest_path)
+
+    return [files[file_name(period, fmt)] for period in periods for fmt in formats
+            if file_name(period, fmt) in files]
@@ -0,0 +1,79 @@
+"""Vectorized perceptual hashes (dHash, aHash, DCT pHash) with NumPy.
+
+Images are reduced to small grayscale arrays with hash_inputs(), stacked,
+and hashed in one pass per batch. Hashes are 64-bit values returned as
+signed ints so they fit SQLite INTEGER columns; dhash_batch() keeps the
+bit order of the original per-pixel loop (bit row * 8 + col is set when a
+pixel is brighter than its right neighbour). The indexer feeds a
+box-reduced preview rather than the full image, so values can still be a
+few bits off the original hashes; rows hashed before schema v6 are
+rehashed by the backfill rather than compared as is.
+"""
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis as an n x n matrix."""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def hash_inputs(image):
+    """Reduce a PIL image to the (dhash, ahash, dct) grayscale arrays."""
+    gray = image.convert('L')
+    return (
+        np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)),
+        np.asarray(gray.resize((HASH_SIZE, HASH_SIZE), Image.Resampling.LANCZOS)),
+        np.asarray(gray.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS)),
+    )
+
+
+def _pack(bits):
+    """(N, 64) bool array -> (N,) int64, bit i from column i."""
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<i8').ravel()
+
+
+def dhash_batch(pixels):
+    """Difference hash of an (N, 8, 9) uint8 stack."""
+    return _pack(pixels[:, :, :-1] > pixels[:, :, 1:])
+
+
+def ahash_batch(pixels):
+    """Average hash of an (N, 8, 8) uint8 stack."""
+    pixels = pixels.astype(np.float32)
+    return _pack(pixels > pixels.mean(axis=(1, 2), keepdims=True))
+
+
+def dct_hash_batch(pixels):
+    """pHash of an (N, 32, 32) uint8 stack: low 8x8 DCT terms against their median."""
+    coeffs = _DCT @ pixels.astype(np.float64) @ _DCT.T
+    low = coeffs[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    return _pack(low > np.median(low, axis=1, keepdims=True))
+
+
+def hash_batch(inputs):
+    """Hash a list of hash_inputs() tuples.
+
+    Returns one (dhash, ahash, dct_hash) tuple of signed ints per input.
+    """
+    if not inputs:
+        return []
+    d, a, p = (np.stack(arrays) for arrays in zip(*inputs))
+    return list(zip(dhash_batch(d).tolist(), ahash_batch(a).tolist(),
+                    dct_hash_batch(p).tolist()))
+
+
+def hash_image(image):
+    """(dhash, ahash, dct_hash) of a single PIL image."""
+    return hash_batch([hash_inputs(image)])[0]
@@ -0,0 +1,78 @@
+"""Tesseract OCR engines.
+
+pytesseract writes every image to a temp file and forks the tesseract
+binary, which reloads the language data each time: tens of milliseconds
+per image before recognition starts. The tesserocr backend keeps one
+initialized TessBaseAPI per thread (so one per indexer worker process)
+and hands it the bitmap directly. pytesseract remains the fallback when
+tesserocr is not installed or cannot find its language data.
+"""
+import logging
+import threading
+
+AUTO = "auto"
+TESSEROCR = "tesserocr"
+PYTESSERACT = "pytesseract"
+
+_local = threading.local()
+
+
+class TesserocrEngine:
+    """In-process tesseract session; not thread-safe, use one per thread."""
+
+    name = TESSEROCR
+
+    def __init__(self, lang="eng"):
+        import tesserocr
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def recognize(self, image):
+        self.api.SetImage(image)
+        return self.api.GetUTF8Text()
+
+    def close(self):
+        self.api.End()
+
+
+class PytesseractEngine:
+    """One tesseract subprocess per image."""
+
+    name = PYTESSERACT
+
+    def __init__(self, lang="eng"):
+        import pytesseract
+        self._image_to_string = pytesseract.image_to_string
+        self.lang = lang
+
+    def recognize(self, image):
+        return self._image_to_string(image, lang=self.lang)
+
+    def close(self):
+        pass
+
+
+def create_engine(backend=AUTO, lang="eng"):
+    """Create an engine; AUTO prefers tesserocr and falls back to pytesseract."""
+    if backend in (AUTO, TESSEROCR):
+        try:
+            return TesserocrEngine(lang)
+        except ImportError:
+            if backend == TESSEROCR:
+                logging.warning("tesserocr not installed. Install with: pip install tesserocr")
+        except RuntimeError as e:
+            logging.warning(f"tesserocr failed to initialize ({e}); using pytesseract.")
+    elif backend != PYTESSERACT:
+        logging.warning(f"Unknown OCR engine '{backend}'; using pytesseract.")
+    return PytesseractEngine(lang)
+
+
+def get_engine(backend=AUTO, lang="eng"):
+    """The calling thread's engine for (backend, lang), created on first use."""
+    engines = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    engine = engines.get((backend, lang))
+    if engine is None:
+        engine = engines[(backend, lang)] = create_engine(backend, lang)
+        logging.info(f"OCR engine: {engine.name} ({lang})")
+    return engine
@@ -0,0 +1,102 @@
+"""Content-addressed cache of OCR and AI results.
+
+Entries are keyed by a BLAKE2b digest of the file's bytes plus a result
+kind ("tesseract", "ai:categorize", "ai:ocr"). Each entry also stores the
+version string of the model/prompt that produced it, and a version
+mismatch is a miss. A renamed, moved or re-imported file, or the same image saved into
+several folders, is therefore never OCRed or sent to the model twice.
+
+The cache lives in its own SQLite file so it survives a rebuilt
+screenshots.db. It is bounded by total value size and evicts least
+recently used entries first.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+
+_READ_CHUNK = 1 << 20
+# A hit refreshes last_used only if it is older than this: LRU order at
+# minute granularity is enough, and most hits then stay read-only
+_TOUCH_AFTER_NS = 60 * 10**9
+
+
+def content_key(path):
+    """BLAKE2b-128 hex digest of a file's bytes."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """LRU-bounded (content key, kind) -> JSON value store."""
+
+    def __init__(self, path, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # A lost cache write only costs a recomputation
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS results (
+            key TEXT,
+            kind TEXT,
+            version TEXT,
+            value TEXT,
+            size INTEGER,
+            last_used INTEGER,
+            PRIMARY KEY (key, kind)
+        )''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)")
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, kind, version):
+        """Return the cached value, or None on a miss or version change."""
+        if key is None:
+            return None
+        row = self.conn.execute("SELECT version, value, last_used FROM results WHERE key = ? AND kind = ?",
+                                (key, kind)).fetchone()
+        if row is None or row[0] != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time_ns()
+        if now - row[2] > _TOUCH_AFTER_NS:
+            self.conn.execute("UPDATE results SET last_used = ? WHERE key = ? AND kind = ?",
+                              (now, key, kind))
+        return json.loads(row[1])
+
+    def put(self, key, kind, version, value):
+        if key is None:
+            return
+        data = json.dumps(value)
+        old = self.conn.execute("SELECT size FROM results WHERE key = ? AND kind = ?",
+                                (key, kind)).fetchone()
+        self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                          (key, kind, version, data, len(data), time.time_ns()))
+        self.total_bytes += len(data) - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_ratio=0.9):
+        """Drop least recently used entries until under target_ratio of the bound."""
+        target = self.max_bytes * target_ratio
+        freed = 0
+        victims = []
+        # Walk the last_used index lazily; only the victims are read
+        rows = self.conn.execute("SELECT key, kind, size FROM results ORDER BY last_used")
+        for key, kind, size in rows:
+            if self.total_bytes - freed <= target:
+                break
+            victims.append((key, kind))
+            freed += size
+        rows.close()
+        self.conn.executemany("DELETE FROM results WHERE key = ? AND kind = ?", victims)
+        self.total_bytes -= freed
+
+    def close(self):
+        self.conn.close()
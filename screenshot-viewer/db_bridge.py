@@ -3,25 +3,75 @@ import sys
 import json
 import os
 import shutil
-import csv
 import base64
+import html
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Resolve DB path relative to this script (one level up)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "../screenshots.db")
-# Destination root
-SCREENSHOTS_DIR = '/sdcard/Pictures/Screenshots'
+# Destination root: the indexer's SOURCE_DIR, read from the same variable
+SCREENSHOTS_DIR = os.environ.get('SOURCE_DIR', '/sdcard/Pictures/Screenshots')
+# Touching SCREENSHOTS_DIR/WAKE_FILE wakes an indexer running with --watch
+# (see sort_screenshots.WAKE_FILE)
+WAKE_FILE = ".screensort_wake"
+
+# Connection reused across requests in daemon mode (see serve())
+_shared_conn = None
 
 def get_db():
+    if _shared_conn is not None:
+        return _shared_conn
     try:
-        conn = sqlite3.connect(DB_PATH)
+        # The indexer keeps the DB in WAL mode; wait out its commits instead
+        # of failing with "database is locked".
+        conn = sqlite3.connect(DB_PATH, timeout=10)
         conn.row_factory = sqlite3.Row
         return conn
     except Exception as e:
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
 
+def _add_repo_root_to_path():
+    """Make sort_screenshots importable (once; serve() calls this per request)."""
+    root = os.path.join(BASE_DIR, "..")
+    if root not in sys.path:
+        sys.path.append(root)
+
+def notify_indexer():
+    """Wake a watching indexer so it picks up our file changes immediately."""
+    try:
+        with open(os.path.join(SCREENSHOTS_DIR, WAKE_FILE), "w") as f:
+            f.write(str(datetime.now().timestamp()))
+    except OSError:
+        pass  # No indexer folder / read-only storage; the next poll catches up
+
+class Stream:
+    """A command result whose list is produced while it is being sent.
+
+    serve() writes every item the generator yields as its own line, so
+    neither this process nor server.js holds the whole list, and the
+    viewer can show the first items while the rest are still being read.
+    key names the list's field in the result ("files"), or is "" when the
+    result is the list itself. The generator returns the other fields
+    (e.g. {"next_cursor": ...}), available as .fields once it is done.
+    """
+
+    def __init__(self, key, items):
+        self.key = key
+        self._items = items
+        self.fields = None
+
+    def __iter__(self):
+        self.fields = (yield from self._items) or {}
+
+    def collect(self):
+        """The whole result, as the command returned it before streaming."""
+        items = list(self)
+        return items if self.key == "" else {self.key: items, **self.fields}
+
 def move_file(filename, new_category):
     conn = get_db()
     c = conn.cursor()
@@ -30,15 +80,13 @@ def move_file(filename, new_category):
     c.execute("SELECT path, category FROM screenshots WHERE filename = ?", (filename,))
     row = c.fetchone()
     if not row:
-        print(json.dumps({"error": "File not found in database"}))
-        return
+        return {"error": "File not found in database"}
 
     old_path = row['path']
     old_category = row['category']
     
     if old_category == new_category:
-        print(json.dumps({"success": True, "message": "Already in this category"}))
-        return
+        return {"success": True, "message": "Already in this category"}
 
     # 2. Construct new path
     dest_dir = os.path.join(SCREENSHOTS_DIR, new_category)
@@ -57,46 +105,71 @@ def move_file(filename, new_category):
     else:
         final_filename = filename
 
-    # 3. Move file
-    try:
-        if os.path.exists(old_path):
-            shutil.move(old_path, new_path)
-        else:
-            # Maybe the path in DB is outdated but file exists in expected old location?
-            # Or maybe it's already gone.
-            print(json.dumps({"error": f"Physical file not found at {old_path}"}))
-            return
-            
-    except Exception as e:
-        print(json.dumps({"error": f"Move failed: {str(e)}"}))
-        return
-
-    # 4. Update DB
+    # 3. Update DB; committed only once the file has moved
     try:
         c.execute("UPDATE screenshots SET path = ?, category = ?, filename = ? WHERE filename = ?", 
                   (new_path, new_category, final_filename, filename))
+        try:
+            # Chosen by hand: reclassification leaves it alone
+            c.execute("UPDATE screenshots SET manual_category = 1 WHERE filename = ?",
+                      (final_filename,))
+        except sqlite3.OperationalError:
+            pass  # Database not yet upgraded by the indexer
+    except Exception as e:
+        conn.rollback()
+        return {"error": f"DB update failed: {str(e)}"}
+
+    # 4. Move file
+    if not os.path.exists(old_path):
+        # Maybe the path in DB is outdated but file exists in expected old location?
+        # Or maybe it's already gone.
+        conn.rollback()
+        return {"error": f"Physical file not found at {old_path}"}
+    try:
+        shutil.move(old_path, new_path)
+    except Exception as e:
+        conn.rollback()
+        return {"error": f"Move failed: {str(e)}"}
+    try:
         conn.commit()
-        print(json.dumps({"success": True, "new_path": new_path, "new_filename": final_filename}))
     except Exception as e:
-        print(json.dumps({"error": f"DB update failed: {str(e)}"}))
+        conn.rollback()
+        shutil.move(new_path, old_path)
+        return {"error": f"DB update failed: {str(e)}"}
+    notify_indexer()
+    return {"success": True, "new_path": new_path, "new_filename": final_filename}
+
+_stats_available = False
+
+def _has_stats(c):
+    """True once the indexer has created the aggregate tables (db_schema v10)."""
+    global _stats_available
+    if not _stats_available:
+        c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='daily_stats'")
+        _stats_available = c.fetchone() is not None
+    return _stats_available
+
+def _category_counts(c):
+    if _has_stats(c):
+        c.execute("SELECT key AS category, files AS count FROM category_stats ORDER BY count DESC")
+    else:
+        c.execute("SELECT category, count(*) as count FROM screenshots GROUP BY category ORDER BY count DESC")
+    return [{"name": r['category'], "count": r['count']} for r in c.fetchall()]
 
 def get_stats():
     conn = get_db()
     c = conn.cursor()
     
     # Total Files
-    c.execute("SELECT count(*) as count, sum(length(text)) as size_est FROM screenshots")
+    if _has_stats(c):
+        c.execute("SELECT files as count, text_chars as size_est FROM library_stats")
+    else:
+        c.execute("SELECT count(*) as count, sum(length(text)) as size_est FROM screenshots")
     row = c.fetchone()
-    total_files = row['count']
+    total_files = row['count'] if row else 0
     
     # Categories
-    c.execute("SELECT category, count(*) as count FROM screenshots GROUP BY category ORDER BY count DESC")
-    categories = []
-    for r in c.fetchall():
-        categories.append({
-            "name": r['category'],
-            "count": r['count']
-        })
+    categories = _category_counts(c)
     
     # Recent Insights (just 2 newest)
     c.execute("SELECT * FROM screenshots ORDER BY created_at DESC LIMIT 2")
@@ -111,17 +184,59 @@ def get_stats():
             "amount": r['amount']
         })
         
-    print(json.dumps({
+    return {
         "total_photos": total_files,
         "storage_usage": "Calculating...",
         "categories": categories,
         "insights": insights
-    }))
+    }
 
 def get_dashboard_data():
     conn = get_db()
     c = conn.cursor()
     
+    # Aggregates kept current by triggers (see db_schema._v10_dashboard_stats):
+    # each query reads one row per day or category shown.
+    if _has_stats(c):
+        c.execute("SELECT day AS date, files AS count FROM daily_stats ORDER BY day DESC LIMIT 14")
+        activity_data = [{"date": r['date'], "count": r['count']} for r in c.fetchall()]
+        activity_data.reverse()
+        c.execute("""SELECT day AS date, round(spent, 2) AS total FROM daily_stats
+                     WHERE spend_files > 0 ORDER BY day DESC LIMIT 30""")
+        finance_data = [{"date": r['date'], "total": r['total']} for r in c.fetchall()]
+        finance_data.reverse()
+        c.execute("SELECT key AS detected_language, files AS count FROM language_stats")
+        languages = [{"lang": r['detected_language'], "count": r['count']} for r in c.fetchall()]
+    else:
+        activity_data, finance_data, languages = _dashboard_aggregates(c)
+    categories = _category_counts(c)
+
+    # Recent Files (Extended)
+    c.execute("SELECT * FROM screenshots ORDER BY created_at DESC LIMIT 6")
+    recent = []
+    for r in c.fetchall():
+        recent.append({
+            "id": r['id'],
+            "filename": r['filename'],
+            "category": r['category'],
+            "text_preview": r['text'][:60] + "..." if r['text'] else "",
+            "amount": r['amount'],
+            "created_at": r['created_at'],
+            "ai_summary": r['ai_summary'],
+            "is_video": r['is_video'],
+            "path": r['path'].replace('/sdcard/Pictures/Screenshots', '/images')
+        })
+
+    return {
+        "activity": activity_data,
+        "finance": finance_data,
+        "categories": categories,
+        "languages": languages,
+        "recent": recent
+    }
+
+def _dashboard_aggregates(c):
+    """Activity, spending and languages by scanning screenshots (pre-v10 databases)."""
     # 1. Activity (Last 14 Days)
     # created_at is in milliseconds
     sql_activity = """
@@ -149,74 +264,39 @@ def get_dashboard_data():
     finance_data = [{"date": r['date'], "total": r['total']} for r in c.fetchall()]
     finance_data.reverse()
 
-    # 3. Category Breakdown (All time)
-    c.execute("SELECT category, count(*) as count FROM screenshots GROUP BY category ORDER BY count DESC")
-    categories = [{"name": r['category'], "count": r['count']} for r in c.fetchall()]
-
-    # 4. Language Distribution
+    # 3. Language Distribution
     c.execute("SELECT detected_language, count(*) as count FROM screenshots WHERE detected_language IS NOT NULL GROUP BY detected_language")
     languages = [{"lang": r['detected_language'], "count": r['count']} for r in c.fetchall()]
+    return activity_data, finance_data, languages
 
-    # 5. Recent Files (Extended)
-    c.execute("SELECT * FROM screenshots ORDER BY created_at DESC LIMIT 6")
-    recent = []
-    for r in c.fetchall():
-        recent.append({
-            "id": r['id'],
-            "filename": r['filename'],
-            "category": r['category'],
-            "text_preview": r['text'][:60] + "..." if r['text'] else "",
-            "amount": r['amount'],
-            "created_at": r['created_at'],
-            "ai_summary": r['ai_summary'],
-            "is_video": r['is_video'],
-            "path": r['path'].replace('/sdcard/Pictures/Screenshots', '/images')
-        })
-
-    print(json.dumps({
-        "activity": activity_data,
-        "finance": finance_data,
-        "categories": categories,
-        "languages": languages,
-        "recent": recent
-    }))
+# Highlight markers for snippet(); swapped for <mark> after HTML-escaping
+_HL_START, _HL_END = "\x02", "\x03"
 
-def search(query, filters_json="{}"):
-    try:
-        filters = json.loads(filters_json)
-    except:
-        filters = {}
-
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Base query
-    sql = "SELECT * FROM screenshots WHERE (text LIKE ? OR category LIKE ? OR ai_summary LIKE ?)"
-    term = f"%{query}%"
-    params = [term, term, term]
-    
-    # Apply filters
+def _search_filters(filters):
+    """Build the AND-ed SQL fragment and params for the search filters."""
+    sql = ""
+    params = []
     if filters.get('category') and filters['category'] != "":
-        sql += " AND category = ?"
+        sql += " AND s.category = ?"
         params.append(filters['category'])
         
     if filters.get('minAmount'):
         try:
-            sql += " AND amount >= ?"
             params.append(float(filters['minAmount']))
+            sql += " AND s.amount >= ?"
         except ValueError: pass
         
     if filters.get('maxAmount'):
         try:
-            sql += " AND amount <= ?"
             params.append(float(filters['maxAmount']))
+            sql += " AND s.amount <= ?"
         except ValueError: pass
         
     if filters.get('startDate'):
         try:
             dt = datetime.strptime(filters['startDate'], "%Y-%m-%d")
             ts = int(dt.timestamp() * 1000)
-            sql += " AND created_at >= ?"
+            sql += " AND s.created_at >= ?"
             params.append(ts)
         except ValueError: pass
         
@@ -225,171 +305,324 @@ def search(query, filters_json="{}"):
             dt = datetime.strptime(filters['endDate'], "%Y-%m-%d")
             dt = dt.replace(hour=23, minute=59, second=59)
             ts = int(dt.timestamp() * 1000)
-            sql += " AND created_at <= ?"
+            sql += " AND s.created_at <= ?"
             params.append(ts)
         except ValueError: pass
+    return sql, params
+
+def _fts_match(query):
+    """Turn free text into an FTS5 MATCH expression.
+
+    All terms must match; the last one as a prefix, since the viewer
+    searches as the user types.
+    """
+    terms = [f'"{t}"' for t in re.findall(r"\w+", query)]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+_fts_available = False
+
+def _has_fts(c):
+    global _fts_available
+    if not _fts_available:
+        c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='screenshots_fts'")
+        _fts_available = c.fetchone() is not None
+    return _fts_available
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(_HL_START, "<mark>").replace(_HL_END, "</mark>")
+
+def search(query, filters_json="{}", cursor=None, limit=50):
+    """Full-text search, BM25-ranked, with keyset pagination.
+
+    cursor is the next_cursor of the previous page. Falls back to a
+    newest-first LIKE scan when the query has no searchable terms or the
+    database has no FTS index.
+    """
+    try:
+        filters = json.loads(filters_json)
+    except:
+        filters = {}
+    limit = max(1, min(int(limit), 200))
+    return Stream("results", _search_results(query, filters, cursor, limit))
+
+def _search_results(query, filters, cursor, limit):
+    conn = get_db()
+    c = conn.cursor()
+    filter_sql, filter_params = _search_filters(filters)
+    match = _fts_match(query)
+
+    if match and _has_fts(c):
+        sql = f"""SELECT s.id, s.filename, s.category, s.path, s.amount, s.created_at,
+                         screenshots_fts.rank AS sort_key
+                  FROM screenshots_fts JOIN screenshots s ON s.id = screenshots_fts.rowid
+                  WHERE screenshots_fts MATCH ?{filter_sql}"""
+        params = [match] + filter_params
+        if cursor:
+            rank, last_id = cursor.split(":")
+            sql += " AND (screenshots_fts.rank > ? OR (screenshots_fts.rank = ? AND s.id > ?))"
+            params += [float(rank), float(rank), int(last_id)]
+        sql += " ORDER BY screenshots_fts.rank, s.id LIMIT ?"
+    else:
+        term = f"%{query}%"
+        sql = f"""SELECT s.id, s.filename, s.category, s.path, s.amount, s.created_at,
+                         s.created_at AS sort_key, substr(s.text, 1, 100) AS snippet
+                  FROM screenshots s
+                  WHERE (s.text LIKE ? OR s.category LIKE ? OR s.ai_summary LIKE ?){filter_sql}"""
+        params = [term, term, term] + filter_params
+        # Rows without a date sort last (NULL is lowest); their cursor is "null:<id>"
+        if cursor:
+            created_at, last_id = cursor.split(":")
+            if created_at in ("null", "None"):
+                sql += " AND s.created_at IS NULL AND s.id < ?"
+                params += [int(last_id)]
+            else:
+                sql += """ AND (s.created_at < ? OR (s.created_at = ? AND s.id < ?)
+                               OR s.created_at IS NULL)"""
+                params += [int(created_at), int(created_at), int(last_id)]
+        sql += " ORDER BY s.created_at DESC, s.id DESC LIMIT ?"
+    params.append(limit + 1)
 
-    sql += " ORDER BY created_at DESC LIMIT 50"
-    
     c.execute(sql, params)
+    rows = c.fetchall()
+    page = rows[:limit]
+
+    if match and page and 'snippet' not in page[0].keys():
+        # Snippets only for the rows on this page, not for every match
+        ids = [r['id'] for r in page]
+        c.execute(f"""SELECT rowid, snippet(screenshots_fts, -1, ?, ?, '…', 16)
+                      FROM screenshots_fts
+                      WHERE screenshots_fts MATCH ? AND rowid IN ({','.join('?' * len(ids))})""",
+                  [_HL_START, _HL_END, match] + ids)
+        snippets = dict(c.fetchall())
+    else:
+        snippets = {r['id']: r['snippet'] for r in page}
     
-    results = []
-    for r in c.fetchall():
-        results.append({
+    for r in page:
+        yield {
             "filename": r['filename'],
             "category": r['category'],
             "path": r['path'].replace('/sdcard/Pictures/Screenshots', '/images'),
-            "text_snippet": r['text'][:100] if r['text'] else "",
+            "text_snippet": _highlight(snippets.get(r['id']) or ""),
             "amount": r['amount'],
             "created_at": r['created_at']
-        })
-    
-    print(json.dumps(results))
+        }
 
-def get_category_files(category, sort_by="date_desc"):
-    conn = get_db()
-    c = conn.cursor()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        sort_key = "null" if last['sort_key'] is None else repr(last['sort_key'])
+        next_cursor = f"{sort_key}:{last['id']}"
     
-    order_clause = "created_at DESC"
-    if sort_by == "date_asc":
-        order_clause = "created_at ASC"
-    elif sort_by == "name_asc":
-        order_clause = "filename ASC"
-    elif sort_by == "name_desc":
-        order_clause = "filename DESC"
-    elif sort_by == "amount_desc":
-        order_clause = "amount DESC NULLS LAST"
-
-    sql = f"SELECT * FROM screenshots WHERE category = ? ORDER BY {order_clause}"
-    c.execute(sql, (category,))
-    
-    files = []
-    for r in c.fetchall():
-        files.append({
+    return {"next_cursor": next_cursor}
+
+# sort_by -> (column, descending); ties are broken by id in the same direction
+_CATEGORY_SORTS = {
+    "date_desc": ("created_at", True),
+    "date_asc": ("created_at", False),
+    "name_asc": ("filename", False),
+    "name_desc": ("filename", True),
+    "amount_desc": ("amount", True),
+}
+
+def _category_rows(c, category, column, descending, after, limit):
+    """Yield up to limit rows of a category in (column, id) order, after the `after` key.
+
+    SQLite sorts NULLs first, so rows without a key come last in
+    descending order. NULL and non-NULL keys are read by separate
+    queries so that each one is an index seek from the cursor position,
+    however deep into the category the page is.
+    """
+    op, order = ("<", "DESC") if descending else (">", "ASC")
+    parts = [False, True] if descending else [True, False]  # NULL part?, in output order
+    if after is not None:
+        parts = parts[parts.index(after[0] is None):]
+    for i, null_part in enumerate(parts):
+        sql = f"""SELECT id, filename, path, created_at, ai_summary, amount, {column} AS sort_key
+                  FROM screenshots
+                  WHERE category = ? AND {column} IS {'' if null_part else 'NOT '}NULL"""
+        params = [category]
+        if i == 0 and after is not None:
+            if null_part:
+                sql += f" AND id {op} ?"
+                params.append(after[1])
+            else:
+                sql += f" AND ({column}, id) {op} (?, ?)"
+                params += after
+        sql += f" ORDER BY {column} {order}, id {order} LIMIT ?"
+        for row in c.execute(sql, params + [limit]):
+            yield row
+            limit -= 1
+        if limit <= 0:
+            return
+
+def get_category_files(category, sort_by="date_desc", cursor=None, limit=200):
+    """One page of a category's files, keyset-paginated.
+
+    cursor is the next_cursor of the previous page ([sort key, id] as
+    JSON). Only the listed columns are read, never the OCR text.
+    """
+    column, descending = _CATEGORY_SORTS.get(sort_by, _CATEGORY_SORTS["date_desc"])
+    limit = max(1, min(int(limit), 500))
+    after = json.loads(cursor) if cursor else None
+    return Stream("files", _category_files(category, column, descending, after, limit))
+
+def _category_files(category, column, descending, after, limit):
+    c = get_db().cursor()
+    count = 0
+    last = None
+    for r in _category_rows(c, category, column, descending, after, limit + 1):
+        if count == limit:
+            return {"next_cursor": json.dumps([last['sort_key'], last['id']])}
+        yield {
             "name": r['filename'],
             "path": r['path'].replace('/sdcard/Pictures/Screenshots', '/images'),
             "created_at": r['created_at'],
             "ai_summary": r['ai_summary'],
             "amount": r['amount']
-        })
-    
-    print(json.dumps({"files": files}))
+        }
+        count += 1
+        last = r
+    return {"next_cursor": None}
+
+def export_expenses(start, end=None, formats="csv"):
+    """Export Finance rows to SCREENSHOTS_DIR/Exports (see expense_export.py).
 
-def export_expenses(year_month):
-    # year_month format: "YYYY-MM"
+    start/end are months ("YYYY-MM", one file per month and format) or
+    days ("YYYY-MM-DD", one file per format for the whole range); end
+    defaults to start. formats is a comma-separated list of csv, parquet
+    and arrow. Files whose rows have not changed are not rewritten.
+    """
+    _add_repo_root_to_path()
     try:
-        dt = datetime.strptime(year_month, "%Y-%m")
-        year = dt.year
-        month = dt.month
-        
-        start_ts = int(dt.timestamp() * 1000)
-        
-        # Next month calculation
-        if month == 12:
-            next_month_dt = datetime(year + 1, 1, 1)
-        else:
-            next_month_dt = datetime(year, month + 1, 1)
-            
-        end_ts = int(next_month_dt.timestamp() * 1000) - 1
-        
-        conn = get_db()
-        c = conn.cursor()
-        
-        c.execute('''SELECT * FROM screenshots 
-                     WHERE category='Finance' 
-                     AND created_at BETWEEN ? AND ? 
-                     ORDER BY created_at ASC''', (start_ts, end_ts))
-                     
-        rows = c.fetchall()
-        
-        # Ensure export dir
+        import expense_export
+        periods = expense_export.parse_periods(start, end or None)
+        formats = [f.strip() for f in (formats or "").split(",") if f.strip()] or ["csv"]
         export_dir = os.path.join(SCREENSHOTS_DIR, "Exports")
-        os.makedirs(export_dir, exist_ok=True)
-        
-        filename = f"expenses_{year_month}.csv"
-        filepath = os.path.join(export_dir, filename)
-        
-        with open(filepath, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Date', 'Amount', 'Filename', 'Summary', 'Text Snippet'])
-            
-            for r in rows:
-                date_str = datetime.fromtimestamp(r['created_at'] / 1000).strftime('%Y-%m-%d %H:%M:%S')
-                writer.writerow([
-                    date_str,
-                    r['amount'] if r['amount'] else 0,
-                    r['filename'],
-                    r['ai_summary'] or "",
-                    (r['text'] or "")[:100].replace('\n', ' ')
-                ])
-                
-        # Return path relative to public dir if possible, or absolute
-        # Web viewer serves /images mapped to SCREENSHOTS_DIR
-        web_path = f"/images/Exports/{filename}"
-        print(json.dumps({"success": True, "path": filepath, "url": web_path, "count": len(rows)}))
-        
+        files = expense_export.export(get_db(), periods, export_dir, formats)
+    except ImportError as e:
+        return {"error": f"{e.name} not installed. Install with: pip install {e.name}"}
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        return {"error": str(e)}
+
+    # Web viewer serves /images mapped to SCREENSHOTS_DIR
+    for f in files:
+        f["url"] = f"/images/Exports/{f['name']}"
+    first = files[0]
+    return {"success": True, "path": first["path"], "url": first["url"],
+            "count": sum(f["count"] for f in files if f["format"] == first["format"]),
+            "files": files}
+
+def _duplicate_graph(conn):
+    """Near-duplicate structure from dup_index's tables: (members, neighbours).
+
+    members maps each hash to the ids that have it (a cluster of exact
+    duplicates); neighbours maps a hash to the other hashes within the
+    duplicate threshold. Only hashes with a duplicate are included.
+    Brings the persisted index up to date first when the indexer's modules
+    are importable and the database is writable; databases from before the
+    index existed are searched in memory instead.
+    """
+    _add_repo_root_to_path()
+    try:
+        import dup_index
+    except ImportError:
+        dup_index = None
+
+    neighbours = {}
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='phash_hashes'").fetchone()
+    if has_table:
+        if dup_index:
+            try:
+                dup_index.sync(conn)
+            except sqlite3.Error as e:
+                # Read-only mount or a busy indexer; use what the indexer has stored
+                conn.rollback()
+                print(f"Duplicate index sync failed: {e}", file=sys.stderr)
+        for a, b in conn.execute("SELECT a, b FROM phash_pairs"):
+            neighbours.setdefault(a, set()).add(b)
+            neighbours.setdefault(b, set()).add(a)
+        members = {}
+        for image_id, h in conn.execute('''SELECT screenshot_id, hash FROM phash_index
+                                           WHERE hash IN (SELECT hash FROM phash_index
+                                                          GROUP BY hash HAVING count(*) > 1)
+                                              OR hash IN (SELECT a FROM phash_pairs)
+                                              OR hash IN (SELECT b FROM phash_pairs)'''):
+            members.setdefault(h, []).append(image_id)
+        return members, neighbours
+
+    if not dup_index:
+        return {}, {}
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(screenshots)")}
+    column = 'dhash' if 'dhash' in columns else 'phash'
+    items = []
+    for row in conn.execute(f"SELECT id, {column} FROM screenshots WHERE {column} IS NOT NULL"):
+        try:
+            items.append((row[0], dup_index.parse_hash(row[1])))
+        except ValueError:
+            pass
+    members = dup_index.clusters(items)
+    for a, b, _ in dup_index.near_hash_pairs(members):
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+    return {h: ids for h, ids in members.items() if len(ids) > 1 or h in neighbours}, neighbours
 
 def find_duplicates():
+    """Group near-duplicate images (dHash within 4 bits) across the whole library.
+
+    Groups are built newest first: each ungrouped image collects its
+    ungrouped neighbours, as before, but neighbours come from the
+    multi-index hash table instead of a 500-item date window. Groups are
+    streamed as they are formed; only ids and dates are held for the
+    whole library, the rest of each image's fields are read per group.
+    """
+    return Stream("", _duplicate_groups())
+
+def _duplicate_groups():
     conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT id, filename, path, phash, created_at, category, amount FROM screenshots WHERE phash IS NOT NULL ORDER BY created_at DESC")
-    rows = c.fetchall()
-    
-    images = []
-    for r in rows:
-        try:
-            val = int(r['phash'], 16)
-            images.append({
+    members, neighbours = _duplicate_graph(conn)
+    if not members:
+        return
+
+    hash_of = {image_id: h for h, ids in members.items() for image_id in ids}
+    created = {}
+    ids = list(hash_of)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        created.update(conn.execute(f"""SELECT id, created_at FROM screenshots
+                                        WHERE id IN ({placeholders})""", chunk))
+
+    def newest_first(image_id):
+        return (-(created[image_id] or 0), image_id)
+
+    processed = set()
+    for image_id in sorted(created, key=newest_first):
+        if image_id in processed:
+            continue
+        h = hash_of[image_id]
+        candidates = [n for other in [h, *neighbours.get(h, ())] for n in members.get(other, ())]
+        others = sorted((n for n in candidates
+                         if n != image_id and n in created and n not in processed),
+                        key=newest_first)
+        if others:
+            processed.add(image_id)
+            processed.update(others)
+            group = [image_id] + others
+            placeholders = ",".join("?" * len(group))
+            rows = {r['id']: r for r in conn.execute(
+                f"""SELECT id, filename, path, created_at, category, amount
+                    FROM screenshots WHERE id IN ({placeholders})""", group)}
+            yield [{
                 "id": r['id'],
                 "filename": r['filename'],
                 "path": r['path'].replace('/sdcard/Pictures/Screenshots', '/images'),
-                "phash": val,
                 "created_at": r['created_at'],
                 "category": r['category'],
                 "amount": r['amount']
-            })
-        except: pass
-        
-    groups = []
-    processed = set()
-    
-    # Optimization: Sort by phash value to check nearby hashes? 
-    # No, Hamming distance is not linear. 
-    # We will just do brute force O(N^2) but optimized by skipping processed.
-    # Limit to comparing against last 1000 items to avoid timeouts on huge libraries.
-    
-    for i, img1 in enumerate(images):
-        if img1['id'] in processed:
-            continue
-            
-        current_group = [img1]
-        
-        # Check against others
-        # Heuristic: Check next 500 items (since sorted by date, duplicates are usually close in time)
-        # OR just check all if N < 1000.
-        
-        search_range = range(i + 1, len(images))
-        if len(images) > 1000:
-             search_range = range(i + 1, min(i + 500, len(images)))
-        
-        for j in search_range:
-            img2 = images[j]
-            if img2['id'] in processed:
-                continue
-            
-            # Distance
-            dist = bin(img1['phash'] ^ img2['phash']).count('1')
-            if dist <= 4: # Threshold 4 bits (more strict)
-                current_group.append(img2)
-                processed.add(img2['id'])
-        
-        if len(current_group) > 1:
-            groups.append(current_group)
-            processed.add(img1['id'])
-            
-    print(json.dumps(groups))
+            } for r in map(rows.get, group)]
 
 def delete_file(filename):
     conn = get_db()
@@ -397,22 +630,23 @@ def delete_file(filename):
     c.execute("SELECT path FROM screenshots WHERE filename = ?", (filename,))
     row = c.fetchone()
     if not row:
-        print(json.dumps({"error": "File not found"}))
-        return
+        return {"error": "File not found"}
         
     path = row['path']
     try:
+        c.execute("DELETE FROM screenshots WHERE filename = ?", (filename,))
         if os.path.exists(path):
             os.remove(path)
-        c.execute("DELETE FROM screenshots WHERE filename = ?", (filename,))
         conn.commit()
-        print(json.dumps({"success": True}))
+        notify_indexer()
+        return {"success": True}
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        conn.rollback()
+        return {"error": str(e)}
 
 def get_categories():
     # Add parent dir to path to import sort_screenshots
-    sys.path.append(os.path.join(BASE_DIR, ".."))
+    _add_repo_root_to_path()
     
     defaults = {}
     try:
@@ -430,18 +664,23 @@ def get_categories():
                 user_cats = json.load(f)
         except: pass
         
-    print(json.dumps({"defaults": defaults, "user": user_cats}))
+    return {"defaults": defaults, "user": user_cats}
 
 def save_categories(cats_json):
     config_path = os.path.join(BASE_DIR, "../user_categories.json")
     try:
         # Validate JSON
         cats = json.loads(cats_json)
-        with open(config_path, 'w') as f:
+        # Replace atomically: the indexer reloads on a changed mtime/inode
+        # and must never read a half-written file
+        tmp_path = config_path + ".tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(cats, f, indent=4)
-        print(json.dumps({"success": True}))
+        os.replace(tmp_path, config_path)
+        notify_indexer()
+        return {"success": True}
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        return {"error": str(e)}
 
 def save_image_data(filename, b64_data):
     conn = get_db()
@@ -449,8 +688,7 @@ def save_image_data(filename, b64_data):
     c.execute("SELECT path, category FROM screenshots WHERE filename = ?", (filename,))
     row = c.fetchone()
     if not row:
-        print(json.dumps({"error": "File not found"}))
-        return
+        return {"error": "File not found"}
         
     path = row['path']
     category = row['category']
@@ -464,7 +702,7 @@ def save_image_data(filename, b64_data):
             f.write(base64.b64decode(b64_data))
             
         # Regenerate thumbnail
-        sys.path.append(os.path.join(BASE_DIR, ".."))
+        _add_repo_root_to_path()
         try:
             import sort_screenshots
             sort_screenshots.SOURCE_DIR = SCREENSHOTS_DIR
@@ -472,40 +710,32 @@ def save_image_data(filename, b64_data):
         except Exception as e:
             pass # Ignore import errors
             
-        print(json.dumps({"success": True}))
+        notify_indexer()
+        return {"success": True}
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        return {"error": str(e)}
 
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        return {"error": str(e)}
 
-def generate_kb():
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM screenshots")
-    rows = c.fetchall()
-    
-    kb_dir = os.path.join(SCREENSHOTS_DIR, "knowledge_base")
-    os.makedirs(kb_dir, exist_ok=True)
-    
-    count = 0
-    for r in rows:
-        category = r['category'] or "Unsorted"
-        cat_dir = os.path.join(kb_dir, category)
-        os.makedirs(cat_dir, exist_ok=True)
-        
-        try:
-            date_str = datetime.fromtimestamp(r['created_at'] / 1000).strftime('%Y-%m-%d')
-        except:
-            date_str = "0000-00-00"
-            
-        safe_name = os.path.splitext(r['filename'])[0].replace(" ", "_")
-        md_name = f"{date_str}_{safe_name}.md"
-        md_path = os.path.join(cat_dir, md_name)
-        
-        rel_img_path = f"../../{category}/{r['filename']}"
-        
-        content = f"""---
+# Bump when the page template changes; every page is then rewritten once
+KB_FORMAT = 2
+KB_CHUNK = 1000
+KB_WRITERS = 8
+
+def _kb_page_path(category, filename, created_at):
+    """Page path relative to the knowledge base, and the date it shows."""
+    try:
+        date_str = datetime.fromtimestamp(created_at / 1000).strftime('%Y-%m-%d')
+    except:
+        date_str = "0000-00-00"
+    safe_name = os.path.splitext(filename)[0].replace(" ", "_")
+    return os.path.join(category or "Unsorted", f"{date_str}_{safe_name}.md"), date_str
+
+def _kb_page(r, date_str):
+    category = r['category'] or "Unsorted"
+    rel_img_path = f"../../{category}/{r['filename']}"
+    return f"""---
 date: {date_str}
 amount: {r['amount'] or 0}
 tags: [{category}]
@@ -523,72 +753,200 @@ tags: [{category}]
 {r['text'] or ""}
 ```
 """
-        with open(md_path, "w") as f:
-            f.write(content)
-        count += 1
-        
-    print(json.dumps({"success": True, "count": count, "path": kb_dir}))
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No command provided"}))
-        return
+def _write_page(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
 
-    command = sys.argv[1]
-    
+def _load_kb_manifest(path):
+    """{row id: (page path, revision)} of the pages written last time."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != KB_FORMAT:
+            return {}
+        return {row_id: (page, revision) for row_id, page, revision in manifest["pages"]}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+def generate_kb(force=False):
+    """Write a markdown page per screenshot under knowledge_base/, incrementally.
+
+    .manifest.json records the page path and revision (db_schema v12) of
+    every page written. A run streams (id, revision, path fields) in
+    chunks without touching the text, rewrites only pages whose row is new
+    or changed (reading those rows in chunks, writing on a thread pool),
+    and deletes pages whose row is gone. force, a new KB_FORMAT or a
+    database without the revision column rewrite every page.
+    """
+    conn = get_db()
+    kb_dir = os.path.join(SCREENSHOTS_DIR, "knowledge_base")
+    os.makedirs(kb_dir, exist_ok=True)
+    manifest_path = os.path.join(kb_dir, ".manifest.json")
+
+    has_revision = any(col[1] == 'revision' for col in conn.execute("PRAGMA table_info(screenshots)"))
+    previous = _load_kb_manifest(manifest_path) if has_revision and not force else {}
+
+    pages = {}   # row id -> (page path, revision)
+    owners = {}  # page path -> row id; on a name clash the newest row's page is kept
+    c = conn.execute(f"""SELECT id, {'revision' if has_revision else 'NULL'}, category, filename, created_at
+                         FROM screenshots ORDER BY id""")
+    for rows in iter(lambda: c.fetchmany(KB_CHUNK), []):
+        for row_id, revision, category, filename, created_at in rows:
+            page = previous.get(row_id)
+            # Same revision, same path fields: reuse the path without formatting it
+            if page is None or page[1] != revision:
+                page = (_kb_page_path(category, filename, created_at)[0], revision)
+            pages[row_id] = page
+            page = page[0]
+            owners[page] = row_id
+    current = {row_id: pages[row_id] for row_id in owners.values()}
+    stale = [row_id for row_id, page in current.items() if previous.get(row_id) != page]
+    removed = [page for page, _ in previous.values() if page not in owners]
+
+    made_dirs = set()
+    with ThreadPoolExecutor(max_workers=KB_WRITERS) as pool:
+        for i in range(0, len(stale), KB_CHUNK):
+            chunk = stale[i:i + KB_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            writes = []
+            for r in conn.execute(f"""SELECT id, filename, category, created_at, amount, ai_summary, text
+                                      FROM screenshots WHERE id IN ({placeholders})""", chunk):
+                page, date_str = _kb_page_path(r['category'], r['filename'], r['created_at'])
+                path = os.path.join(kb_dir, page)
+                page_dir = os.path.dirname(path)
+                if page_dir not in made_dirs:
+                    os.makedirs(page_dir, exist_ok=True)
+                    made_dirs.add(page_dir)
+                writes.append(pool.submit(_write_page, path, _kb_page(r, date_str)))
+            for write in writes:
+                write.result()
+
+    for page in removed:
+        try:
+            os.remove(os.path.join(kb_dir, page))
+        except FileNotFoundError:
+            pass
+
+    if stale or removed or len(current) != len(previous):
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": KB_FORMAT,
+                       "pages": [[row_id, page, revision] for row_id, (page, revision) in current.items()]}, f)
+        os.replace(tmp_path, manifest_path)
+
+    return {"success": True, "count": len(current), "written": len(stale),
+            "deleted": len(removed), "path": kb_dir}
+
+def run_command(command, args):
+    """Run a bridge command and return its JSON-serialisable result."""
     if command == "stats":
-        get_stats()
+        return get_stats()
     elif command == "dashboard_data":
-        get_dashboard_data()
+        return get_dashboard_data()
     elif command == "search":
-        if len(sys.argv) < 3:
-            print(json.dumps([]))
-        else:
-            query = sys.argv[2]
-            filters = sys.argv[3] if len(sys.argv) > 3 else "{}"
-            search(query, filters)
+        if len(args) < 1:
+            return {"results": [], "next_cursor": None}
+        query = args[0]
+        filters = args[1] if len(args) > 1 else "{}"
+        cursor = args[2] if len(args) > 2 and args[2] else None
+        limit = args[3] if len(args) > 3 and args[3] else 50
+        return search(query, filters, cursor, limit)
     elif command == "get_category_files":
-        if len(sys.argv) < 3:
-            print(json.dumps({"error": "Missing category"}))
-        else:
-            cat = sys.argv[2]
-            sort = sys.argv[3] if len(sys.argv) > 3 else "date_desc"
-            get_category_files(cat, sort)
+        if len(args) < 1:
+            return {"error": "Missing category"}
+        sort = args[1] if len(args) > 1 and args[1] else "date_desc"
+        cursor = args[2] if len(args) > 2 and args[2] else None
+        limit = args[3] if len(args) > 3 and args[3] else 200
+        return get_category_files(args[0], sort, cursor, limit)
     elif command == "move_file":
-        if len(sys.argv) < 4:
-            print(json.dumps({"error": "Missing filename or category"}))
-        else:
-            filename = sys.argv[2]
-            new_cat = sys.argv[3]
-            move_file(filename, new_cat)
+        if len(args) < 2:
+            return {"error": "Missing filename or category"}
+        return move_file(args[0], args[1])
     elif command == "export_expenses":
-        if len(sys.argv) < 3:
-            print(json.dumps({"error": "Missing year-month (YYYY-MM)"}))
-        else:
-            export_expenses(sys.argv[2])
+        if len(args) < 1:
+            return {"error": "Missing year-month (YYYY-MM) or start date (YYYY-MM-DD)"}
+        end = args[1] if len(args) > 1 and args[1] else None
+        formats = args[2] if len(args) > 2 and args[2] else "csv"
+        return export_expenses(args[0], end, formats)
     elif command == "find_duplicates":
-        find_duplicates()
+        return find_duplicates()
     elif command == "delete_file":
-        if len(sys.argv) < 3:
-            print(json.dumps({"error": "Missing filename"}))
-        else:
-            delete_file(sys.argv[2])
+        if len(args) < 1:
+            return {"error": "Missing filename"}
+        return delete_file(args[0])
     elif command == "get_categories":
-        get_categories()
+        return get_categories()
     elif command == "save_categories":
-        if len(sys.argv) < 3:
-            print(json.dumps({"error": "Missing config JSON"}))
-        else:
-            save_categories(sys.argv[2])
+        if len(args) < 1:
+            return {"error": "Missing config JSON"}
+        return save_categories(args[0])
     elif command == "save_image_data":
-        if len(sys.argv) < 4:
-            print(json.dumps({"error": "Missing filename or data"}))
-        else:
-            save_image_data(sys.argv[2], sys.argv[3])
+        if len(args) < 2:
+            return {"error": "Missing filename or data"}
+        return save_image_data(args[0], args[1])
     elif command == "generate_kb":
-        generate_kb()
-    else:
-        print(json.dumps({"error": "Unknown command"}))
+        return generate_kb(force=bool(args) and args[0] == "force")
+    return {"error": "Unknown command"}
+
+def _write_stream(out, req_id, stream):
+    """Write a Stream's items, one line each, and return its end reply."""
+    out.write(json.dumps({"id": req_id, "stream": stream.key}) + "\n")
+    for count, item in enumerate(stream):
+        out.write(json.dumps({"id": req_id, "item": item}) + "\n")
+        if count == 0:
+            # First results out now; the rest leave as the buffer fills
+            out.flush()
+    return {"id": req_id, "result": stream.fields}
+
+def serve():
+    """Long-lived mode: answer JSON-lines requests on stdin until EOF.
+
+    Each request is {"id", "cmd", "args"}; the reply is one line,
+    {"id", "result"} or {"id", "error"}. A Stream result is sent as
+    {"id", "stream": key}, then one {"id", "item"} line per item and a
+    final {"id", "result"} with its other fields (an error line may end
+    it early). One SQLite connection and the imported modules stay warm
+    across requests, which saves an interpreter start per API call.
+    """
+    global _shared_conn
+    out = sys.stdout
+    # Keep the protocol stream clean: stray prints and logging go to stderr
+    sys.stdout = sys.stderr
+    _shared_conn = get_db()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        req_id = None
+        try:
+            req = json.loads(line)
+            req_id = req.get("id")
+            result = run_command(req["cmd"], req.get("args", []))
+            if isinstance(result, Stream):
+                reply = _write_stream(out, req_id, result)
+            else:
+                reply = {"id": req_id, "result": result}
+        except (Exception, SystemExit) as e:
+            reply = {"id": req_id, "error": str(e)}
+        finally:
+            # A failed write must not keep the write lock into the next request
+            if _shared_conn.in_transaction:
+                _shared_conn.rollback()
+        out.write(json.dumps(reply) + "\n")
+        out.flush()
+
+def main():
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "No command provided"}))
+        return
+
+    if sys.argv[1] == "serve":
+        serve()
+        return
+
+    result = run_command(sys.argv[1], sys.argv[2:])
+    print(json.dumps(result.collect() if isinstance(result, Stream) else result))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,11 +2,13 @@ const express = require('express');
 const cors = require('cors');
 const fs = require('fs');
 const path = require('path');
-const { exec } = require('child_process');
+const readline = require('readline');
+const { spawn } = require('child_process');
 
 const app = express();
 const PORT = 4000;
-const SCREENSHOTS_DIR = '/sdcard/Pictures/Screenshots';
+// The indexer's SOURCE_DIR (db_bridge.py reads the same variable)
+const SCREENSHOTS_DIR = process.env.SOURCE_DIR || '/sdcard/Pictures/Screenshots';
 
 app.use(cors());
 app.use(express.json({ limit: '50mb' }));
@@ -14,28 +16,184 @@ app.use(express.static('public'));
 app.use('/images', express.static(SCREENSHOTS_DIR));
 app.use('/thumbnails', express.static(path.join(SCREENSHOTS_DIR, '.thumbs')));
 
-// Helper to run Python bridge
-function runBridge(command, args = []) {
+// Python bridge: long-lived `db_bridge.py serve` processes speaking JSON
+// lines over stdin/stdout, respawned on demand if they exit. A child
+// answers one request at a time, so requests are spread over a pool of
+// BRIDGE_POOL_SIZE children, and slow jobs (knowledge base, duplicate
+// scan, export) run on a child of their own instead of queueing ahead of
+// stats and search. Large lists (category pages, search results,
+// duplicate groups) arrive as a {id, stream} line, one {id, item} line per
+// item and a final {id, result}.
+// A child whose stream is paused for a slow client is blocked (and holds
+// its read snapshot open), so it is picked for new requests only when
+// every child is paused, and a stream paused for longer than
+// STREAM_PAUSE_MS is abandoned: the rest of it is read and discarded.
+const BRIDGE_POOL_SIZE = Math.max(1, parseInt(process.env.BRIDGE_POOL_SIZE, 10) || 2);
+const STREAM_PAUSE_MS = parseInt(process.env.STREAM_PAUSE_MS, 10) || 30000;
+const SLOW_COMMANDS = new Set(['generate_kb', 'find_duplicates', 'export_expenses']);
+const bridgePool = new Array(BRIDGE_POOL_SIZE).fill(null);
+let slowBridge = null;
+let nextRequestId = 1;
+
+function startBridge(onGone) {
+    const child = spawn('python3', ['db_bridge.py', 'serve'], {
+        cwd: __dirname,
+        stdio: ['pipe', 'pipe', 'inherit']
+    });
+    const lines = readline.createInterface({ input: child.stdout });
+    // id -> { resolve, reject, onStream, onItem }
+    const pending = new Map();
+    const bridge = { child, lines, pending, paused: 0, alive: true };
+
+    lines.on('line', (line) => {
+        let msg;
+        try {
+            msg = JSON.parse(line);
+        } catch (e) {
+            console.error("Failed to parse bridge output:", line);
+            return;
+        }
+        const request = pending.get(msg.id);
+        if (!request) return;
+        if (msg.item !== undefined) {
+            request.onItem(msg.item);
+            return;
+        }
+        if (msg.stream !== undefined) {
+            request.stream = msg.stream;
+            request.onStream(msg.stream);
+            return;
+        }
+        pending.delete(msg.id);
+        if (msg.error !== undefined) {
+            console.error(`Bridge error: ${msg.error}`);
+            request.reject(new Error(msg.error));
+        } else {
+            request.resolve({ result: msg.result, stream: request.stream });
+        }
+    });
+
+    const fail = (err) => {
+        if (!bridge.alive) return;
+        bridge.alive = false;
+        onGone(bridge);
+        for (const request of pending.values()) request.reject(err);
+        pending.clear();
+        lines.close();
+        child.kill();
+    };
+    child.on('error', (err) => {
+        console.error(`Bridge error: ${err.message}`);
+        fail(err);
+    });
+    // EPIPE when writing to a child that has died
+    child.stdin.on('error', (err) => {
+        console.error(`Bridge stdin error: ${err.message}`);
+        fail(err);
+    });
+    child.on('exit', (code) => {
+        console.error(`Bridge exited with code ${code}`);
+        fail(new Error('Bridge exited'));
+    });
+    return bridge;
+}
+
+// The child for a command: the slow-job child, or the least busy pool member
+function bridgeFor(command) {
+    if (SLOW_COMMANDS.has(command)) {
+        if (!slowBridge) slowBridge = startBridge((b) => { if (slowBridge === b) slowBridge = null; });
+        return slowBridge;
+    }
+    const load = (b) => (b.paused ? BRIDGE_POOL_SIZE * 1e6 : 0) + b.pending.size;
+    let slot = 0;
+    for (let i = 0; i < bridgePool.length; i++) {
+        if (!bridgePool[i]) { slot = i; break; }
+        if (load(bridgePool[i]) < load(bridgePool[slot])) slot = i;
+    }
+    if (!bridgePool[slot]) {
+        bridgePool[slot] = startBridge((b) => { if (bridgePool[slot] === b) bridgePool[slot] = null; });
+    }
+    return bridgePool[slot];
+}
+
+// Send a request; a streamed list is handed to onStream(key) and then
+// onItem(item, pause) as it arrives. pause() stops reading the child's
+// output, which in turn blocks the child, until the function it returns
+// is called, or rejects the request after STREAM_PAUSE_MS. Resolves with { result, stream } where stream is the list's
+// key ('' for a bare list) or undefined.
+function requestBridge(command, args = [], onStream = () => {}, onItem = () => {}) {
     return new Promise((resolve, reject) => {
-        // Escape args to prevent injection (basic)
-        const safeArgs = args.map(a => `"${a.replace(/"/g, '\\"')}"`).join(' ');
-        const cmd = `python3 db_bridge.py ${command} ${safeArgs}`;
-        
-        exec(cmd, { cwd: __dirname }, (error, stdout, stderr) => {
-            if (error) {
-                console.error(`Bridge error: ${error.message}`);
-                reject(error);
-                return;
-            }
-            try {
-                const data = JSON.parse(stdout);
-                resolve(data);
-            } catch (e) {
-                console.error("Failed to parse bridge output:", stdout);
-                reject(e);
+        const bridge = bridgeFor(command);
+        const id = nextRequestId++;
+        const pause = () => {
+            bridge.lines.pause();
+            bridge.paused++;
+            let timer = null;
+            const resume = () => {
+                if (!timer) return;
+                clearTimeout(timer);
+                timer = null;
+                if (--bridge.paused === 0) bridge.lines.resume();
+            };
+            timer = setTimeout(() => {
+                // Later lines for this id are dropped by the 'line' handler
+                if (bridge.pending.delete(id)) reject(new Error('Client stalled the stream'));
+                resume();
+            }, STREAM_PAUSE_MS);
+            return resume;
+        };
+        bridge.pending.set(id, { resolve, reject, onStream, onItem: (item) => onItem(item, pause) });
+        bridge.child.stdin.write(JSON.stringify({ id, cmd: command, args }) + '\n');
+    });
+}
+
+// Helper to run Python bridge; streamed lists are collected into the result
+async function runBridge(command, args = []) {
+    const items = [];
+    const { result, stream } = await requestBridge(command, args, () => {}, (item) => items.push(item));
+    if (stream === undefined) return result;
+    return stream === '' ? items : { [stream]: items, ...result };
+}
+
+// Run a bridge command and write its result to res as it streams in, so
+// neither process holds the whole list. Sends the same JSON document as
+// res.json(await runBridge(...)), or NDJSON (one line per item, then
+// {"done": true, ...other fields}) when the client accepts application/x-ndjson.
+// When res's buffer is full the bridge is paused until it drains, so a
+// slow client holds up the child instead of filling Node's memory.
+async function sendBridge(req, res, command, args = []) {
+    const ndjson = (req.get('Accept') || '').includes('application/x-ndjson');
+    let count = 0;
+    let resume = null;
+    const drained = () => {
+        if (resume) resume();
+        resume = null;
+    };
+    res.on('drain', drained);
+    // A client that hangs up never drains
+    res.on('close', drained);
+    try {
+        const { result, stream } = await requestBridge(command, args, (key) => {
+            res.type(ndjson ? 'application/x-ndjson' : 'json');
+            if (!ndjson) res.write(key === '' ? '[' : `{${JSON.stringify(key)}:[`);
+        }, (item, pause) => {
+            const json = JSON.stringify(item);
+            if (!res.write(ndjson ? json + '\n' : (count++ ? ',' : '') + json) && !resume && !res.destroyed) {
+                resume = pause();
             }
         });
-    });
+        if (stream === undefined) return res.json(result);
+        if (ndjson) return res.end(JSON.stringify({ done: true, ...result }) + '\n');
+        if (stream === '') return res.end(']');
+        const rest = Object.entries(result || {})
+            .map(([k, v]) => `,${JSON.stringify(k)}:${JSON.stringify(v)}`).join('');
+        res.end(`]${rest}}`);
+    } catch (e) {
+        console.error(e);
+        // Part of the body is out: cut it short so the client sees an error
+        if (res.headersSent) return res.destroy(e);
+        res.status(500).json({ error: e.toString() });
+    }
 }
 
 app.get('/api/stats', async (req, res) => {
@@ -75,8 +233,9 @@ app.get('/api/search', async (req, res) => {
             minAmount: req.query.minAmount,
             maxAmount: req.query.maxAmount
         };
-        const results = await runBridge('search', [query, JSON.stringify(filters)]);
-        res.json(results);
+        const cursor = req.query.cursor || "";
+        const limit = req.query.limit || "";
+        await sendBridge(req, res, 'search', [query, JSON.stringify(filters), cursor, limit]);
     } catch (error) {
         console.error(error);
         res.status(500).json({ error: 'Search failed' });
@@ -87,9 +246,10 @@ app.get('/api/category/:name', async (req, res) => {
     try {
         const catName = req.params.name;
         const sort = req.query.sort || 'date_desc';
+        const cursor = req.query.cursor || "";
+        const limit = req.query.limit || "";
         if (catName.includes('..')) return res.status(400).send('Invalid');
-        const data = await runBridge('get_category_files', [catName, sort]);
-        res.json(data);
+        await sendBridge(req, res, 'get_category_files', [catName, sort, cursor, limit]);
     } catch (e) {
         console.error(e);
         res.status(500).send(e.toString());
@@ -111,9 +271,12 @@ app.post('/api/move-file', async (req, res) => {
 
 app.post('/api/export', async (req, res) => {
     try {
-        const { month } = req.body;
-        if (!month) return res.status(400).json({ error: 'Missing month' });
-        const result = await runBridge('export_expenses', [month]);
+        // { month } or { start, end } as "YYYY-MM" months or "YYYY-MM-DD" days;
+        // formats: any of "csv", "parquet", "arrow"
+        const { month, start, end, formats } = req.body;
+        if (!month && !start) return res.status(400).json({ error: 'Missing month' });
+        const fmt = Array.isArray(formats) ? formats.join(',') : (formats || 'csv');
+        const result = await runBridge('export_expenses', [start || month, end || '', fmt]);
         if (result.error) return res.status(500).json(result);
         res.json(result);
     } catch (e) {
@@ -122,15 +285,7 @@ app.post('/api/export', async (req, res) => {
     }
 });
 
-app.get('/api/duplicates', async (req, res) => {
-    try {
-        const result = await runBridge('find_duplicates');
-        res.json(result);
-    } catch (e) {
-        console.error(e);
-        res.status(500).json({ error: e.toString() });
-    }
-});
+app.get('/api/duplicates', (req, res) => sendBridge(req, res, 'find_duplicates'));
 
 app.delete('/api/file/:filename', async (req, res) => {
     try {
@@ -3,33 +3,16 @@ import time
 import random
 from datetime import datetime, timedelta
 
+import db_schema
+
 DB_FILE = "screenshots.db"
 
 def seed():
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     
-    # Create table if not exists (schema from sort_screenshots.py)
-    c.execute('''CREATE TABLE IF NOT EXISTS screenshots (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        filename TEXT UNIQUE,
-        path TEXT,
-        category TEXT,
-        text TEXT,
-        amount REAL,
-        created_at INTEGER,
-        processed_at INTEGER,
-        ai_category TEXT,
-        ai_summary TEXT,
-        ai_processed_at INTEGER,
-        detected_language TEXT,
-        translated_text TEXT,
-        is_video INTEGER,
-        video_frames_analyzed INTEGER,
-        video_objects TEXT,
-        ocr_method TEXT,
-        ai_extracted_text TEXT
-    )''')
+    # Create/upgrade the schema shared with sort_screenshots.py
+    db_schema.migrate(conn)
 
     # Check if empty
     c.execute("SELECT count(*) FROM screenshots")
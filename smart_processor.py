@@ -14,7 +14,7 @@ import logging
 import json
 import re
 from datetime import datetime
-import pytesseract
+import ocr_engine
 from PIL import Image
 
 # LLM Imports
@@ -102,7 +102,7 @@ def analyze_image(llm, image_path):
     # 2. OCR Analysis
     # logging.info("Extracting text...")
     try:
-        text = pytesseract.image_to_string(Image.open(image_path)).strip()
+        text = ocr_engine.get_engine().recognize(Image.open(image_path)).strip()
     except Exception as e:
         text = f"OCR Failed: {e}"
         
@@ -1,15 +1,28 @@
 import os
 import shutil
-import pytesseract
 import time
 import logging
 import sys
 import sqlite3
 import re
-import base64
 import json
+import io
+import hashlib
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 from PIL import Image, ImageEnhance
 
+import db_schema
+import ai_service
+import dup_index
+import classifier
+import image_hashing
+import ocr_engine
+import result_cache
+import translation
+import video_sampler
+
 # Configuration (can be overridden via environment variables for Docker)
 SOURCE_DIR = os.environ.get('SOURCE_DIR', "/sdcard/Pictures/Screenshots")
 DB_FILE = os.environ.get('DB_FILE', "screenshots.db")
@@ -40,21 +53,83 @@ logging.info(f"Destination directory: {SOURCE_DIR}")
 AI_ENABLED = os.environ.get('SCREENSORT_AI', '0') == '1'
 MODEL_PATH = "models/moondream2-text-model-f16.gguf"
 MMPROJ_PATH = "models/moondream2-mmproj-f16.gguf"
+# Run the model in its own process behind a request queue (0 = in the indexer)
+AI_SERVICE_ENABLED = os.environ.get('SCREENSORT_AI_SERVICE', '1') == '1'
+# Threads given to the model; leave the rest of the cores to OCR
+AI_THREADS = int(os.environ.get('SCREENSORT_AI_THREADS',
+                                str(max(1, (os.cpu_count() or 2) // 2))))
 
 # Video Processing Configuration
 VIDEO_ENABLED = os.environ.get('SCREENSORT_VIDEO', '0') == '1'
-VIDEO_FRAME_INTERVAL = 5  # Extract frame every N seconds
-VIDEO_MAX_FRAMES = 10     # Maximum frames to analyze per video
+# Candidate frames are sampled every VIDEO_FRAME_INTERVAL seconds (up to
+# VIDEO_MAX_CANDIDATES); only visually distinct ones, at most
+# VIDEO_MAX_FRAMES, are sent to the model (see video_sampler.select_distinct)
+VIDEO_FRAME_INTERVAL = float(os.environ.get('SCREENSORT_VIDEO_INTERVAL', '1'))
+VIDEO_MAX_CANDIDATES = 600
+VIDEO_MAX_FRAMES = int(os.environ.get('SCREENSORT_VIDEO_MAX_FRAMES', '10'))
+VIDEO_SCENE_THRESHOLD = int(os.environ.get('SCREENSORT_VIDEO_SCENE_THRESHOLD',
+                                           str(video_sampler.SCENE_THRESHOLD)))
 
 # Translation Configuration
 TRANSLATION_ENABLED = os.environ.get('SCREENSORT_TRANSLATE', '0') == '1'
 TARGET_LANGUAGE = 'en'  # Default target language
+# 'google' (googletrans), 'argos' (offline Argos Translate model) or the URL
+# of a LibreTranslate-compatible server (see translation.py)
+TRANSLATE_BACKEND = os.environ.get('SCREENSORT_TRANSLATE_BACKEND', translation.GOOGLE)
+TRANSLATE_BATCH_SEGMENTS = int(os.environ.get('SCREENSORT_TRANSLATE_BATCH',
+                                              str(translation.BATCH_SEGMENTS)))
 
 # AI OCR Configuration (use Moondream2 for text extraction instead of pytesseract)
 AI_OCR_ENABLED = os.environ.get('SCREENSORT_AI_OCR', '0') == '1'
 
+# Parallel OCR Configuration (worker processes for OCR/dHash/thumbnails; 1 = serial)
+OCR_WORKERS = int(os.environ.get('SCREENSORT_WORKERS', '1'))
+
+# Watch mode (--watch): seconds a file must stay quiet before it is ingested
+WATCH_DEBOUNCE = float(os.environ.get('SCREENSORT_WATCH_DEBOUNCE', '2'))
+# Touched in SOURCE_DIR by db_bridge.py to wake a watching indexer for a
+# full rescan. The bridge finds SOURCE_DIR through the same environment
+# variable, so both must run with the same SOURCE_DIR.
+WAKE_FILE = ".screensort_wake"
+
+# Re-sort the library from stored text when user_categories.json changes
+AUTO_RECLASSIFY = os.environ.get('SCREENSORT_AUTO_RECLASSIFY', '0') == '1'
+
+# Content-addressed OCR/AI result cache (result_cache.py). Defaults to
+# <DB_FILE stem>_cache.db; bounded to SCREENSORT_CACHE_MB megabytes.
+RESULT_CACHE_FILE = os.environ.get('SCREENSORT_CACHE_FILE')
+RESULT_CACHE_MB = int(os.environ.get('SCREENSORT_CACHE_MB', '128'))
+# Tesseract backend (ocr_engine.py): 'auto' keeps an in-process tesserocr
+# session per worker when installed, else forks pytesseract per image
+OCR_ENGINE = os.environ.get('SCREENSORT_OCR_ENGINE', ocr_engine.AUTO)
+OCR_LANG = os.environ.get('SCREENSORT_OCR_LANG', 'eng')
+# OCR preprocessing: 'adaptive' upscales only small text and crops system
+# bars; 'legacy' always upscales 2x (see preprocess_image)
+OCR_PREPROCESS = os.environ.get('SCREENSORT_OCR_PREPROCESS', 'adaptive')
+OCR_MIN_TEXT_HEIGHT = 28     # Text lines shorter than this (px) are upscaled...
+OCR_TARGET_TEXT_HEIGHT = 40  # ...to about this height
+OCR_MAX_UPSCALE = 3.0
+# Bump when OCR preprocessing or hashing changes; invalidates cached OCR
+OCR_RESULT_VERSION = f"tesseract/2-{OCR_PREPROCESS}-{OCR_LANG}"
+
+# SQLite write batching: commit after this many rows or this many seconds
+COMMIT_BATCH_SIZE = int(os.environ.get('SCREENSORT_COMMIT_BATCH', '200'))
+COMMIT_INTERVAL = float(os.environ.get('SCREENSORT_COMMIT_INTERVAL', '2'))
+
+VALID_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.mp4', '.mov',
+                    '.avi', '.mkv', '.webm', '.3gp']
+
 # Global LLM instance (lazy loaded)
 _llm_instance = None
+# Moondream service process (lazy started, see ai_service.py)
+_ai_service = None
+_result_cache = None
+# A pool worker's own result cache connection (see _init_worker)
+_worker_cache = None
+# (config, translation.Translator) for the current backend/target/cache
+_translator = None
+# Compiled matcher etc. for the current CATEGORIES (see category_views)
+_category_views = None
 
 DEFAULT_CATEGORIES = {
     "Finance": ["bank", "pay", "rs", "transaction", "payment", "fund", "debit",
@@ -79,20 +154,80 @@ DEFAULT_CATEGORIES = {
 
 CATEGORIES = DEFAULT_CATEGORIES.copy()
 USER_CATEGORIES_FILE = "user_categories.json"
+# (mtime_ns, size, inode) of USER_CATEGORIES_FILE when it was last read
+_categories_signature = None
 
-def load_categories():
-    """Load categories from defaults and user config."""
-    global CATEGORIES
-    CATEGORIES = DEFAULT_CATEGORIES.copy()
-    if os.path.exists(USER_CATEGORIES_FILE):
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def load_categories(force=False):
+    """Load categories from defaults and user config.
+
+    The file is only re-read when its mtime, size or inode changed since
+    the last load (db_bridge.save_categories replaces it atomically), and
+    CATEGORIES is only replaced when the content changed. A file that
+    fails to parse keeps the current categories. Returns True if they
+    changed.
+    """
+    global CATEGORIES, _categories_signature
+    signature = _file_signature(USER_CATEGORIES_FILE)
+    if signature == _categories_signature and not force:
+        return False
+    _categories_signature = signature
+    categories = DEFAULT_CATEGORIES.copy()
+    if signature is not None:
         try:
             with open(USER_CATEGORIES_FILE, 'r') as f:
                 user_cats = json.load(f)
                 for cat, keywords in user_cats.items():
-                    CATEGORIES[cat] = keywords
-            # logging.info("Loaded user categories.") # Too spammy if inside loop?
+                    categories[cat] = keywords
         except Exception as e:
             logging.error(f"Error loading user categories: {e}")
+            return False
+    if categories == CATEGORIES:
+        return False
+    CATEGORIES = categories
+    logging.info(f"Loaded categories (version {categories_version()})")
+    return True
+
+
+class CategoryViews:
+    """Everything derived from one CATEGORIES dict, built once per version."""
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.version = hashlib.blake2b(json.dumps(categories, sort_keys=True).encode(),
+                                       digest_size=6).hexdigest()
+        self.classifier = classifier.KeywordClassifier(categories)
+        # Category list offered to the AI prompt
+        self.valid = list(categories) + ["Unsorted"]
+        self.names_digest = hashlib.blake2b(",".join(sorted(categories)).encode(),
+                                            digest_size=4).hexdigest()
+
+
+def category_views():
+    """Views of the current CATEGORIES, rebuilt when it is replaced."""
+    global _category_views
+    if _category_views is None or _category_views.categories is not CATEGORIES:
+        _category_views = CategoryViews(CATEGORIES)
+    return _category_views
+
+
+def get_classifier():
+    """Keyword classifier compiled from the current CATEGORIES."""
+    return category_views().classifier
+
+
+def categories_version():
+    """Content digest of the current category config."""
+    return category_views().version
+
 
 # Configure Logging
 logging.basicConfig(
@@ -103,91 +238,226 @@ logging.basicConfig(
 
 
 def init_db():
-    """Initialize the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS screenshots (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        filename TEXT UNIQUE,
-        path TEXT,
-        category TEXT,
-        text TEXT,
-        amount REAL,
-        created_at INTEGER,
-        processed_at INTEGER,
-        ai_category TEXT,
-        ai_summary TEXT,
-        ai_processed_at INTEGER
-    )''')
-    # Add new columns to existing tables (migration for existing DBs)
-    migrations = [
-        ('ai_category', 'TEXT'), ('ai_summary', 'TEXT'),
-        ('ai_processed_at', 'INTEGER'), ('detected_language', 'TEXT'),
-        ('translated_text', 'TEXT'), ('is_video', 'INTEGER'),
-        ('video_frames_analyzed', 'INTEGER'), ('video_objects', 'TEXT'),
-        ('ocr_method', 'TEXT'), ('ai_extracted_text', 'TEXT'),
-        ('phash', 'TEXT')
-    ]
-    for col, coltype in migrations:
-        try:
-            c.execute(f'ALTER TABLE screenshots ADD COLUMN {col} {coltype}')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-    conn.commit()
+    """Initialize the SQLite database.
+
+    Switches the file to WAL so the web viewer can keep reading while the
+    indexer writes, then applies pending schema migrations (db_schema).
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    db_schema.migrate(conn)
+    dup_index.sync(conn)
     return conn
 
 
-def compute_dhash(image_path, hash_size=8):
-    """Compute Difference Hash (dHash) for an image."""
+class CommitBatcher:
+    """Group writes into size- or time-bounded transactions.
+
+    Call add() after each write; the transaction is committed once
+    max_rows writes are pending or max_seconds have passed since the
+    first one. Call checkpoint() before slow work, so rows that are
+    already due are not left holding the write lock through it. Call
+    flush() when done.
+    """
+
+    def __init__(self, conn, max_rows=None, max_seconds=None):
+        self.conn = conn
+        self.max_rows = max_rows or COMMIT_BATCH_SIZE
+        self.max_seconds = COMMIT_INTERVAL if max_seconds is None else max_seconds
+        self.pending = 0
+        self.started = None
+
+    def add(self, count=1):
+        if self.pending == 0:
+            self.started = time.monotonic()
+        self.pending += count
+        if (self.pending >= self.max_rows
+                or time.monotonic() - self.started >= self.max_seconds):
+            self.flush()
+
+    def checkpoint(self):
+        """Commit if max_seconds have passed since the first pending write."""
+        if self.pending and time.monotonic() - self.started >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        """Commit everything open on the connection, counted or not."""
+        if self.pending or self.conn.in_transaction:
+            self.conn.commit()
+        self.pending = 0
+
+
+def _result_cache_path():
+    return RESULT_CACHE_FILE or os.path.splitext(DB_FILE)[0] + "_cache.db"
+
+
+def get_result_cache():
+    """Open the OCR/AI result cache that belongs to the current DB_FILE."""
+    global _result_cache
+    path = _result_cache_path()
+    if _result_cache is None or _result_cache[0] != path:
+        if _result_cache is not None:
+            _result_cache[1].close()
+        _result_cache = (path, result_cache.ResultCache(path, RESULT_CACHE_MB * 1024 * 1024))
+    return _result_cache[1]
+
+
+def _ai_cache_version(task):
+    """Cache version for an AI task: model, prompt and (for categorize) category set."""
+    version = f"{os.path.basename(MODEL_PATH)}/{ai_service.PROMPT_VERSION}"
+    if task == ai_service.CATEGORIZE:
+        version += "/" + category_views().names_digest
+    return version
+
+
+def cached_ai_task(content_hash, task, compute):
+    """Return the cached result of an AI task for this content, or compute and store it."""
+    cache = get_result_cache()
+    kind = f"ai:{task}"
+    version = _ai_cache_version(task)
+    hit = cache.get(content_hash, kind, version)
+    if hit is not None:
+        return tuple(hit) if isinstance(hit, list) else hit
+    value = compute()
+    if value and value != (None, None):
+        cache.put(content_hash, kind, version, value)
+    return value
+
+
+def _row_content_hash(conn, row_id, path, stored=None):
+    """content_hash of an indexed file, computed and saved if missing."""
+    if stored:
+        return stored
+    try:
+        key = result_cache.content_key(path)
+    except OSError:
+        return None
+    conn.execute("UPDATE screenshots SET content_hash=? WHERE id=?", (key, row_id))
+    return key
+
+
+THUMBNAIL_SIZE = (300, 300)
+_PREVIEW_SIDE = 2 * max(THUMBNAIL_SIZE)
+# Hash-only decodes: a few times the DCT input is plenty
+_HASH_PREVIEW_SIDE = 4 * image_hashing.DCT_SIZE
+
+
+class ImageContext:
+    """One decoded image shared by the OCR, dHash and thumbnail stages.
+
+    The file is decoded once. Stage inputs are derived from that bitmap and
+    cached: a grayscale copy for OCR and a reduced RGB preview (about twice
+    the thumbnail size) that feeds both the thumbnail and the hash. With
+    full_resolution=False only the preview is needed, so JPEGs are decoded
+    at reduced scale via PIL's draft mode; preview_side shrinks the preview
+    further when nothing but the hash is wanted.
+    """
+
+    def __init__(self, path, full_resolution=True, preview_side=_PREVIEW_SIDE):
+        self.path = path
+        self.preview_side = preview_side
+        img = Image.open(path)
+        if not full_resolution:
+            scale = max(img.size) / preview_side
+            if scale > 1:
+                img.draft('RGB', (int(img.width / scale), int(img.height / scale)))
+        img.load()
+        self.image = img
+        self._gray = None
+        self._preview = None
+
+    @property
+    def gray(self):
+        """Full-resolution grayscale bitmap."""
+        if self._gray is None:
+            self._gray = self.image.convert('L')
+        return self._gray
+
+    @property
+    def preview(self):
+        """RGB (or L) bitmap box-reduced to about twice the thumbnail size.
+
+        Hashes are computed from this bitmap, not the full decode, so they
+        can differ by a few bits from hashes of the full-size image.
+        """
+        if self._preview is None:
+            img = self.image
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            factor = max(img.size) // self.preview_side
+            self._preview = img.reduce(factor) if factor > 1 else img
+        return self._preview
+
+    def ocr_input(self):
+        """Preprocessed grayscale image for tesseract."""
+        return preprocess_image(self.gray)
+
+    def hash_inputs(self):
+        """Reduced grayscale arrays for image_hashing.hash_batch()."""
+        return image_hashing.hash_inputs(self.preview)
+
+    def thumbnail(self):
+        """JPEG thumbnail bytes."""
+        img = self.preview.copy()
+        img.thumbnail(THUMBNAIL_SIZE)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=60)
+        return buf.getvalue()
+
+
+def compute_hashes(image_path, ctx=None):
+    """Return (dhash, ahash, dct_hash) as signed 64-bit ints, or None.
+
+    Hashed from the context's reduced preview (JPEGs also decoded in draft
+    mode), so a dHash can differ by a few bits from one computed with a
+    LANCZOS resize of the full image, as before schema v6. Such rows have
+    no dct_hash, and the hash backfill rehashes all of them.
+    """
     try:
         if is_video_file(image_path):
             return None # Skip videos for now
-            
-        img = Image.open(image_path)
-        # 1. Resize to (width+1, height)
-        img = img.resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS).convert("L")
-        
-        pixels = list(img.getdata())
-        
-        # 2. Compare adjacent pixels
-        diff = []
-        for row in range(hash_size):
-            for col in range(hash_size):
-                pixel_left = pixels[row * (hash_size + 1) + col]
-                pixel_right = pixels[row * (hash_size + 1) + col + 1]
-                diff.append(1 if pixel_left > pixel_right else 0)
-                
-        # 3. Convert binary array to hex string
-        decimal_value = 0
-        for i, val in enumerate(diff):
-             if val:
-                 decimal_value += 2**i
-                 
-        return hex(decimal_value)[2:] # Strip '0x'
+
+        if ctx is None:
+            ctx = ImageContext(image_path, full_resolution=False)
+        return image_hashing.hash_batch([ctx.hash_inputs()])[0]
     except Exception as e:
-        logging.warning(f"dHash computation failed for {image_path}: {e}")
+        logging.warning(f"Hash computation failed for {image_path}: {e}")
         return None
 
 
+def thumbnail_path(filename, category):
+    """Return the thumbnail location for a file in a category."""
+    return os.path.join(SOURCE_DIR, ".thumbs", category, filename)
+
+
+def render_thumbnail(image_path, ctx=None):
+    """Render the 300px JPEG thumbnail for an image and return its bytes."""
+    if ctx is None:
+        ctx = ImageContext(image_path, full_resolution=False)
+    return ctx.thumbnail()
+
+
+def write_thumbnail(data, filename, category):
+    """Write pre-rendered thumbnail bytes into the category thumbnail folder."""
+    thumb_path = thumbnail_path(filename, category)
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    with open(thumb_path, "wb") as f:
+        f.write(data)
+
+
 def generate_thumbnail(image_path, category):
     """Generate a thumbnail for the image."""
     try:
         if is_video_file(image_path):
             return 
             
-        filename = os.path.basename(image_path)
-        thumb_dir = os.path.join(SOURCE_DIR, ".thumbs", category)
-        os.makedirs(thumb_dir, exist_ok=True)
-        thumb_path = os.path.join(thumb_dir, filename)
-        
+        thumb_path = thumbnail_path(os.path.basename(image_path), category)
         if os.path.exists(thumb_path):
             return
 
-        img = Image.open(image_path)
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        img.thumbnail((300, 300))
-        img.save(thumb_path, "JPEG", quality=60)
+        write_thumbnail(render_thumbnail(image_path),
+                        os.path.basename(image_path), category)
         
     except Exception as e:
         logging.warning(f"Thumbnail generation failed for {image_path}: {e}")
@@ -210,32 +480,28 @@ def get_llm():
     global _llm_instance
     if not AI_ENABLED:
         return None
-    if _llm_instance is not None:
-        return _llm_instance
-    if not os.path.exists(MODEL_PATH):
-        logging.warning(f"AI model not found at {MODEL_PATH}. "
-                        "Run download_model.py first.")
-        return None
-    try:
-        from llama_cpp import Llama
-        from llama_cpp.llama_chat_format import MoondreamChatHandler
-        logging.info("Loading Moondream2 Model... (This may take a moment)")
-        chat_handler = MoondreamChatHandler(clip_model_path=MMPROJ_PATH)
-        _llm_instance = Llama(
-            model_path=MODEL_PATH,
-            chat_handler=chat_handler,
-            n_ctx=2048,
-            n_gpu_layers=0,
-            verbose=False
-        )
-        logging.info("Moondream2 loaded successfully.")
-        return _llm_instance
-    except ImportError:
-        logging.warning("llama-cpp-python not installed. AI features disabled.")
+    if _llm_instance is None:
+        _llm_instance = ai_service.load_model(MODEL_PATH, MMPROJ_PATH, AI_THREADS)
+    return _llm_instance
+
+
+def get_ai_service():
+    """Start the Moondream service process on first use.
+
+    Returns None when AI is off, runs in-process, or the service could not
+    load the model; callers then fall back to get_llm().
+    """
+    global _ai_service
+    if not (AI_ENABLED and AI_SERVICE_ENABLED):
         return None
-    except Exception as e:
-        logging.error(f"Failed to load LLM: {e}")
+    if _ai_service is None:
+        _ai_service = ai_service.InferenceService(MODEL_PATH, MMPROJ_PATH,
+                                                  threads=AI_THREADS)
+        _ai_service.start()
+        logging.info(f"Started AI service process ({AI_THREADS} threads)")
+    if _ai_service.available is False:
         return None
+    return _ai_service
 
 
 def analyze_image_ai(image_path):
@@ -245,42 +511,8 @@ def analyze_image_ai(image_path):
         return None, None
 
     try:
-        with open(image_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode('utf-8')
-        ext = os.path.splitext(image_path)[1].lower().replace('.', '')
-        if ext == 'jpg':
-            ext = 'jpeg'
-        data_uri = f"data:image/{ext};base64,{encoded}"
-
-        valid_cats = list(CATEGORIES.keys()) + ["Unsorted"]
-        cat_list = ", ".join(valid_cats)
-
-        messages = [
-            {"role": "system",
-             "content": "You are a helpful assistant that categorizes screenshots."},
-            {"role": "user", "content": [
-                {"type": "image_url", "image_url": {"url": data_uri}},
-                {"type": "text",
-                 "text": f"Analyze this image. Provide a Category from: [{cat_list}]. "
-                         "Then a one-sentence summary. "
-                         "Format: 'Category: <Category> | Summary: <Summary>'"}
-            ]}
-        ]
-
-        response = llm.create_chat_completion(messages=messages, max_tokens=100)
-        content = response["choices"][0]["message"]["content"]
-
-        if "Category:" in content:
-            category = content.split("Category:")[1].split("|")[0].strip()
-            if category not in valid_cats:
-                category = "Unsorted"
-            summary = (content.split("Summary:")[1].strip()
-                       if "Summary:" in content else content)
-        else:
-            category = "Unsorted"
-            summary = content
-
-        return category, summary
+        valid_cats = category_views().valid
+        return ai_service.categorize(llm, ai_service.image_data_uri(image_path), valid_cats)
     except Exception as e:
         logging.error(f"AI analysis failed for {image_path}: {e}")
         return None, None
@@ -293,34 +525,14 @@ def extract_text_ai(image_path):
         return None
 
     try:
-        with open(image_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode('utf-8')
-        ext = os.path.splitext(image_path)[1].lower().replace('.', '')
-        if ext == 'jpg':
-            ext = 'jpeg'
-        data_uri = f"data:image/{ext};base64,{encoded}"
-
-        messages = [
-            {"role": "system",
-             "content": "You are an OCR assistant. Extract ALL visible text accurately."},
-            {"role": "user", "content": [
-                {"type": "image_url", "image_url": {"url": data_uri}},
-                {"type": "text",
-                 "text": "Read and transcribe ALL text visible in this image. "
-                         "Include every word, number, and symbol. Be thorough."}
-            ]}
-        ]
-
-        response = llm.create_chat_completion(messages=messages, max_tokens=500)
-        content = response["choices"][0]["message"]["content"]
-        return content.strip()
+        return ai_service.extract_text(llm, ai_service.image_data_uri(image_path))
     except Exception as e:
         logging.error(f"AI text extraction failed for {image_path}: {e}")
         return None
 
 
 def extract_text_hybrid(image_path, use_ai_ocr=True):
-    """Extract text using hybrid approach: AI first, pytesseract fallback."""
+    """Extract text using hybrid approach: AI first, tesseract fallback."""
     ai_text = None
     ocr_text = None
 
@@ -331,13 +543,11 @@ def extract_text_hybrid(image_path, use_ai_ocr=True):
             logging.info(f"AI extracted {len(ai_text)} chars")
 
     try:
-        img = Image.open(image_path)
-        processed_img = preprocess_image(img)
-        ocr_text = pytesseract.image_to_string(processed_img)
+        ocr_text = ocr_image(image_path)
         if ocr_text:
             logging.info(f"OCR extracted {len(ocr_text)} chars")
     except Exception as e:
-        logging.warning(f"Pytesseract failed: {e}")
+        logging.warning(f"Tesseract failed: {e}")
 
     if ai_text and len(ai_text) > 20:
         return ai_text, "ai"
@@ -348,137 +558,84 @@ def extract_text_hybrid(image_path, use_ai_ocr=True):
     return None, None
 
 
-def extract_video_frames(video_path, interval=VIDEO_FRAME_INTERVAL,
-                         max_frames=VIDEO_MAX_FRAMES):
-    """Extract frames from video at regular intervals."""
-    frames = []
-    try:
-        import cv2
-    except ImportError:
-        logging.warning("opencv-python not installed. "
-                        "Install with: pip install opencv-python")
-        return frames
-
-    try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logging.warning(f"Could not open video: {video_path}")
-            return frames
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps if fps > 0 else 0
-
-        logging.info(f"Video: {duration:.1f}s, {fps:.1f}fps, "
-                     f"extracting frames every {interval}s")
-
-        frame_indices = []
-        for sec in range(0, int(duration), interval):
-            frame_indices.append(int(sec * fps))
-            if len(frame_indices) >= max_frames:
-                break
-
-        for idx in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if ret:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_img = Image.fromarray(frame_rgb)
-                frames.append(pil_img)
-
-        cap.release()
-        logging.info(f"Extracted {len(frames)} frames from video")
-    except Exception as e:
-        logging.error(f"Video frame extraction failed: {e}")
-
-    return frames
-
-
 def analyze_video_ai(video_path):
-    """Analyze video by extracting frames and running AI on each."""
-    if not VIDEO_ENABLED or not AI_ENABLED:
-        return None, None, 0, None
+    """Analyze video by sampling frames and running AI on the distinct ones.
 
-    frames = extract_video_frames(video_path)
-    if not frames:
+    Frames come from video_sampler in a single decoding pass, one at a
+    time; near-identical frames are dropped before inference. The rest go
+    to the model as in-memory JPEGs, and the object and category prompts
+    for a frame run back to back on the same JPEG (see ai_service).
+    """
+    if not VIDEO_ENABLED or not AI_ENABLED:
         return None, None, 0, None
 
     llm = get_llm()
     if llm is None:
         return None, None, 0, None
 
+    valid_cats = category_views().valid
     all_objects = []
     categories_found = []
     summaries = []
+    analyzed = 0
 
-    for i, frame in enumerate(frames):
+    frames = video_sampler.select_distinct(
+        video_sampler.iter_frames(video_path, VIDEO_FRAME_INTERVAL, VIDEO_MAX_CANDIDATES),
+        VIDEO_MAX_FRAMES, VIDEO_SCENE_THRESHOLD)
+    for i, (seconds, frame) in enumerate(frames):
+        analyzed += 1
         try:
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                frame.save(tmp.name, 'JPEG')
-                tmp_path = tmp.name
-
-            logging.info(f"Analyzing frame {i + 1}/{len(frames)}...")
-
-            with open(tmp_path, "rb") as f:
-                encoded = base64.b64encode(f.read()).decode('utf-8')
-            data_uri = f"data:image/jpeg;base64,{encoded}"
-
-            messages = [
-                {"role": "system",
-                 "content": "You identify objects and activities in video frames."},
-                {"role": "user", "content": [
-                    {"type": "image_url", "image_url": {"url": data_uri}},
-                    {"type": "text",
-                     "text": "List main objects, people, activities. Comma-separated."}
-                ]}
-            ]
-
-            response = llm.create_chat_completion(messages=messages, max_tokens=80)
-            content = response["choices"][0]["message"]["content"]
-            all_objects.append(content)
-
-            cat, summary = analyze_image_ai(tmp_path)
+            logging.info(f"Analyzing frame {i + 1} ({seconds:.1f}s)...")
+            data_uri = ai_service.pil_data_uri(frame)
+            all_objects.append(ai_service.list_objects(llm, data_uri))
+            cat, summary = ai_service.categorize(llm, data_uri, valid_cats)
             if cat:
                 categories_found.append(cat)
             if summary:
                 summaries.append(summary)
-
-            os.unlink(tmp_path)
         except Exception as e:
             logging.error(f"Frame {i + 1} analysis failed: {e}")
 
+    if not analyzed:
+        return None, None, 0, None
+
     if categories_found:
-        from collections import Counter
-        most_common_cat = Counter(categories_found).most_common(1)[0][0]
+        most_common_cat = collections.Counter(categories_found).most_common(1)[0][0]
     else:
         most_common_cat = "Videos"
 
     combined_objects = " | ".join(all_objects) if all_objects else None
     combined_summary = summaries[0] if summaries else None
 
-    return most_common_cat, combined_summary, len(frames), combined_objects
+    return most_common_cat, combined_summary, analyzed, combined_objects
 
 
 def detect_language(text):
     """Detect the language of text. Returns language code or None."""
     if not text or len(text.strip()) < 10:
         return None
-    try:
-        from langdetect import detect, LangDetectException
-        lang = detect(text)
-        return lang
-    except ImportError:
-        logging.warning("langdetect not installed. "
-                        "Install with: pip install langdetect")
-        return None
-    except LangDetectException:
+    detector = translation.get_detector()
+    if detector is None:
         return None
+    try:
+        return detector.detect(text)
     except Exception as e:
         logging.error(f"Language detection failed: {e}")
         return None
 
 
+def get_translator(target_lang=None):
+    """The process-wide translation.Translator, or None if no backend is available."""
+    global _translator
+    target_lang = target_lang or TARGET_LANGUAGE
+    config = (TRANSLATE_BACKEND, target_lang, get_result_cache())
+    if _translator is None or _translator[0] != config:
+        backend = translation.create_backend(TRANSLATE_BACKEND)
+        _translator = (config, backend and translation.Translator(
+            backend, config[2], target_lang, TRANSLATE_BATCH_SEGMENTS))
+    return _translator[1]
+
+
 def translate_text(text, source_lang=None, target_lang=TARGET_LANGUAGE):
     """Translate text to target language. Returns translated text or None."""
     if not TRANSLATION_ENABLED:
@@ -487,40 +644,42 @@ def translate_text(text, source_lang=None, target_lang=TARGET_LANGUAGE):
         return None
     if source_lang == target_lang:
         return None
-
-    try:
-        from googletrans import Translator
-        translator = Translator()
-        result = translator.translate(
-            text, src=source_lang or 'auto', dest=target_lang)
-        return result.text
-    except ImportError:
-        logging.warning("googletrans not installed. "
-                        "Install with: pip install googletrans==4.0.0-rc1")
-        return None
-    except Exception as e:
-        logging.error(f"Translation failed: {e}")
+    translator = get_translator(target_lang)
+    if translator is None:
         return None
+    return translator.translate_many([(text, source_lang)])[0]
 
 
-def process_text_translation(text):
-    """Detect language and translate if not in target language."""
-    if not TRANSLATION_ENABLED or not text:
-        return None, None
-
-    detected_lang = detect_language(text)
-    if not detected_lang:
-        return None, None
-
-    logging.info(f"Detected language: {detected_lang}")
-
-    if detected_lang == TARGET_LANGUAGE:
-        return detected_lang, None
+def process_translation_backfill(conn, limit=200):
+    """Translate indexed text whose detected language is not TARGET_LANGUAGE.
 
-    translated = translate_text(text, source_lang=detected_lang)
-    if translated:
-        logging.info(f"Translated from {detected_lang} to {TARGET_LANGUAGE}")
-    return detected_lang, translated
+    Indexing only detects the language; the text of up to `limit` such
+    rows is translated here in one translation.Translator batch, so
+    segments shared between screenshots are sent to the backend once.
+    Rows the backend failed on stay untranslated and are retried on the
+    next call. Returns the number of rows translated.
+    """
+    if not TRANSLATION_ENABLED:
+        return 0
+    rows = conn.execute('''SELECT id, COALESCE(ai_extracted_text, text), detected_language
+                           FROM screenshots
+                           WHERE detected_language IS NOT NULL
+                             AND detected_language != ?
+                             AND translated_text IS NULL
+                             AND COALESCE(ai_extracted_text, text) != ''
+                           LIMIT ?''', (TARGET_LANGUAGE, limit)).fetchall()
+    if not rows:
+        return 0
+    translator = get_translator()
+    if translator is None:
+        return 0
+    results = translator.translate_many([(text, lang) for _, text, lang in rows])
+    updates = [(translated, row_id)
+               for (row_id, _, _), translated in zip(rows, results) if translated is not None]
+    conn.executemany("UPDATE screenshots SET translated_text=? WHERE id=?", updates)
+    conn.commit()
+    logging.info(f"Translated {len(updates)} of {len(rows)} files to {TARGET_LANGUAGE}")
+    return len(updates)
 
 
 def extract_amount(text):
@@ -536,13 +695,91 @@ def extract_amount(text):
     return None
 
 
-def preprocess_image(img):
-    """Apply image processing to improve OCR accuracy."""
+# Bars hug the top/bottom edge and cover at most this fraction of the height
+_SYSTEM_BAR_FRACTION = 0.06
+
+
+def _bar_height(band):
+    """Rows of a uniform bar at the start of band (rows ordered from the edge).
+
+    A bar is a run of rows sharing one background shade, with little but
+    status icons on it, that ends where the background changes. If the
+    shade runs past the band there is no visible bar, and only blank rows
+    are dropped.
+    """
+    background = np.median(band, axis=1)
+    ink = (np.abs(band - background[:, None]) > 24).mean(axis=1)
+    same = np.abs(background - background[0]) <= 8
+    run = len(band) if same.all() else int(np.argmin(same))
+    if run < len(band) and ink[:run].mean() < 0.15:
+        return run
+    blank = ink < 0.002
+    return len(band) if blank.all() else int(np.argmin(blank))
+
+
+def system_bar_rows(gray):
+    """Return (top, bottom) rows of a grayscale array without status/nav bars."""
+    height = gray.shape[0]
+    limit = int(height * _SYSTEM_BAR_FRACTION)
+    if limit < 2:
+        return 0, height
+    arr = gray.astype(np.int16)
+    top = _bar_height(arr[:limit])
+    bottom = height - _bar_height(arr[::-1][:limit])
+    return top, bottom
+
+
+def estimate_text_height(gray):
+    """Median height in pixels of the text lines in a grayscale array.
+
+    Rows crossed by many sharp horizontal transitions are text; each run of
+    such rows is one line. Runs taller than a quarter of the image are
+    photos or illustrations and are ignored. Returns None if no line is
+    found.
+    """
+    edges = np.abs(np.diff(gray.astype(np.int16), axis=1)) > 48
+    is_text = edges.sum(axis=1) >= max(4, gray.shape[1] // 100)
+    bounds = np.diff(np.concatenate(([0], is_text.astype(np.int8), [0])))
+    heights = np.flatnonzero(bounds == -1) - np.flatnonzero(bounds == 1)
+    heights = heights[(heights >= 4) & (heights <= gray.shape[0] // 4)]
+    if not len(heights):
+        return None
+    return float(np.median(heights))
+
+
+def ocr_scale(text_height):
+    """Upscale factor that brings small text to OCR_TARGET_TEXT_HEIGHT.
+
+    Text that is already large enough is left alone; if the height is
+    unknown the legacy 2x is kept.
+    """
+    if text_height is None:
+        return 2.0
+    if text_height >= OCR_MIN_TEXT_HEIGHT:
+        return 1.0
+    return min(OCR_MAX_UPSCALE, OCR_TARGET_TEXT_HEIGHT / text_height)
+
+
+def preprocess_image(img, mode=None):
+    """Apply image processing to improve OCR accuracy.
+
+    mode (default OCR_PREPROCESS) 'adaptive' crops status/nav bars and
+    upscales only small text; 'legacy' always upscales 2x.
+    """
     try:
         img = img.convert('L')
-        width, height = img.size
-        new_size = (width * 2, height * 2)
-        img = img.resize(new_size, Image.Resampling.BICUBIC)
+        if (mode or OCR_PREPROCESS) == 'legacy':
+            scale = 2.0
+        else:
+            gray = np.asarray(img)
+            top, bottom = system_bar_rows(gray)
+            if bottom - top < img.height:
+                img = img.crop((0, top, img.width, bottom))
+                gray = gray[top:bottom]
+            scale = ocr_scale(estimate_text_height(gray))
+        if scale != 1.0:
+            new_size = (round(img.width * scale), round(img.height * scale))
+            img = img.resize(new_size, Image.Resampling.BICUBIC)
         enhancer = ImageEnhance.Contrast(img)
         img = enhancer.enhance(2.0)
         enhancer = ImageEnhance.Sharpness(img)
@@ -559,6 +796,31 @@ def is_video_file(filepath):
     return ext in ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.3gp']
 
 
+def is_media_name(filename):
+    """Check if a directory entry name is a visible image or video file."""
+    if filename.startswith("."):
+        return False
+    return os.path.splitext(filename)[1].lower() in VALID_EXTENSIONS
+
+
+def ocr_image(image_path, ctx=None):
+    """Run tesseract on the preprocessed image and return the raw text."""
+    if ctx is None:
+        ctx = ImageContext(image_path)
+    return ocr_engine.get_engine(OCR_ENGINE, OCR_LANG).recognize(ctx.ocr_input())
+
+
+def classify_text(text):
+    """Pick a category for extracted text by weighted keyword match.
+
+    Returns a (category, amount, confidence) tuple; category is "Unsorted"
+    and confidence 0.0 when no keyword matches (see classifier.py).
+    """
+    amount = extract_amount(text) if text else None
+    category, confidence = get_classifier().classify(text)
+    return category, amount, confidence
+
+
 def categorize_image(image_path, use_ai_ocr=False):
     """Categorize image using text extraction."""
     try:
@@ -574,34 +836,223 @@ def categorize_image(image_path, use_ai_ocr=False):
             if ocr_method == "ai":
                 ai_text = text
         else:
-            img = Image.open(image_path)
-            processed_img = preprocess_image(img)
-            text = pytesseract.image_to_string(processed_img)
+            text = ocr_image(image_path)
             ocr_method = "ocr"
 
-        text_lower = text.lower() if text else ""
-        amount = extract_amount(text_lower)
-
-        best_category = "Unsorted"
-        for category, keywords in CATEGORIES.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    best_category = category
-                    break
-            if best_category != "Unsorted":
-                break
-
+        best_category, amount, _ = classify_text(text)
         return best_category, text, amount, False, ocr_method, ai_text
     except Exception as e:
         logging.warning(f"Could not process image {image_path}: {e}")
         return None, None, None, False, None, None
 
 
-def process_files(conn):
-    """Scan and process new screenshot files."""
-    logging.info("Scanning for screenshots...")
-    cursor = conn.cursor()
+def analyze_file(file_path):
+    """Run the CPU-bound stages for one file: OCR, hashes and thumbnail.
+
+    The file's content hash is computed here, in the worker, and looked up
+    in the result cache; a hit skips OCR and hashing and only renders the
+    thumbnail again. Otherwise the image is decoded once into an
+    ImageContext shared by all three stages. Touches neither the database
+    nor the file's location, so it is safe to run in a worker process. AI
+    stages and cache writes are left to the writer, which owns the model.
+    Returns a dict for index_file() ("cached" tells the writer whether the
+    result still has to be stored), or None if the image could not be read.
+    """
+    analysis = {
+        "category": "Videos", "text": None, "amount": None, "confidence": None,
+        "is_video": True, "ocr_method": None, "ai_extracted_text": None,
+        "hashes": None, "thumbnail": None, "content_hash": None, "cached": False,
+    }
+    if is_video_file(file_path):
+        return analysis
+
+    try:
+        key = result_cache.content_key(file_path)
+    except OSError as e:
+        logging.warning(f"Could not read image {file_path}: {e}")
+        return None
+    cache = _worker_cache if _worker_cache is not None else get_result_cache()
+    hit = cache.get(key, "tesseract", OCR_RESULT_VERSION)
+    ctx = None
+    if hit is not None:
+        text, hashes = hit["text"], tuple(hit["hashes"]) if hit["hashes"] else None
+    else:
+        try:
+            ctx = ImageContext(file_path)
+            text = ocr_image(file_path, ctx)
+        except Exception as e:
+            logging.warning(f"Could not process image {file_path}: {e}")
+            return None
+        hashes = compute_hashes(file_path, ctx=ctx)
+
+    category, amount, confidence = classify_text(text)
+    analysis.update(category=category, text=text, amount=amount, confidence=confidence,
+                    is_video=False, ocr_method="ocr", hashes=hashes,
+                    content_hash=key, cached=hit is not None)
+    try:
+        analysis["thumbnail"] = render_thumbnail(file_path, ctx)
+    except Exception as e:
+        logging.warning(f"Thumbnail generation failed for {file_path}: {e}")
+    return analysis
+
+
+def _remember_analysis(cache, analysis):
+    """Store a fresh OCR/hash result under the content key the worker computed."""
+    if analysis is None or analysis["is_video"] or analysis["cached"]:
+        return
+    cache.put(analysis["content_hash"], "tesseract", OCR_RESULT_VERSION,
+              {"text": analysis["text"], "hashes": analysis["hashes"]})
+
+
+def _init_worker(categories, cache_path=None, cache_bytes=None):
+    """Pool initializer: give each worker the writer's current categories.
+
+    With cache_path the worker opens its own result cache connection for
+    analyze_file(); one inherited from the writer over fork() is never used.
+    """
+    global CATEGORIES, _worker_cache
+    CATEGORIES = categories
+    if cache_path is not None:
+        _worker_cache = result_cache.ResultCache(cache_path, cache_bytes)
+
+
+class ScanJournal:
+    """Persisted file state of every scanned directory.
+
+    Maps (dir, name) to (size, mtime_ns, inode). The table is loaded into
+    memory once; each scan diffs an os.scandir() listing against it so only
+    new or changed entries are returned. A directory whose mtime has not
+    moved since its last listing is skipped without being listed, unless
+    it still holds entries that failed to process. An mtime within
+    MTIME_SLACK_NS of the listing is not trusted: a file created later in
+    the same mtime tick would leave it unchanged.
+    """
+
+    # Coarsest common mtime granularity (FAT/exFAT SD cards: 2s)
+    MTIME_SLACK_NS = 2_000_000_000
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.entries = {}
+        self.failed = {}
+        self.dir_mtimes = {}
+        for d, name, size, mtime_ns, inode, failed in conn.execute(
+                "SELECT dir, name, size, mtime_ns, inode, failed FROM scan_journal"):
+            self.entries.setdefault(d, {})[name] = (size, mtime_ns, inode)
+            if failed:
+                self.failed.setdefault(d, set()).add(name)
+
+    def changed(self, directory):
+        """Return [(name, state)] for new or changed files in directory."""
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._forget(directory, list(self.entries.get(directory, {})))
+            return []
+        if (self.dir_mtimes.get(directory) == dir_mtime
+                and not self.failed.get(directory)):
+            return []
+
+        listed_at = time.time_ns()
+        known = self.entries.get(directory, {})
+        seen = set()
+        changed = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not is_media_name(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                seen.add(entry.name)
+                state = (st.st_size, st.st_mtime_ns, entry.inode())
+                if known.get(entry.name) != state:
+                    changed.append((entry.name, state))
+
+        self._forget(directory, [name for name in known if name not in seen])
+        if listed_at - dir_mtime >= self.MTIME_SLACK_NS:
+            self.dir_mtimes[directory] = dir_mtime
+        else:
+            self.dir_mtimes.pop(directory, None)
+        return changed
+
+    def changed_names(self, directory, names):
+        """Like changed(), but only stat the given names instead of listing."""
+        known = self.entries.get(directory, {})
+        changed = []
+        gone = []
+        for name in set(names):
+            if not is_media_name(name):
+                continue
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                if name in known:
+                    gone.append(name)
+                continue
+            state = (st.st_size, st.st_mtime_ns, st.st_ino)
+            if known.get(name) != state:
+                changed.append((name, state))
+        self._forget(directory, gone)
+        return changed
+
+    def record(self, directory, name, state, failed=False):
+        """Remember a file as handled so later scans skip it.
+
+        Failed files are remembered too, but their directory keeps being
+        listed so a file that was still being written is retried once its
+        size or mtime changes.
+        """
+        self.entries.setdefault(directory, {})[name] = state
+        self.conn.execute(
+            "INSERT OR REPLACE INTO scan_journal VALUES (?, ?, ?, ?, ?, ?)",
+            (directory, name) + tuple(state) + (1 if failed else 0,))
+        if failed:
+            self.failed.setdefault(directory, set()).add(name)
+        else:
+            self.failed.get(directory, set()).discard(name)
+
+    def record_path(self, path):
+        """Record a file by path, e.g. the destination of a move."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self.record(os.path.dirname(path), os.path.basename(path),
+                    (st.st_size, st.st_mtime_ns, st.st_ino))
+
+    def _forget(self, directory, names):
+        known = self.entries.get(directory, {})
+        failed = self.failed.get(directory, set())
+        for name in names:
+            known.pop(name, None)
+            failed.discard(name)
+        if names:
+            self.conn.executemany(
+                "DELETE FROM scan_journal WHERE dir = ? AND name = ?",
+                [(directory, name) for name in names])
+
+
+_scan_journal = None
 
+
+def get_scan_journal(conn):
+    """Return the in-memory scan journal for this connection."""
+    global _scan_journal
+    if _scan_journal is None or _scan_journal.conn is not conn:
+        _scan_journal = ScanJournal(conn)
+    return _scan_journal
+
+
+def _collect_new_files(cursor, journal, paths=None):
+    """List (directory, filename, path, state) for files that need indexing.
+
+    Scans every watched directory, or with paths only looks at those files
+    (as reported by the --watch event loop).
+    """
     dirs_to_scan = list(SCAN_DIRS)
     # Add destination subfolders (Categories + Unsorted)
     dirs_to_scan += [os.path.join(SOURCE_DIR, cat) for cat in CATEGORIES.keys()]
@@ -614,131 +1065,240 @@ def process_files(conn):
     dest_subfolders = set([os.path.join(SOURCE_DIR, cat) for cat in CATEGORIES.keys()])
     dest_subfolders.add(os.path.join(SOURCE_DIR, "Unsorted"))
 
-    files_processed_count = 0
+    if paths is None:
+        listings = ((d, journal.changed(d)) for d in dirs_to_scan)
+    else:
+        names_by_dir = {}
+        for path in paths:
+            names_by_dir.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+        listings = ((d, journal.changed_names(d, names))
+                    for d, names in names_by_dir.items() if d in dirs_to_scan)
+
+    indexed = None
+    candidates = []
+    for directory, changed in listings:
+        for filename, state in changed:
+            # Only skip if we are in a destination folder and file is already indexed
+            if directory in dest_subfolders:
+                if indexed is None:
+                    cursor.execute("SELECT filename FROM screenshots")
+                    indexed = {row[0] for row in cursor}
+                if filename in indexed:
+                    journal.record(directory, filename, state)
+                    continue
 
-    for directory in dirs_to_scan:
-        if not os.path.exists(directory):
-            continue
+            candidates.append((directory, filename,
+                               os.path.join(directory, filename), state))
+    return candidates
 
-        files = os.listdir(directory)
 
-        for filename in files:
-            if filename.startswith("."):
-                continue
+def index_file(conn, directory, filename, file_path, analysis):
+    """Writer stage: AI, move, thumbnail and DB insert for one analyzed file.
 
-            ext = os.path.splitext(filename)[1].lower()
-            valid_exts = ['.jpg', '.jpeg', '.png', '.mp4', '.mov',
-                          '.avi', '.mkv', '.webm', '.3gp']
-            if ext not in valid_exts:
-                continue
+    Returns the file's final path if a row was inserted, otherwise None.
+    """
+    if analysis is None:
+        return None
+    cursor = conn.cursor()
 
-            # Only skip if we are in a destination folder and file is already indexed
-            if directory in dest_subfolders:
-                cursor.execute("SELECT id FROM screenshots WHERE filename = ?",
-                               (filename,))
-                if cursor.fetchone():
-                    continue
+    category = analysis["category"]
+    text = analysis["text"]
+    amount = analysis["amount"]
+    confidence = analysis["confidence"]
+    is_video = analysis["is_video"]
+    ocr_method = analysis["ocr_method"]
+    ai_extracted_text = analysis["ai_extracted_text"]
+    dhash, ahash, dct_hash = analysis["hashes"] or (None, None, None)
+    content_hash = analysis.get("content_hash")
+    # With the AI service running, images are inserted with their OCR
+    # results now and the AI results are applied by pump_ai_service()
+    inline_ai = is_video or get_ai_service() is None
+
+    if AI_OCR_ENABLED and AI_ENABLED and inline_ai and not is_video:
+        logging.info("Using AI for text extraction...")
+        ai_text = cached_ai_task(content_hash, ai_service.OCR,
+                                 lambda: extract_text_ai(file_path))
+        if ai_text and (len(ai_text) > 20 or not text):
+            logging.info(f"AI extracted {len(ai_text)} chars")
+            text, ocr_method, ai_extracted_text = ai_text, "ai", ai_text
+            category, amount, confidence = classify_text(text)
+
+    ai_category, ai_summary = None, None
+    detected_lang, translated_text = None, None
+    video_frames_analyzed, video_objects = 0, None
+
+    if is_video and VIDEO_ENABLED:
+        logging.info(f"Running video analysis on {filename}...")
+        vid_result = analyze_video_ai(file_path)
+        vid_cat, vid_summary, vid_frames, vid_objects = vid_result
+        if vid_cat:
+            ai_category = vid_cat
+            ai_summary = vid_summary
+            video_frames_analyzed = vid_frames
+            video_objects = vid_objects
+            logging.info(f"Video analyzed: {vid_frames} frames")
+
+    elif not is_video:
+        if AI_ENABLED and inline_ai:
+            logging.info(f"Running AI analysis on {filename}...")
+            ai_category, ai_summary = cached_ai_task(content_hash, ai_service.CATEGORIZE,
+                                                     lambda: analyze_image_ai(file_path))
+            if ai_category:
+                logging.info(f"AI categorized as: {ai_category}")
+
+        if TRANSLATION_ENABLED and text:
+            # Translated in batches by process_translation_backfill
+            detected_lang = detect_language(text)
+
+    if not category:
+        return None
 
-            file_path = os.path.join(directory, filename)
-            if not os.path.isfile(file_path):
-                continue
+    effective_category = category
+    if category == "Unsorted" and ai_category and ai_category != "Unsorted":
+        effective_category = ai_category
+        logging.info(f"Using AI category: {effective_category}")
+    elif is_video and ai_category and ai_category != "Videos":
+        effective_category = ai_category
+
+    final_path = file_path
+    current_dir_name = os.path.basename(os.path.dirname(file_path))
+
+    should_move = (
+        directory in SCAN_DIRS
+        or (current_dir_name == "Unsorted"
+            and effective_category != "Unsorted")
+    )
+    if should_move:
+        dest_dir = os.path.join(SOURCE_DIR, effective_category)
+        os.makedirs(dest_dir, exist_ok=True)
+        new_path = os.path.join(dest_dir, filename)
+        
+        # Handle naming collisions
+        if os.path.exists(new_path):
+            base, ext = os.path.splitext(filename)
+            timestamp = int(time.time())
+            new_filename = f"{base}_{timestamp}{ext}"
+            new_path = os.path.join(dest_dir, new_filename)
+            filename = new_filename # Update filename for DB insert
 
-            logging.info(f"Processing new file: {filename}")
-
-            result = categorize_image(file_path, use_ai_ocr=AI_OCR_ENABLED)
-            category, text, amount, is_video, ocr_method, ai_extracted_text = result
-
-            phash = None
-            if not is_video:
-                 phash = compute_dhash(file_path)
-
-            ai_category, ai_summary = None, None
-            detected_lang, translated_text = None, None
-            video_frames_analyzed, video_objects = 0, None
-
-            if is_video and VIDEO_ENABLED:
-                logging.info(f"Running video analysis on {filename}...")
-                vid_result = analyze_video_ai(file_path)
-                vid_cat, vid_summary, vid_frames, vid_objects = vid_result
-                if vid_cat:
-                    ai_category = vid_cat
-                    ai_summary = vid_summary
-                    video_frames_analyzed = vid_frames
-                    video_objects = vid_objects
-                    logging.info(f"Video analyzed: {vid_frames} frames")
-
-            elif not is_video:
-                if AI_ENABLED:
-                    logging.info(f"Running AI analysis on {filename}...")
-                    ai_category, ai_summary = analyze_image_ai(file_path)
-                    if ai_category:
-                        logging.info(f"AI categorized as: {ai_category}")
-
-                if TRANSLATION_ENABLED and text:
-                    detected_lang, translated_text = process_text_translation(text)
-
-            if category:
-                effective_category = category
-                if category == "Unsorted" and ai_category and ai_category != "Unsorted":
-                    effective_category = ai_category
-                    logging.info(f"Using AI category: {effective_category}")
-                elif is_video and ai_category and ai_category != "Videos":
-                    effective_category = ai_category
-
-                final_path = file_path
-                current_dir_name = os.path.basename(os.path.dirname(file_path))
-
-                should_move = (
-                    directory in SCAN_DIRS
-                    or (current_dir_name == "Unsorted"
-                        and effective_category != "Unsorted")
-                )
-                if should_move:
-                    dest_dir = os.path.join(SOURCE_DIR, effective_category)
-                    os.makedirs(dest_dir, exist_ok=True)
-                    new_path = os.path.join(dest_dir, filename)
-                    
-                    # Handle naming collisions
-                    if os.path.exists(new_path):
-                        base, ext = os.path.splitext(filename)
-                        timestamp = int(time.time())
-                        new_filename = f"{base}_{timestamp}{ext}"
-                        new_path = os.path.join(dest_dir, new_filename)
-                        filename = new_filename # Update filename for DB insert
-
-                    try:
-                        shutil.move(file_path, new_path)
-                        final_path = new_path
-                        logging.info(f"Moved {filename} to {effective_category}")
-                    except Exception as e:
-                        logging.error(f"Failed to move {filename}: {e}")
-
-                if not is_video:
-                    generate_thumbnail(final_path, effective_category)
+        try:
+            shutil.move(file_path, new_path)
+            final_path = new_path
+            logging.info(f"Moved {filename} to {effective_category}")
+        except Exception as e:
+            logging.error(f"Failed to move {filename}: {e}")
+
+    if not is_video:
+        if analysis["thumbnail"]:
+            try:
+                write_thumbnail(analysis["thumbnail"],
+                                os.path.basename(final_path), effective_category)
+            except OSError as e:
+                logging.warning(f"Thumbnail write failed for {final_path}: {e}")
+        else:
+            generate_thumbnail(final_path, effective_category)
+
+    try:
+        created_at = int(os.path.getmtime(final_path) * 1000)
+        now_ms = int(time.time() * 1000)
+        sql = '''INSERT INTO screenshots
+            (filename, path, category, text, amount, created_at,
+             processed_at, ai_category, ai_summary, ai_processed_at,
+             detected_language, translated_text, is_video,
+             video_frames_analyzed, video_objects,
+             ocr_method, ai_extracted_text, dhash, ahash, dct_hash,
+             content_hash, keyword_confidence)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+        values = (
+            filename, final_path, effective_category, text, amount,
+            created_at, now_ms, ai_category, ai_summary,
+            now_ms if ai_category else None, detected_lang,
+            translated_text, 1 if is_video else 0,
+            video_frames_analyzed, video_objects,
+            ocr_method, ai_extracted_text, dhash, ahash, dct_hash,
+            content_hash, confidence
+        )
+        cursor.execute(sql, values)
+        if dhash is not None:
+            dup_index.add_hash(conn, cursor.lastrowid, dhash)
+        return final_path
+    except Exception as e:
+        logging.error(f"DB Error for {filename}: {e}")
+        return None
+
+
+def _runs_inline_stages(analysis):
+    """True if index_file() will run Moondream or video analysis in this process."""
+    if analysis is None:
+        return False
+    if analysis["is_video"]:
+        return VIDEO_ENABLED
+    return AI_ENABLED and get_ai_service() is None
+
+
+def _index_candidate(conn, journal, batcher, candidate, analysis):
+    """Index one analyzed candidate and record the outcome in the journal."""
+    directory, filename, file_path, state = candidate
+    if _runs_inline_stages(analysis):
+        # Inline AI or video analysis can outlast a reader's busy timeout
+        batcher.flush()
+    else:
+        batcher.checkpoint()
+    logging.info(f"Processing new file: {filename}")
+    final_path = index_file(conn, directory, filename, file_path, analysis)
+    if final_path is None:
+        journal.record(directory, filename, state, failed=True)
+    elif final_path == file_path:
+        journal.record(directory, filename, state)
+    else:
+        journal.record_path(final_path)
+    batcher.add()
+    return 0 if final_path is None else 1
 
-                try:
-                    created_at = int(os.path.getmtime(final_path) * 1000)
-                    now_ms = int(time.time() * 1000)
-                    sql = '''INSERT INTO screenshots
-                        (filename, path, category, text, amount, created_at,
-                         processed_at, ai_category, ai_summary, ai_processed_at,
-                         detected_language, translated_text, is_video,
-                         video_frames_analyzed, video_objects,
-                         ocr_method, ai_extracted_text, phash)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
-                    values = (
-                        filename, final_path, effective_category, text, amount,
-                        created_at, now_ms, ai_category, ai_summary,
-                        now_ms if ai_category else None, detected_lang,
-                        translated_text, 1 if is_video else 0,
-                        video_frames_analyzed, video_objects,
-                        ocr_method, ai_extracted_text, phash
-                    )
-                    cursor.execute(sql, values)
-                    conn.commit()
-                    files_processed_count += 1
-                except Exception as e:
-                    logging.error(f"DB Error for {filename}: {e}")
+
+def process_files(conn, paths=None):
+    """Scan and process new screenshot files.
+
+    paths restricts the scan to specific files (used by --watch mode).
+    With OCR_WORKERS > 1, OCR, dHash and thumbnail rendering run in a
+    process pool while this process stays the single writer: it owns the
+    SQLite connection, the AI model and all file moves. Inserts are
+    committed in CommitBatcher-sized transactions. Files whose content is
+    already in the result cache are indexed without OCR.
+    """
+    logging.info("Scanning for screenshots...")
+    journal = get_scan_journal(conn)
+    candidates = _collect_new_files(conn.cursor(), journal, paths)
+    # Journal updates from the listing must not stay open through the OCR
+    conn.commit()
+    batcher = CommitBatcher(conn)
+    cache = get_result_cache()
+    files_processed_count = reused = 0
+
+    if OCR_WORKERS > 1 and len(candidates) > 1:
+        logging.info(f"Analyzing {len(candidates)} files with {OCR_WORKERS} workers")
+        with ProcessPoolExecutor(max_workers=OCR_WORKERS,
+                                 initializer=_init_worker,
+                                 initargs=(CATEGORIES, _result_cache_path(), cache.max_bytes)) as pool:
+            results = pool.map(analyze_file, [c[2] for c in candidates])
+            for candidate in candidates:
+                batcher.checkpoint()
+                analysis = next(results)
+                _remember_analysis(cache, analysis)
+                reused += bool(analysis and analysis["cached"])
+                files_processed_count += _index_candidate(conn, journal, batcher, candidate, analysis)
+    else:
+        for candidate in candidates:
+            batcher.checkpoint()
+            analysis = analyze_file(candidate[2])
+            _remember_analysis(cache, analysis)
+            reused += bool(analysis and analysis["cached"])
+            files_processed_count += _index_candidate(conn, journal, batcher, candidate, analysis)
+    if reused:
+        logging.info(f"Result cache: {reused} files reused")
+    conn.commit()
+    process_translation_backfill(conn)
+    pump_ai_service(conn)
 
     if files_processed_count > 0:
         logging.info(f"Batch complete. Indexed {files_processed_count} files.")
@@ -749,7 +1309,7 @@ def process_ai_backfill(conn, limit=10):
     if not AI_ENABLED:
         return
     cursor = conn.cursor()
-    cursor.execute('''SELECT id, filename, path FROM screenshots
+    cursor.execute('''SELECT id, filename, path, content_hash FROM screenshots
                       WHERE ai_processed_at IS NULL AND category != 'Videos'
                       LIMIT ?''', (limit,))
     rows = cursor.fetchall()
@@ -757,27 +1317,207 @@ def process_ai_backfill(conn, limit=10):
         return
 
     logging.info(f"AI backfill: {len(rows)} files to process")
-    for row_id, filename, path in rows:
+    batcher = CommitBatcher(conn)
+    for row_id, filename, path, content_hash in rows:
         if not os.path.exists(path):
             logging.warning(f"File missing for backfill: {path}")
             continue
         logging.info(f"AI backfill: {filename}")
-        ai_category, ai_summary = analyze_image_ai(path)
+        content_hash = _row_content_hash(conn, row_id, path, content_hash)
+        # Don't hold the write lock through inference
+        batcher.flush()
+        ai_category, ai_summary = cached_ai_task(content_hash, ai_service.CATEGORIZE,
+                                                 lambda: analyze_image_ai(path))
         now_ms = int(time.time() * 1000)
         cursor.execute('''UPDATE screenshots
                           SET ai_category=?, ai_summary=?, ai_processed_at=?
                           WHERE id=?''',
                        (ai_category, ai_summary, now_ms, row_id))
-        conn.commit()
+        batcher.add()
+    batcher.flush()
     logging.info("AI backfill batch complete.")
 
 
+def _plan_move(row_id, filename, path, old_category, new_category, taken=()):
+    """Decide where a file goes when it changes category.
+
+    Returns (row_id, filename, path, old_category, new_category,
+    new_filename, new_path). Name collisions, with files on disk or with
+    paths in taken (other moves planned in the same batch), get a
+    timestamp suffix.
+    """
+    dest_dir = os.path.join(SOURCE_DIR, new_category)
+    new_filename = filename
+    new_path = os.path.join(dest_dir, filename)
+    base, ext = os.path.splitext(filename)
+    n = 0
+    while new_path in taken or os.path.exists(new_path):
+        suffix = f"_{int(time.time())}" + (f"_{n}" if n else "")
+        new_filename = f"{base}{suffix}{ext}"
+        new_path = os.path.join(dest_dir, new_filename)
+        n += 1
+    return row_id, filename, path, old_category, new_category, new_filename, new_path
+
+
+def _execute_move(move):
+    """Move a planned file and its thumbnail. Filesystem only, so thread-safe."""
+    _, filename, path, old_category, new_category, new_filename, new_path = move
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    shutil.move(path, new_path)
+    old_thumb = thumbnail_path(filename, old_category)
+    if os.path.exists(old_thumb):
+        new_thumb = thumbnail_path(new_filename, new_category)
+        os.makedirs(os.path.dirname(new_thumb), exist_ok=True)
+        os.replace(old_thumb, new_thumb)
+
+
+def _record_moves(conn, moves):
+    """Write the new location of executed moves to the DB and scan journal."""
+    conn.executemany("UPDATE screenshots SET filename=?, path=?, category=? WHERE id=?",
+                     [(m[5], m[6], m[4], m[0]) for m in moves])
+    journal = get_scan_journal(conn)
+    for move in moves:
+        journal.record_path(move[6])
+
+
+def _relocate_file(conn, row_id, filename, path, old_category, new_category):
+    """Move an indexed file (and its thumbnail) into another category folder."""
+    move = _plan_move(row_id, filename, path, old_category, new_category)
+    try:
+        _execute_move(move)
+    except OSError as e:
+        logging.error(f"Failed to move {filename}: {e}")
+        return
+    _record_moves(conn, [move])
+    logging.info(f"Moved {move[5]} to {new_category}")
+
+
+def _apply_ai_result(conn, row_id, result, store=True):
+    """Write one AI service result back, as index_file() would have inline.
+
+    With store=True the result is also added to the result cache.
+    """
+    row = conn.execute('''SELECT filename, path, category, text, ai_processed_at, content_hash
+                          FROM screenshots WHERE id=?''', (row_id,)).fetchone()
+    if row is None:
+        return
+    filename, path, category, text, ai_processed_at, content_hash = row
+    new_category = category
+    if store:
+        cache = get_result_cache()
+        if result.get("category"):
+            cache.put(content_hash, f"ai:{ai_service.CATEGORIZE}",
+                      _ai_cache_version(ai_service.CATEGORIZE),
+                      [result["category"], result.get("summary")])
+        if result.get("text"):
+            cache.put(content_hash, f"ai:{ai_service.OCR}",
+                      _ai_cache_version(ai_service.OCR), result["text"])
+
+    if ai_processed_at is None:
+        ai_category = result.get("category")
+        conn.execute('''UPDATE screenshots
+                        SET ai_category=?, ai_summary=?, ai_processed_at=?
+                        WHERE id=?''',
+                     (ai_category, result.get("summary"), int(time.time() * 1000), row_id))
+        if ai_category:
+            logging.info(f"AI categorized {filename} as: {ai_category}")
+        if category == "Unsorted" and ai_category and ai_category != "Unsorted":
+            new_category = ai_category
+
+    ai_text = result.get("text")
+    if ai_text:
+        detected_lang = detect_language(ai_text) if TRANSLATION_ENABLED else None
+        conn.execute('''UPDATE screenshots
+                        SET ai_extracted_text=?, ocr_method='ai',
+                            detected_language=?, translated_text=NULL
+                        WHERE id=?''',
+                     (ai_text, detected_lang, row_id))
+        logging.info(f"AI extracted {len(ai_text)} chars from {filename}")
+        if len(ai_text) > 20 or not text:
+            text_category, amount, confidence = classify_text(ai_text)
+            conn.execute("UPDATE screenshots SET text=?, amount=?, keyword_confidence=? WHERE id=?",
+                         (ai_text, amount, confidence, row_id))
+            if category == "Unsorted" and text_category != "Unsorted":
+                new_category = text_category
+
+    if new_category != category and os.path.exists(path):
+        _relocate_file(conn, row_id, filename, path, category, new_category)
+
+
+def _cached_ai_result(content_hash, tasks):
+    """A complete AI service result from the cache, or None if any task misses."""
+    cache = get_result_cache()
+    result = {}
+    for task in tasks:
+        hit = cache.get(content_hash, f"ai:{task}", _ai_cache_version(task))
+        if hit is None:
+            return None
+        if task == ai_service.CATEGORIZE:
+            result["category"], result["summary"] = hit
+        else:
+            result["text"] = hit
+    return result
+
+
+def pump_ai_service(conn):
+    """Apply finished AI service results and top up its queue.
+
+    The work queue is the backfill queue: rows without AI analysis (and,
+    with AI OCR, rows still on tesseract text). Rows whose content is in
+    the result cache are applied directly. Never waits for inference.
+    Returns False if the service is not in use.
+    """
+    service = get_ai_service()
+    if service is None:
+        return False
+
+    finished = service.poll()
+    for row_id, result in finished:
+        _apply_ai_result(conn, row_id, result)
+    if finished:
+        conn.commit()
+
+    if not service.free_slots:
+        return True
+    valid_cats = category_views().valid
+    tasks = [ai_service.CATEGORIZE] + ([ai_service.OCR] if AI_OCR_ENABLED else [])
+    queued = [(row, tasks) for row in conn.execute(
+        '''SELECT id, path, content_hash FROM screenshots
+           WHERE ai_processed_at IS NULL AND category != 'Videos'
+           AND COALESCE(is_video, 0) = 0
+           LIMIT ?''', (service.max_pending,))]
+    if AI_OCR_ENABLED:
+        queued += [(row, [ai_service.OCR]) for row in conn.execute(
+            '''SELECT id, path, content_hash FROM screenshots
+               WHERE (ocr_method = 'ocr' OR ocr_method IS NULL)
+               AND ai_extracted_text IS NULL AND ai_processed_at IS NOT NULL
+               AND is_video = 0
+               LIMIT ?''', (service.max_pending,))]
+    reused = 0
+    for (row_id, path, content_hash), row_tasks in queued:
+        if not service.free_slots:
+            break
+        if row_id in service.in_flight or not os.path.exists(path):
+            continue
+        content_hash = _row_content_hash(conn, row_id, path, content_hash)
+        cached = _cached_ai_result(content_hash, row_tasks)
+        if cached is not None:
+            _apply_ai_result(conn, row_id, cached, store=False)
+            reused += 1
+        else:
+            service.submit(row_id, path, row_tasks, valid_cats)
+    conn.commit()
+    if reused:
+        logging.info(f"Result cache: applied {reused} cached AI results")
+    return True
+
+
 def process_ocr_backfill(conn, limit=5):
     """Re-process entries with poor OCR using AI-based text extraction."""
     if not AI_OCR_ENABLED or not AI_ENABLED:
         return
     cursor = conn.cursor()
-    cursor.execute('''SELECT id, filename, path, text FROM screenshots
+    cursor.execute('''SELECT id, filename, path, text, content_hash FROM screenshots
                       WHERE (ocr_method = 'ocr' OR ocr_method IS NULL)
                       AND ai_extracted_text IS NULL
                       AND is_video = 0
@@ -787,47 +1527,312 @@ def process_ocr_backfill(conn, limit=5):
         return
 
     logging.info(f"OCR backfill: Re-processing {len(rows)} files with AI OCR")
-    for row_id, filename, path, old_text in rows:
+    batcher = CommitBatcher(conn)
+    for row_id, filename, path, old_text, content_hash in rows:
         if not os.path.exists(path):
             logging.warning(f"File missing for OCR backfill: {path}")
             continue
         logging.info(f"AI OCR backfill: {filename}")
-        ai_text = extract_text_ai(path)
+        content_hash = _row_content_hash(conn, row_id, path, content_hash)
+        batcher.flush()
+        ai_text = cached_ai_task(content_hash, ai_service.OCR,
+                                 lambda: extract_text_ai(path))
         if ai_text:
-            detected_lang, translated_text = None, None
-            if TRANSLATION_ENABLED:
-                detected_lang, translated_text = process_text_translation(ai_text)
-
+            detected_lang = detect_language(ai_text) if TRANSLATION_ENABLED else None
             cursor.execute('''UPDATE screenshots
                               SET ai_extracted_text=?, ocr_method='ai',
-                                  detected_language=?, translated_text=?
+                                  detected_language=?, translated_text=NULL
                               WHERE id=?''',
-                           (ai_text, detected_lang, translated_text, row_id))
-            conn.commit()
+                           (ai_text, detected_lang, row_id))
+            batcher.add()
             old_len = len(old_text) if old_text else 0
             logging.info(f"AI OCR: Extracted {len(ai_text)} chars (was {old_len})")
+    batcher.flush()
     logging.info("OCR backfill batch complete.")
 
 
-def process_phash_backfill(conn, limit=50):
-    """Backfill phash for existing images."""
+def _decode_for_hashing(path, preview_side=_PREVIEW_SIDE):
+    """Reduced-resolution ImageContext for a hash backfill, or None."""
+    try:
+        return ImageContext(path, full_resolution=False, preview_side=preview_side)
+    except Exception as e:
+        logging.warning(f"Hash computation failed for {path}: {e}")
+        return None
+
+
+def _store_hashes(conn, row_ids, contexts):
+    """Hash decoded images in one vectorized batch and write them back."""
+    hashes = image_hashing.hash_batch([ctx.hash_inputs() for ctx in contexts])
+    conn.executemany("UPDATE screenshots SET dhash=?, ahash=?, dct_hash=? WHERE id=?",
+                     [h + (row_id,) for row_id, h in zip(row_ids, hashes)])
+    for row_id, h in zip(row_ids, hashes):
+        dup_index.add_hash(conn, row_id, h[0])
+
+
+def process_hash_backfill(conn, limit=50):
+    """Backfill hashes (and missing thumbnails) for existing images.
+
+    Every row without a dct_hash is rehashed, including its dhash, so
+    dHashes converted from hex by schema v6 are replaced as well.
+    """
     cursor = conn.cursor()
-    cursor.execute("SELECT id, filename, path FROM screenshots WHERE phash IS NULL AND is_video=0 LIMIT ?", (limit,))
+    cursor.execute("SELECT id, filename, path, category FROM screenshots WHERE dct_hash IS NULL AND is_video=0 LIMIT ?", (limit,))
     rows = cursor.fetchall()
     if not rows: return
-    
-    logging.info(f"Phash backfill: {len(rows)} files")
-    for row_id, fname, path in rows:
+
+    logging.info(f"Hash backfill: {len(rows)} files")
+    row_ids, contexts = [], []
+    for row_id, fname, path, cat in rows:
         if os.path.exists(path):
-            ph = compute_dhash(path)
-            if ph:
-                cursor.execute("UPDATE screenshots SET phash=? WHERE id=?", (ph, row_id))
+            # Decode once for both the hash and a missing thumbnail
+            ctx = _decode_for_hashing(path)
+            if ctx is None:
+                continue
+            row_ids.append(row_id)
+            contexts.append(ctx)
+            if cat and not os.path.exists(thumbnail_path(os.path.basename(path), cat)):
+                try:
+                    write_thumbnail(render_thumbnail(path, ctx), os.path.basename(path), cat)
+                except Exception as e:
+                    logging.warning(f"Thumbnail generation failed for {path}: {e}")
+    if contexts:
+        _store_hashes(conn, row_ids, contexts)
     conn.commit()
 
 
-def run_continuous(interval=60):
-    """Main loop: scan, process, backfill."""
-    conn = init_db()
+def backfill_hashes(conn, batch_size=256):
+    """Hash every unhashed image in the library in one run.
+
+    Decoding (reduced-scale JPEG draft, PIL releases the GIL) runs on a
+    thread pool while each batch is hashed in one NumPy pass and written
+    in one transaction. Files that are missing or unreadable are skipped
+    and stay queued for the periodic backfill.
+    """
+    start = time.time()
+    done = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        while True:
+            rows = conn.execute('''SELECT id, path FROM screenshots
+                                    WHERE dct_hash IS NULL AND is_video = 0 AND id > ?
+                                    ORDER BY id LIMIT ?''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            rows = [(row_id, path) for row_id, path in rows if os.path.exists(path)]
+            decoded = pool.map(_decode_for_hashing, [path for _, path in rows],
+                               [_HASH_PREVIEW_SIDE] * len(rows))
+            pairs = [(row_id, ctx) for (row_id, _), ctx in zip(rows, decoded) if ctx is not None]
+            if pairs:
+                row_ids, contexts = zip(*pairs)
+                _store_hashes(conn, row_ids, contexts)
+                done += len(pairs)
+            conn.commit()
+            elapsed = time.time() - start
+            logging.info(f"Hashed {done} images ({done / elapsed:.0f}/s)")
+    logging.info(f"Hash backfill complete: {done} images in {time.time() - start:.1f}s")
+    return done
+
+
+def classify_stored(items):
+    """Classify stored text: (id, text, ai_category) -> (id, category, confidence).
+
+    The category is chosen as index_file() would: the keyword match, or
+    the AI category if no keyword matched. Pure, so it runs in workers.
+    """
+    keywords = get_classifier()
+    valid = set(category_views().valid)
+    decisions = []
+    for row_id, text, ai_category in items:
+        category, confidence = keywords.classify(text)
+        if category == "Unsorted" and ai_category in valid:
+            category = ai_category
+        decisions.append((row_id, category, confidence))
+    return decisions
+
+
+def _try_move(move):
+    try:
+        _execute_move(move)
+    except OSError as e:
+        return e
+    return None
+
+
+def reclassify_rows(conn, rows, decisions=None, move_pool=None, dry_run=False):
+    """Re-sort stored rows from their text; no OCR.
+
+    rows are (id, filename, path, category, text, ai_category) tuples and
+    decisions their classify_stored() results (computed here if None).
+    Confidences are written in one batch. Category changes are planned
+    first, with unique target names, so the file moves can run
+    concurrently on move_pool; the DB is then updated for the moves that
+    succeeded. Returns those moves (with dry_run, the planned ones,
+    without touching anything).
+    """
+    if decisions is None:
+        decisions = classify_stored([(r[0], r[4], r[5]) for r in rows])
+    plan = []
+    taken = set()
+    for row, (row_id, new_category, _) in zip(rows, decisions):
+        _, filename, path, category = row[:4]
+        if new_category != category and path and os.path.exists(path):
+            move = _plan_move(row_id, filename, path, category, new_category, taken)
+            taken.add(move[6])
+            plan.append(move)
+    if dry_run:
+        return plan
+    conn.executemany("UPDATE screenshots SET keyword_confidence=? WHERE id=?",
+                     [(confidence, row_id) for row_id, _, confidence in decisions])
+    done = []
+    for move, error in zip(plan, (move_pool.map if move_pool else map)(_try_move, plan)):
+        if error is None:
+            done.append(move)
+        else:
+            logging.error(f"Failed to move {move[1]}: {error}")
+    _record_moves(conn, done)
+    return done
+
+
+_RECLASSIFY_QUERY = '''SELECT id, filename, path, category, text, ai_category
+                       FROM screenshots
+                       WHERE id > ? AND id <= ? AND COALESCE(is_video, 0) = 0
+                       AND manual_category IS NULL
+                       ORDER BY id LIMIT ?'''
+
+
+def process_reclassify_backfill(conn, limit=500):
+    """Incrementally reclassify the library after the categories changed.
+
+    The config version the library was classified with and a row cursor
+    are kept in the meta table, so the job resumes across restarts. Rows
+    indexed after the change already use the new config and are skipped.
+    A database that has never recorded a version just records the
+    current one. Returns the number of files moved.
+    """
+    version = categories_version()
+    recorded = db_schema.get_meta(conn, "categories_version")
+    if recorded != version:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM screenshots").fetchone()[0]
+        db_schema.set_meta(conn, "categories_version", version)
+        db_schema.set_meta(conn, "reclassify_cursor", 0 if recorded else last_id)
+        db_schema.set_meta(conn, "reclassify_until", last_id)
+        conn.commit()
+        if recorded:
+            logging.info(f"Categories changed ({recorded} -> {version}); "
+                         f"reclassifying {last_id} rows from stored text")
+    cursor = int(db_schema.get_meta(conn, "reclassify_cursor", 0))
+    until = int(db_schema.get_meta(conn, "reclassify_until", 0))
+    if cursor >= until:
+        return 0
+    rows = conn.execute(_RECLASSIFY_QUERY, (cursor, until, limit)).fetchall()
+    moved = len(reclassify_rows(conn, rows))
+    cursor = rows[-1][0] if len(rows) == limit else until
+    db_schema.set_meta(conn, "reclassify_cursor", cursor)
+    conn.commit()
+    if moved:
+        logging.info(f"Reclassified {moved} files")
+    return moved
+
+
+def _mark_reclassified(conn, last_id):
+    """Record that rows up to last_id use the current category config."""
+    db_schema.set_meta(conn, "categories_version", categories_version())
+    db_schema.set_meta(conn, "reclassify_cursor", last_id)
+    db_schema.set_meta(conn, "reclassify_until", last_id)
+
+
+def _pipelined(chunks, submit, depth):
+    """Yield (chunk, result) in order, keeping up to depth submitted ahead."""
+    window = collections.deque()
+    for chunk in chunks:
+        window.append((chunk, submit(chunk)))
+        if len(window) >= depth:
+            chunk, future = window.popleft()
+            yield chunk, future.result()
+    while window:
+        chunk, future = window.popleft()
+        yield chunk, future.result()
+
+
+def reclassify_library(conn, chunk_size=5000, workers=None, move_workers=4, dry_run=False):
+    """Re-sort the whole library from stored text (--reclassify).
+
+    Rows are streamed in id order, chunk_size at a time, and classified
+    in `workers` processes (default: all cores), with at most two chunks
+    per worker in flight. Each chunk's updates are committed together and
+    its file moves run on move_workers threads. Files moved by hand in
+    the viewer and videos are left alone. Returns the number of files
+    moved (or planned, with dry_run).
+    """
+    load_categories()
+    workers = workers or os.cpu_count() or 1
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM screenshots").fetchone()[0]
+    started = time.monotonic()
+
+    def chunks():
+        cursor = 0
+        while True:
+            rows = conn.execute(_RECLASSIFY_QUERY, (cursor, last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            cursor = rows[-1][0]
+
+    def items(rows):
+        return [(r[0], r[4], r[5]) for r in rows]
+
+    total = moved = 0
+    pool = None
+    if workers > 1 and last_id > chunk_size:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(CATEGORIES,))
+    try:
+        with ThreadPoolExecutor(max_workers=move_workers) as move_pool:
+            if pool is None:
+                classified = ((rows, classify_stored(items(rows))) for rows in chunks())
+            else:
+                classified = _pipelined(chunks(), lambda rows: pool.submit(classify_stored, items(rows)),
+                                        2 * workers)
+            for rows, decisions in classified:
+                done = reclassify_rows(conn, rows, decisions, move_pool, dry_run)
+                if dry_run:
+                    for move in done:
+                        logging.info(f"Would move {move[1]}: {move[3]} -> {move[4]}")
+                else:
+                    conn.commit()
+                total += len(rows)
+                moved += len(done)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not dry_run:
+        _mark_reclassified(conn, last_id)
+        conn.commit()
+    elapsed = time.monotonic() - started
+    logging.info(f"Reclassified {total} rows in {elapsed:.1f}s "
+                 f"({total / max(elapsed, 1e-6):.0f} rows/s); "
+                 f"{'would move' if dry_run else 'moved'} {moved} files")
+    return moved
+
+
+def run_backfills(conn):
+    """Run one round of the hash, thumbnail, reclassify, AI and OCR backfills."""
+    process_hash_backfill(conn, limit=50) # Always run hash backfill
+    process_thumbnail_backfill(conn, limit=20)
+    if AUTO_RECLASSIFY:
+        process_reclassify_backfill(conn)
+    process_translation_backfill(conn)
+    if pump_ai_service(conn):
+        return
+    if AI_ENABLED:
+        process_ai_backfill(conn, limit=3)
+    if AI_OCR_ENABLED:
+        process_ocr_backfill(conn, limit=2)
+
+
+def _feature_status():
     features = []
     if AI_ENABLED:
         features.append("AI")
@@ -836,25 +1841,106 @@ def run_continuous(interval=60):
     if VIDEO_ENABLED:
         features.append("Video")
     if TRANSLATION_ENABLED:
-        features.append(f"Translation->{TARGET_LANGUAGE}")
-    status = ", ".join(features) if features else "basic OCR only"
-    logging.info(f"Starting Smart Indexer. Features: {status}. Interval: {interval}s")
+        features.append(f"Translation->{TARGET_LANGUAGE} ({TRANSLATE_BACKEND})")
+    if OCR_WORKERS > 1:
+        features.append(f"{OCR_WORKERS} OCR workers")
+    if AUTO_RECLASSIFY:
+        features.append("auto-reclassify")
+    return ", ".join(features) if features else "basic OCR only"
+
+
+def run_continuous(interval=60):
+    """Main loop: scan, process, backfill."""
+    conn = init_db()
+    logging.info(f"Starting Smart Indexer. Features: {_feature_status()}. Interval: {interval}s")
     try:
         while True:
             load_categories()
             process_files(conn)
-            process_phash_backfill(conn, limit=50) # Always run phash backfill
-            process_thumbnail_backfill(conn, limit=20)
-            if AI_ENABLED:
-                process_ai_backfill(conn, limit=3)
-            if AI_OCR_ENABLED:
-                process_ocr_backfill(conn, limit=2)
+            run_backfills(conn)
             time.sleep(interval)
     except KeyboardInterrupt:
         logging.info("Stopping...")
         conn.close()
 
 
+def _watch_dirs():
+    """Directories the --watch loop subscribes to (SOURCE_DIR for WAKE_FILE)."""
+    dirs = set(SCAN_DIRS)
+    dirs.add(SOURCE_DIR)
+    dirs.update(os.path.join(SOURCE_DIR, cat) for cat in CATEGORIES.keys())
+    dirs.add(os.path.join(SOURCE_DIR, "Unsorted"))
+    return dirs
+
+
+def run_watch(interval=60):
+    """Event-driven loop: ingest files as soon as inotify reports them.
+
+    A path is handed to process_files() once it has produced no events
+    for WATCH_DEBOUNCE seconds, so files still being written are not
+    OCRed half-way. Touching WAKE_FILE (db_bridge does this after it moves,
+    deletes or edits a file) or letting `interval` seconds pass triggers a
+    full scan plus backfills. Falls back to run_continuous() polling when
+    inotify is unavailable.
+    """
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        logging.warning("inotify_simple not installed, falling back to polling. "
+                        "Install with: pip install inotify_simple")
+        return run_continuous(interval)
+
+    conn = init_db()
+    inotify = INotify()
+    mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY
+    watches = {}
+    pending = {}
+    logging.info(f"Starting Smart Indexer in watch mode. Features: {_feature_status()}. "
+                 f"Full rescan every {interval}s")
+    last_full = None
+    try:
+        while True:
+            now = time.monotonic()
+            if last_full is None or now - last_full >= interval:
+                load_categories()
+                process_files(conn)
+                run_backfills(conn)
+                last_full = time.monotonic()
+
+            watched = set(watches.values())
+            for directory in _watch_dirs() - watched:
+                if os.path.isdir(directory):
+                    watches[inotify.add_watch(directory, mask)] = directory
+
+            if pending:
+                timeout = WATCH_DEBOUNCE
+            else:
+                timeout = max(0.0, interval - (time.monotonic() - last_full))
+            for event in inotify.read(timeout=int(timeout * 1000)):
+                directory = watches.get(event.wd)
+                if directory is None or event.mask & flags.ISDIR:
+                    continue
+                if event.mask & flags.IGNORED:
+                    del watches[event.wd]
+                    continue
+                if event.name == WAKE_FILE and directory == SOURCE_DIR:
+                    last_full = None
+                elif is_media_name(event.name):
+                    pending[os.path.join(directory, event.name)] = time.monotonic()
+
+            now = time.monotonic()
+            ready = [path for path, seen in pending.items()
+                     if now - seen >= WATCH_DEBOUNCE]
+            if ready:
+                for path in ready:
+                    del pending[path]
+                process_files(conn, paths=ready)
+    except KeyboardInterrupt:
+        logging.info("Stopping...")
+        inotify.close()
+        conn.close()
+
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(
@@ -871,6 +1957,22 @@ if __name__ == "__main__":
                         help='Target language for translation (default: en)')
     parser.add_argument('--interval', type=int, default=60,
                         help='Scan interval in seconds')
+    parser.add_argument('--watch', action='store_true',
+                        help='Ingest new files on filesystem events (inotify) instead of polling')
+    parser.add_argument('--commit-batch', type=int, default=COMMIT_BATCH_SIZE,
+                        help='Rows per SQLite transaction (default: 200)')
+    parser.add_argument('--commit-interval', type=float, default=COMMIT_INTERVAL,
+                        help='Max seconds before pending rows are committed (default: 2)')
+    parser.add_argument('--workers', type=int, default=OCR_WORKERS,
+                        help='Worker processes for OCR/hashing/thumbnails (default: 1)')
+    parser.add_argument('--auto-reclassify', action='store_true',
+                        help='Re-sort indexed files from their stored text when categories change')
+    parser.add_argument('--reclassify', action='store_true',
+                        help='Re-sort the whole library from stored OCR/AI text, then exit')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='With --reclassify: log the planned moves without moving anything')
+    parser.add_argument('--backfill-hashes', action='store_true',
+                        help='Hash every unhashed image in the library, then exit')
     args = parser.parse_args()
 
     if args.ai:
@@ -885,5 +1987,18 @@ if __name__ == "__main__":
         TRANSLATION_ENABLED = True
     if args.target_lang:
         TARGET_LANGUAGE = args.target_lang
-
-    run_continuous(interval=args.interval)
+    OCR_WORKERS = max(1, args.workers)
+    COMMIT_BATCH_SIZE = max(1, args.commit_batch)
+    COMMIT_INTERVAL = args.commit_interval
+    if args.auto_reclassify:
+        AUTO_RECLASSIFY = True
+
+    if args.reclassify:
+        reclassify_library(init_db(), workers=OCR_WORKERS if OCR_WORKERS > 1 else None,
+                           dry_run=args.dry_run)
+    elif args.backfill_hashes:
+        backfill_hashes(init_db())
+    elif args.watch:
+        run_watch(interval=args.interval)
+    else:
+        run_continuous(interval=args.interval)
@@ -1,7 +1,22 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import collections
+import fractions
+import io
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import sys
 import sort_screenshots
 import time
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshot-viewer'))
+import db_bridge  # noqa: E402
 
 class TestSortScreenshots(unittest.TestCase):
     
@@ -22,5 +37,907 @@ class TestSortScreenshots(unittest.TestCase):
         # Verify sleep was called with correct interval
         mock_sleep.assert_called_with(5)
 
+
+class TestProcessFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, "Screenshots")
+        os.makedirs(self.source)
+        self.patches = [
+            patch.object(sort_screenshots, 'SOURCE_DIR', self.source),
+            patch.object(sort_screenshots, 'SCAN_DIRS', [self.source]),
+            patch.object(sort_screenshots, 'DB_FILE',
+                         os.path.join(self.tmp, "screenshots.db")),
+            patch.object(sort_screenshots, 'ocr_image',
+                         side_effect=lambda path, ctx=None: "UPI payment of Rs 250"
+                         if "pay" in path else "nothing here"),
+        ]
+        for p in self.patches:
+            p.start()
+        self.conn = sort_screenshots.init_db()
+
+    def tearDown(self):
+        self.conn.close()
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmp)
+
+    def _make_images(self, names):
+        # Distinct bytes per name, so the content-addressed cache keeps them apart
+        for name in names:
+            shade = sum(map(ord, name)) % 256
+            Image.new('RGB', (40, 60), (shade, 255, 255)).save(os.path.join(self.source, name))
+
+    def _rows(self):
+        return self.conn.execute(
+            "SELECT filename, category, amount, dhash FROM screenshots ORDER BY filename").fetchall()
+
+    def test_serial_indexes_and_moves(self):
+        self._make_images(["pay1.png", "misc.png"])
+        sort_screenshots.process_files(self.conn)
+
+        rows = self._rows()
+        self.assertEqual([r[:3] for r in rows],
+                         [("misc.png", "Unsorted", None), ("pay1.png", "Finance", 250.0)])
+        self.assertTrue(all(r[3] is not None for r in rows))
+        self.assertTrue(os.path.exists(os.path.join(self.source, "Finance", "pay1.png")))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.source, ".thumbs", "Finance", "pay1.png")))
+
+        # A second scan finds nothing new
+        sort_screenshots.process_files(self.conn)
+        self.assertEqual(len(self._rows()), 2)
+
+    def test_journal_skips_unchanged_and_retries_changed(self):
+        self._make_images(["misc.png"])
+        with open(os.path.join(self.source, "broken.png"), "wb") as f:
+            f.write(b"partial")
+        sort_screenshots.process_files(self.conn)
+        ocr_calls = sort_screenshots.ocr_image.call_count
+
+        # Idle cycle: nothing new, nothing re-OCRed
+        journal = sort_screenshots.get_scan_journal(self.conn)
+        self.assertEqual(sort_screenshots._collect_new_files(self.conn.cursor(), journal), [])
+        sort_screenshots.process_files(self.conn)
+        self.assertEqual(sort_screenshots.ocr_image.call_count, ocr_calls)
+
+        # The failed file is picked up again once it has been fully written
+        Image.new('RGB', (40, 60), 'white').save(os.path.join(self.source, "broken.png"))
+        sort_screenshots.process_files(self.conn)
+        self.assertEqual([r[0] for r in self._rows()], ["broken.png", "misc.png"])
+
+        # A fresh journal loaded from the table agrees with the old one
+        sort_screenshots._scan_journal = None
+        journal = sort_screenshots.get_scan_journal(self.conn)
+        self.assertEqual(sort_screenshots._collect_new_files(self.conn.cursor(), journal), [])
+
+    def test_journal_relists_directory_with_recent_mtime(self):
+        self._make_images(["misc.png"])
+        journal = sort_screenshots.get_scan_journal(self.conn)
+        [(name, state)] = journal.changed(self.source)
+        journal.record(self.source, name, state)
+
+        # A file created in the same mtime tick as the listing leaves the
+        # directory mtime where it was
+        dir_mtime = os.stat(self.source).st_mtime_ns
+        self._make_images(["late.png"])
+        os.utime(self.source, ns=(dir_mtime, dir_mtime))
+        self.assertEqual([n for n, _ in journal.changed(self.source)], ["late.png"])
+
+        # Once the mtime is old enough to trust, an unchanged directory is skipped
+        old = dir_mtime - 10 * journal.MTIME_SLACK_NS
+        os.utime(self.source, ns=(old, old))
+        journal.changed(self.source)
+        with patch.object(sort_screenshots.os, 'scandir') as scandir:
+            self.assertEqual(journal.changed(self.source), [])
+            scandir.assert_not_called()
+
+    def test_watch_debounces_events_and_rescans_on_wake(self):
+        Event = collections.namedtuple("Event", "wd mask cookie name")
+        log = []
+        self._make_images(["pay1.png"])
+
+        class FakeINotify:
+            def __init__(self):
+                self.watches = {}
+                self.reads = iter([
+                    [("Screenshots", "pay1.png")],
+                    [],  # quiet for WATCH_DEBOUNCE: pay1.png is ready
+                    [("Screenshots", ".screensort_wake")],
+                ])
+
+            def add_watch(self, directory, mask):
+                self.watches[os.path.basename(directory)] = len(self.watches) + 1
+                return self.watches[os.path.basename(directory)]
+
+            def read(self, timeout):
+                log.append("read")
+                try:
+                    events = next(self.reads)
+                except StopIteration:
+                    raise KeyboardInterrupt
+                if not events:
+                    time.sleep(timeout / 1000)
+                return [Event(self.watches[d], 8, 0, name) for d, name in events]
+
+            def close(self):
+                pass
+
+        flags = MagicMock(CLOSE_WRITE=8, MOVED_TO=128, CREATE=256, MODIFY=2, ISDIR=0x40000000, IGNORED=0x8000)
+        inotify = MagicMock(INotify=FakeINotify, flags=flags)
+        real_process = sort_screenshots.process_files
+
+        def process(conn, paths=None):
+            log.append([os.path.basename(p) for p in paths] if paths else "full scan")
+            # The full scan would pick the file up by itself
+            if paths:
+                real_process(conn, paths)
+
+        with patch.dict('sys.modules', {'inotify_simple': inotify}), \
+                patch.object(sort_screenshots, 'WATCH_DEBOUNCE', 0.1), \
+                patch.object(sort_screenshots, 'process_files', side_effect=process), \
+                patch.object(sort_screenshots, 'run_backfills'):
+            sort_screenshots.run_watch(interval=3600)
+
+        self.assertEqual(log, ["full scan", "read", "read", ["pay1.png"], "read", "full scan", "read"])
+        self.assertEqual([r[:2] for r in self._rows()], [("pay1.png", "Finance")])
+
+    def test_watch_falls_back_to_polling_without_inotify(self):
+        with patch.dict('sys.modules', {'inotify_simple': None}), \
+                patch.object(sort_screenshots, 'run_continuous') as poll:
+            sort_screenshots.run_watch(interval=5)
+        poll.assert_called_once_with(5)
+
+    def test_worker_pool_matches_serial(self):
+        self._make_images(["pay1.png", "pay2.png", "misc.png"])
+        with patch.object(sort_screenshots, 'OCR_WORKERS', 2):
+            sort_screenshots.process_files(self.conn)
+
+        self.assertEqual([r[:2] for r in self._rows()],
+                         [("misc.png", "Unsorted"), ("pay1.png", "Finance"),
+                          ("pay2.png", "Finance")])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.source, ".thumbs", "Finance", "pay2.png")))
+        # Workers hash the content; the writer stores their results
+        hashes = [r[0] for r in self.conn.execute("SELECT content_hash FROM screenshots")]
+        cache = sort_screenshots.get_result_cache()
+        self.assertTrue(all(cache.get(h, "tesseract", sort_screenshots.OCR_RESULT_VERSION) for h in hashes))
+
+    def test_result_cache_skips_repeated_content(self):
+        backup = os.path.join(self.tmp, "Backup")
+        os.makedirs(backup)
+        self._make_images(["pay1.png"])
+        shutil.copy(os.path.join(self.source, "pay1.png"), os.path.join(backup, "pay_copy.png"))
+        with patch.object(sort_screenshots, 'SCAN_DIRS', [self.source, backup]):
+            sort_screenshots.process_files(self.conn)
+            self.assertEqual(sort_screenshots.ocr_image.call_count, 1)
+
+            # A re-imported copy under a new name is indexed without OCR
+            shutil.copy(os.path.join(self.source, "Finance", "pay1.png"),
+                        os.path.join(self.source, "pay_again.png"))
+            sort_screenshots.process_files(self.conn)
+            self.assertEqual(sort_screenshots.ocr_image.call_count, 1)
+
+        rows = self.conn.execute("SELECT category, amount, content_hash FROM screenshots").fetchall()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(set(rows)), 1)
+        self.assertEqual(rows[0][:2], ("Finance", 250.0))
+
+    def test_write_lock_released_before_inline_ai(self):
+        self._make_images(["first.png", "second.png"])
+        viewer = sqlite3.connect(sort_screenshots.DB_FILE, timeout=0)
+        errors = []
+
+        def slow_ai(path):
+            # A viewer write while Moondream runs must not hit "database is locked"
+            try:
+                viewer.execute("INSERT INTO scan_journal VALUES ('x', 'y', 0, 0, 0, 0)")
+                viewer.rollback()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+            return "Unsorted", None
+
+        with patch.object(sort_screenshots, 'AI_ENABLED', True), \
+                patch.object(sort_screenshots, 'AI_SERVICE_ENABLED', False), \
+                patch.object(sort_screenshots, 'analyze_image_ai', side_effect=slow_ai):
+            sort_screenshots.process_files(self.conn)
+        viewer.close()
+
+        self.assertEqual(len(self._rows()), 2)
+        self.assertEqual(errors, [])
+
+    def test_ai_service_results_are_applied_later(self):
+        service = MagicMock(available=True, free_slots=4, max_pending=4, in_flight=set())
+        service.poll.return_value = []
+        self._make_images(["misc.png"])
+        with patch.object(sort_screenshots, 'AI_ENABLED', True), \
+                patch.object(sort_screenshots, '_ai_service', service), \
+                patch.object(sort_screenshots, 'analyze_image_ai') as inline:
+            sort_screenshots.process_files(self.conn)
+            inline.assert_not_called()
+            self.assertEqual(self._rows()[0][1], "Unsorted")
+            row_id, path = self.conn.execute("SELECT id, path FROM screenshots").fetchone()
+            service.submit.assert_called_once()
+            self.assertEqual(service.submit.call_args[0][:2], (row_id, path))
+
+            service.poll.return_value = [(row_id, {"category": "Shopping", "summary": "A cart"})]
+            sort_screenshots.pump_ai_service(self.conn)
+
+        self.assertEqual(self.conn.execute(
+            "SELECT category, ai_category, ai_summary FROM screenshots").fetchone(),
+            ("Shopping", "Shopping", "A cart"))
+        self.assertTrue(os.path.exists(os.path.join(self.source, "Shopping", "misc.png")))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.source, ".thumbs", "Shopping", "misc.png")))
+
+    def test_category_change_reclassifies_from_stored_text(self):
+        self._make_images(["pay1.png", "misc.png", "kept.png"])
+        sort_screenshots.process_files(self.conn)
+        self.conn.execute("UPDATE screenshots SET manual_category = 1 WHERE filename = 'kept.png'")
+        ocr_calls = sort_screenshots.ocr_image.call_count
+        config = os.path.join(self.tmp, "user_categories.json")
+        with patch.object(sort_screenshots, 'USER_CATEGORIES_FILE', config), \
+                patch.object(sort_screenshots, 'CATEGORIES', sort_screenshots.CATEGORIES), \
+                patch.object(sort_screenshots, '_categories_signature', None):
+            # First run only records the config version
+            self.assertEqual(sort_screenshots.process_reclassify_backfill(self.conn), 0)
+
+            with open(config, "w") as f:
+                json.dump({"Notes": ["nothing"]}, f)
+            self.assertTrue(sort_screenshots.load_categories())
+            self.assertFalse(sort_screenshots.load_categories())
+            # One row per cycle; the cursor resumes where the last cycle stopped
+            moved = [sort_screenshots.process_reclassify_backfill(self.conn, limit=1) for _ in range(4)]
+            self.assertEqual(sum(moved), 1)
+            self.assertEqual(moved[-1], 0)
+
+        self.assertEqual(sort_screenshots.ocr_image.call_count, ocr_calls)
+        self.assertEqual([r[:2] for r in self._rows()],
+                         [("kept.png", "Unsorted"), ("misc.png", "Notes"), ("pay1.png", "Finance")])
+        self.assertTrue(os.path.exists(os.path.join(self.source, "Notes", "misc.png")))
+
+    def test_reclassify_library_moves_without_ocr(self):
+        self._make_images(["pay1.png", "misc.png", "misc2.png"])
+        sort_screenshots.process_files(self.conn)
+        ocr_calls = sort_screenshots.ocr_image.call_count
+        with patch.object(sort_screenshots, 'CATEGORIES', {"Notes": ["nothing"]}):
+            self.assertEqual(sort_screenshots.reclassify_library(self.conn, workers=1, dry_run=True), 3)
+            self.assertEqual(sorted(os.listdir(os.path.join(self.source, "Unsorted"))),
+                             ["misc.png", "misc2.png"])
+            self.assertEqual(sort_screenshots.reclassify_library(self.conn, chunk_size=2, workers=1), 3)
+            # Recorded as done for the background job
+            self.assertEqual(sort_screenshots.process_reclassify_backfill(self.conn), 0)
+
+        self.assertEqual(sort_screenshots.ocr_image.call_count, ocr_calls)
+        self.assertEqual([r[:2] for r in self._rows()],
+                         [("misc.png", "Notes"), ("misc2.png", "Notes"), ("pay1.png", "Unsorted")])
+        self.assertTrue(os.path.exists(os.path.join(self.source, "Notes", "misc2.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.source, ".thumbs", "Notes", "misc2.png")))
+
+    def test_translation_batches_and_caches_segments(self):
+        texts = {"a.png": "Chats\nGuten Morgen\n12:30",
+                 "b.png": "Chats\n  Gute   Nacht",
+                 "c.png": "Guten Morgen\nChats"}
+        backend = MagicMock()
+        backend.name = "fake"
+        backend.translate.side_effect = lambda batch, source, target: [s.upper() for s in batch]
+        with patch.object(sort_screenshots, 'TRANSLATION_ENABLED', True), \
+                patch.object(sort_screenshots, '_translator', None), \
+                patch.object(sort_screenshots, 'detect_language', return_value='de'), \
+                patch.object(sort_screenshots.translation, 'create_backend', return_value=backend), \
+                patch.object(sort_screenshots, 'ocr_image',
+                             side_effect=lambda path, ctx=None: texts[os.path.basename(path)]):
+            self._make_images(["a.png", "b.png"])
+            sort_screenshots.process_files(self.conn)
+            # One call for both screenshots, each distinct segment sent once
+            backend.translate.assert_called_once_with(
+                ["Chats", "Guten Morgen", "Gute Nacht"], "de", "en")
+
+            self._make_images(["c.png"])
+            sort_screenshots.process_files(self.conn)
+            self.assertEqual(backend.translate.call_count, 1)
+
+        rows = self.conn.execute(
+            "SELECT filename, translated_text FROM screenshots ORDER BY filename").fetchall()
+        self.assertEqual(rows, [("a.png", "CHATS\nGUTEN MORGEN\n12:30"),
+                                ("b.png", "CHATS\nGUTE NACHT"),
+                                ("c.png", "GUTEN MORGEN\nCHATS")])
+
+    def test_backfill_hashes_matches_indexed_hashes(self):
+        self._make_images(["pay1.png", "misc.png"])
+        Image.effect_mandelbrot((64, 48), (-2, -1, 1, 1), 50).save(os.path.join(self.source, "m.png"))
+        sort_screenshots.process_files(self.conn)
+        indexed = self.conn.execute("SELECT dhash, ahash, dct_hash FROM screenshots ORDER BY id").fetchall()
+
+        self.conn.execute("UPDATE screenshots SET dhash = NULL, ahash = NULL, dct_hash = NULL")
+        self.conn.commit()
+        self.assertEqual(sort_screenshots.backfill_hashes(self.conn), 3)
+        self.assertEqual(self.conn.execute(
+            "SELECT dhash, ahash, dct_hash FROM screenshots ORDER BY id").fetchall(), indexed)
+
+
+class TestInitDb(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.tmp, "screenshots.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_upgrades_legacy_database(self):
+        legacy = sqlite3.connect(self.db_file)
+        legacy.execute('''CREATE TABLE screenshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT UNIQUE,
+            path TEXT, category TEXT, text TEXT, amount REAL,
+            created_at INTEGER, processed_at INTEGER)''')
+        legacy.execute("INSERT INTO screenshots (filename, category) VALUES ('a.png', 'Chats')")
+        legacy.commit()
+        legacy.close()
+
+        with patch.object(sort_screenshots, 'DB_FILE', self.db_file):
+            conn = sort_screenshots.init_db()
+            conn.close()
+            # Second start is a no-op
+            conn = sort_screenshots.init_db()
+
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(screenshots)")}
+        self.assertTrue({'phash', 'ai_summary', 'is_video'} <= cols)
+        self.assertEqual(sort_screenshots.db_schema.schema_version(conn),
+                         sort_screenshots.db_schema.SCHEMA_VERSION)
+        self.assertEqual(conn.execute("SELECT filename FROM screenshots").fetchall(), [("a.png",)])
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM screenshots "
+                            "WHERE category = ? ORDER BY created_at", ("Chats",)).fetchall()
+        self.assertIn("idx_screenshots_category_created", str(plan))
+        conn.close()
+
+    def test_hex_hashes_become_integers(self):
+        conn = sqlite3.connect(self.db_file)
+        sort_screenshots.db_schema.migrate(conn, target=5)
+        # v1 is frozen at the legacy columns; v6 adds the integer hashes
+        self.assertNotIn('dhash', {r[1] for r in conn.execute("PRAGMA table_info(screenshots)")})
+        conn.execute("INSERT INTO screenshots (filename, phash) VALUES ('a.png', 'ffffffffffffffff')")
+        conn.execute("INSERT INTO screenshots (filename, phash) VALUES ('b.png', '1f')")
+        conn.commit()
+        sort_screenshots.db_schema.migrate(conn)
+        self.assertEqual(conn.execute("SELECT phash, dhash FROM screenshots ORDER BY id").fetchall(),
+                         [(None, -1), (None, 31)])
+        conn.close()
+
+    def test_dashboard_stats_follow_writes(self):
+        conn = sqlite3.connect(self.db_file)
+        day = 86400 * 1000
+        start = int(time.mktime((2026, 3, 1, 12, 0, 0, 0, 0, -1))) * 1000
+        rows = [("a.png", "Finance", "Rs 250", 250.0, start, "en"),
+                ("b.png", "Chats", "hallo", None, start, "de"),
+                ("c.png", "Finance", "Rs 100", 100.0, start + day, None)]
+        # Rows from before v10 are counted by the migration, later ones by triggers
+        sort_screenshots.db_schema.migrate(conn, target=9)
+        conn.execute('''INSERT INTO screenshots (filename, category, text, amount, created_at,
+                        detected_language) VALUES (?, ?, ?, ?, ?, ?)''', rows[0])
+        sort_screenshots.db_schema.migrate(conn)
+        conn.executemany('''INSERT INTO screenshots (filename, category, text, amount, created_at,
+                            detected_language) VALUES (?, ?, ?, ?, ?, ?)''', rows[1:])
+        conn.execute("UPDATE screenshots SET category = 'Chats', amount = NULL WHERE filename = 'c.png'")
+        conn.execute("UPDATE screenshots SET text = 'hallo welt' WHERE filename = 'b.png'")
+        conn.execute("DELETE FROM screenshots WHERE filename = 'a.png'")
+
+        self.assertEqual(conn.execute("SELECT * FROM daily_stats ORDER BY day").fetchall(),
+                         [("2026-03-01", 1, 0, 0.0), ("2026-03-02", 1, 0, 0.0)])
+        self.assertEqual(conn.execute("SELECT * FROM category_stats").fetchall(), [("Chats", 2)])
+        self.assertEqual(conn.execute("SELECT * FROM language_stats").fetchall(), [("de", 1)])
+        self.assertEqual(conn.execute("SELECT files, text_chars FROM library_stats").fetchall(),
+                         [(2, 16)])
+        conn.close()
+
+
+class TestPreprocess(unittest.TestCase):
+
+    def _screenshot(self, line_height):
+        # Dark status bar with an icon, light body with rows of glyph-like strokes, nav bar
+        img = Image.new('L', (600, 1000), 240)
+        img.paste(30, (0, 0, 600, 50))
+        img.paste(255, (500, 15, 530, 35))
+        img.paste(0, (0, 960, 600, 1000))
+        for y in range(100, 900, line_height * 2):
+            for x in range(20, 580, 12):
+                img.paste(20, (x, y, x + 6, y + line_height))
+        return img
+
+    def test_crops_bars_and_upscales_only_small_text(self):
+        large = self._screenshot(40)
+        self.assertEqual(sort_screenshots.system_bar_rows(np.asarray(large)), (50, 960))
+        self.assertEqual(sort_screenshots.estimate_text_height(np.asarray(large)), 40)
+        self.assertEqual(sort_screenshots.preprocess_image(large).size, (600, 910))
+
+        small = sort_screenshots.preprocess_image(self._screenshot(10))
+        self.assertEqual(small.size, (1800, 2730))
+        self.assertEqual(sort_screenshots.preprocess_image(large, mode='legacy').size, (1200, 2000))
+
+
+class TestClassifier(unittest.TestCase):
+
+    def test_whole_words_and_weighted_best_category(self):
+        keywords = sort_screenshots.classifier.KeywordClassifier(sort_screenshots.DEFAULT_CATEGORIES)
+        self.assertEqual(keywords.classify("Display brightness"), ("Unsorted", 0.0))
+        # Chats outscores Finance's single hit despite coming later in the config
+        category, confidence = keywords.classify("Last seen online, pay me back")
+        self.assertEqual(category, "Chats")
+        self.assertGreater(confidence, 0.5)
+        self.assertEqual(keywords.classify("Shop\nshop SHOP order"),
+                         keywords.classify("order shop shop shop"))
+
+        custom = sort_screenshots.classifier.KeywordClassifier({"B": ["gym"], "A": {"gym": 1}})
+        self.assertEqual(custom.classify("gym"), ("A", 0.333))
+
+
+class FakeCapture:
+    """cv2.VideoCapture over a list of BGR arrays."""
+
+    def __init__(self, frames, fps=2.0):
+        self.frames, self.fps, self.pos = frames, fps, -1
+        self.retrieved = []
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return self.fps
+
+    def grab(self):
+        self.pos += 1
+        return self.pos < len(self.frames)
+
+    def retrieve(self):
+        self.retrieved.append(self.pos)
+        return True, self.frames[self.pos]
+
+    def release(self):
+        pass
+
+
+class FakeAvContainer:
+    """av container over `count` frames at `fps`, a keyframe every `gop` frames."""
+
+    def __init__(self, count, fps, gop):
+        self.count, self.fps, self.gop, self.pos = count, fps, gop, 0
+        self.decoded = []
+        stream = MagicMock(time_base=fractions.Fraction(1, fps))
+        stream.codec_context.skip_frame = "DEFAULT"
+        self.streams = MagicMock(video=[stream])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def decode(self, stream):
+        while self.pos < self.count:
+            index, self.pos = self.pos, self.pos + 1
+            if stream.codec_context.skip_frame == "NONKEY" and index % self.gop:
+                continue
+            self.decoded.append(index)
+            yield MagicMock(time=index / self.fps, width=1080, height=1920,
+                            to_image=lambda width, height: Image.new("RGB", (width, height)))
+
+    def seek(self, offset, stream):
+        self.pos = offset - offset % self.gop
+
+
+class TestVideoSampler(unittest.TestCase):
+
+    def test_single_pass_downscaled_frames(self):
+        frames = [np.full((1600, 900, 3), i, np.uint8) for i in range(20)]
+        capture = FakeCapture(frames)
+        cv2 = MagicMock(VideoCapture=lambda path: capture, cvtColor=lambda f, code: f,
+                        resize=lambda f, size, interpolation: np.zeros((size[1], size[0], 3), np.uint8))
+        with patch.dict('sys.modules', {'cv2': cv2, 'av': None}):
+            sampled = list(sort_screenshots.video_sampler.iter_frames("v.mp4", interval=2, max_frames=3))
+
+        self.assertEqual([t for t, _ in sampled], [0.0, 2.0, 4.0])
+        self.assertEqual(capture.retrieved, [0, 4, 8])
+        self.assertEqual(sampled[0][1].size, (432, 768))
+        # Stops decoding once the budget is used
+        self.assertEqual(capture.pos, 8)
+
+    def test_pyav_falls_back_to_every_frame_when_keyframes_are_sparse(self):
+        iter_frames = sort_screenshots.video_sampler.iter_frames
+        short_gop = FakeAvContainer(count=40, fps=10, gop=10)
+        with patch.dict('sys.modules', {'av': MagicMock(open=lambda path: short_gop)}):
+            sampled = list(iter_frames("v.mp4", interval=1, max_frames=10))
+        self.assertEqual([t for t, _ in sampled], [0.0, 1.0, 2.0, 3.0])
+        # Keyframes only, then the tail after the last one
+        self.assertEqual(short_gop.decoded, [0, 10, 20, 30] + list(range(30, 40)))
+
+        # One keyframe every 5s must not cut a 1s interval down to 5s
+        long_gop = FakeAvContainer(count=120, fps=10, gop=50)
+        with patch.dict('sys.modules', {'av': MagicMock(open=lambda path: long_gop)}):
+            sampled = list(iter_frames("v.mp4", interval=1, max_frames=20))
+        self.assertEqual([t for t, _ in sampled], [float(t) for t in range(12)])
+        self.assertEqual(sampled[0][1].size, (432, 768))
+
+    def test_select_distinct_skips_repeated_scenes(self):
+        rng = np.random.default_rng(0)
+        scenes = [rng.integers(0, 256, (64, 36), np.uint8) for _ in range(3)]
+
+        def frame(scene):
+            noisy = scenes[scene].astype(int) + rng.integers(-3, 4, scenes[scene].shape)
+            return Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+
+        timeline = [0] * 5 + [1] * 3 + [0] * 2 + [2] * 4
+        frames = [(float(t), frame(scene)) for t, scene in enumerate(timeline)]
+        select = sort_screenshots.video_sampler.select_distinct
+        self.assertEqual([t for t, _ in select(iter(frames), budget=10)], [0.0, 5.0, 10.0])
+        self.assertEqual([t for t, _ in select(iter(frames), budget=2)], [0.0, 5.0])
+
+
+class TestAiService(unittest.TestCase):
+
+    def test_serve_runs_each_images_prompts_back_to_back(self):
+        ai_service = sort_screenshots.ai_service
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ("a.png", "b.png")]
+            for i, path in enumerate(paths):
+                Image.new("RGB", (8, 8), (i, 0, 0)).save(path)
+            requests, results = queue.Queue(), queue.Queue()
+            requests.put((1, paths[0], (ai_service.CATEGORIZE, ai_service.OCR), ["Finance"]))
+            requests.put((2, paths[1], (ai_service.OCR,), ["Finance"]))
+            requests.put(None)
+            llm = MagicMock()
+            llm.create_chat_completion.return_value = {
+                "choices": [{"message": {"content": "Category: Finance | Summary: A bill"}}]}
+            with patch.object(ai_service, 'load_model', return_value=llm):
+                ai_service._serve(requests, results, "model", "mmproj", 1)
+
+            uris = [c.kwargs["messages"][1]["content"][0]["image_url"]["url"]
+                    for c in llm.create_chat_completion.call_args_list]
+            self.assertEqual(uris, [ai_service.image_data_uri(p) for p in (paths[0], paths[0], paths[1])])
+        self.assertEqual(results.get_nowait(), ("ready", True))
+        self.assertEqual(results.get_nowait()[:2], ("result", 1))
+        self.assertEqual(results.get_nowait()[1:], (2, {"text": "Category: Finance | Summary: A bill"}))
+        self.assertTrue(results.empty())
+
+
+class TestOcrEngine(unittest.TestCase):
+
+    def test_falls_back_to_pytesseract_and_reuses_engine(self):
+        ocr_engine = sort_screenshots.ocr_engine
+        with patch.dict('sys.modules', {'tesserocr': None}):
+            self.assertIsInstance(ocr_engine.create_engine(), ocr_engine.PytesseractEngine)
+            engine = ocr_engine.get_engine(ocr_engine.AUTO, 'test')
+        self.assertIs(ocr_engine.get_engine(ocr_engine.AUTO, 'test'), engine)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_and_touches_only_stale_hits(self):
+        result_cache = sort_screenshots.result_cache
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = result_cache.ResultCache(os.path.join(tmp, "cache.db"), max_bytes=40)
+            clock = [0]
+            with patch.object(result_cache.time, 'time_ns', side_effect=lambda: clock[0]):
+                for i, key in enumerate(["a", "b", "c"]):
+                    clock[0] = i
+                    cache.put(key, "tesseract", "v1", "x" * 10)
+                # A fresh hit leaves last_used alone, a stale one refreshes it
+                clock[0] = 3
+                cache.get("a", "tesseract", "v1")
+                clock[0] = result_cache._TOUCH_AFTER_NS + 10
+                cache.get("b", "tesseract", "v1")
+                cache.put("d", "tesseract", "v1", "x" * 10)
+
+            keys = [r[0] for r in cache.conn.execute("SELECT key FROM results ORDER BY key")]
+            self.assertEqual(keys, ["b", "c", "d"])
+            self.assertEqual(cache.total_bytes, 36)
+            cache.close()
+
+
+class TestDupIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        sort_screenshots.db_schema.migrate(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _add(self, hashes):
+        dup_index = sort_screenshots.dup_index
+        for i, h in enumerate(hashes):
+            signed = dup_index.to_signed(h)
+            row_id = self.conn.execute("INSERT INTO screenshots (filename, dhash) VALUES (?, ?)",
+                                       (f"{i}.png", signed)).lastrowid
+            dup_index.add_hash(self.conn, row_id, signed)
+
+    def _pairs(self):
+        return set(self.conn.execute("SELECT * FROM phash_pairs"))
+
+    def test_finds_every_pair_within_threshold(self):
+        dup_index = sort_screenshots.dup_index
+        base = 0x0123456789ABCDEF
+        hashes = [base, base ^ 0b1111, base ^ (1 << 63) ^ 1, base ^ 0b11111, 0xFEDCBA9876543210]
+        self._add(hashes)
+
+        expected = {tuple(sorted((dup_index.to_signed(a), dup_index.to_signed(b)))) + (bin(a ^ b).count('1'),)
+                    for i, a in enumerate(hashes) for b in hashes[i + 1:]
+                    if bin(a ^ b).count('1') <= 4}
+        self.assertEqual(self._pairs(), expected)
+
+        dup_index.rebuild(self.conn)
+        self.assertEqual(self._pairs(), expected)
+
+        self.conn.execute("DELETE FROM screenshots WHERE id = 1")
+        self.assertEqual(self.conn.execute("SELECT count(*) FROM phash_pairs WHERE ? IN (a, b)",
+                                           (dup_index.to_signed(base),)).fetchone()[0], 0)
+
+    def test_identical_hashes_form_one_cluster(self):
+        dup_index = sort_screenshots.dup_index
+        blank = 0
+        self._add([blank] * 50 + [blank ^ 0b11, 0xFFFF0000FFFF0000])
+        self.assertEqual(self.conn.execute("SELECT count(*) FROM phash_hashes").fetchone()[0], 3)
+        self.assertEqual(self._pairs(), {(0, 3, 2)})
+        self.assertEqual(self.conn.execute(
+            "SELECT count(*) FROM phash_index WHERE hash = 0").fetchone()[0], 50)
+
+        dup_index.rebuild(self.conn)
+        self.assertEqual(self._pairs(), {(0, 3, 2)})
+
+        # The cluster and its pairs go once the last member is deleted
+        self.conn.execute("DELETE FROM screenshots WHERE id <= 49")
+        self.assertEqual(self._pairs(), {(0, 3, 2)})
+        self.conn.execute("UPDATE screenshots SET dhash = NULL WHERE id = 50")
+        self.assertEqual(self._pairs(), set())
+        self.assertEqual(set(self.conn.execute("SELECT hash FROM phash_hashes")),
+                         {(3,), (dup_index.to_signed(0xFFFF0000FFFF0000),)})
+
+
+class TestDbBridge(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        db_path = os.path.join(self.tmp, "screenshots.db")
+        self.conn = sqlite3.connect(db_path)
+        sort_screenshots.db_schema.migrate(self.conn)
+        self.patches = [patch.object(db_bridge, 'DB_PATH', db_path),
+                        patch.object(db_bridge, 'SCREENSHOTS_DIR', self.tmp)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.conn.close()
+        shutil.rmtree(self.tmp)
+
+    def _add(self, rows):
+        """Insert (filename, category, created_at, amount, text) rows."""
+        self.conn.executemany(
+            '''INSERT INTO screenshots (filename, path, category, created_at, amount, text)
+               VALUES (?, '/sdcard/Pictures/Screenshots/' || ?, ?, ?, ?, ?)''',
+            [(r[0], r[0]) + tuple(r[1:]) for r in rows])
+        self.conn.commit()
+
+    def _serve(self, requests):
+        """Run db_bridge.serve() over the given requests; returns the reply lines."""
+        stdin = io.StringIO("".join(json.dumps(r) + "\n" for r in requests))
+        stdout = io.StringIO()
+        try:
+            with patch.object(sys, 'stdin', stdin), patch.object(sys, 'stdout', stdout):
+                db_bridge.serve()
+        finally:
+            db_bridge._shared_conn.close()
+            db_bridge._shared_conn = None
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_serve_replies_streams_and_releases_failed_writes(self):
+        chats = os.path.join(self.tmp, "Chats")
+        finance = os.path.join(self.tmp, "Finance")
+        os.makedirs(chats)
+        os.makedirs(finance)
+        for path in (os.path.join(chats, "x.png"), os.path.join(finance, "x.png")):
+            open(path, "wb").close()
+        self.conn.executemany('''INSERT INTO screenshots (filename, path, category, created_at)
+                                 VALUES (?, ?, ?, ?)''',
+                              [("x.png", os.path.join(chats, "x.png"), "Chats", 1),
+                               ("x_1000.png", os.path.join(finance, "x_1000.png"), "Finance", 2)])
+        self.conn.commit()
+
+        # x.png is taken in Finance, and so is the renamed x_1000.png row
+        with patch('time.time', return_value=1000):
+            replies = self._serve([
+                {"id": 1, "cmd": "move_file", "args": ["x.png", "Finance"]},
+                {"id": 2, "cmd": "get_category_files", "args": ["Chats"]},
+                {"id": 3, "cmd": "nope"},
+            ])
+
+        self.assertTrue(replies[0]["result"]["error"].startswith("DB update failed"))
+        self.assertTrue(os.path.exists(os.path.join(chats, "x.png")))
+        self.assertEqual(replies[1:], [
+            {"id": 2, "stream": "files"},
+            {"id": 2, "item": {"name": "x.png", "path": os.path.join(chats, "x.png"),
+                               "created_at": 1, "ai_summary": None, "amount": None}},
+            {"id": 2, "result": {"next_cursor": None}},
+            {"id": 3, "result": {"error": "Unknown command"}},
+        ])
+        # The failed move left no write lock behind
+        writer = sqlite3.connect(db_bridge.DB_PATH, timeout=0)
+        writer.execute("UPDATE screenshots SET amount = 1 WHERE filename = 'x.png'")
+        writer.commit()
+        writer.close()
+
+    def test_duplicates_roll_back_a_failed_index_sync(self):
+        self._add([("a.png", "Chats", 2, None, ""), ("b.png", "Chats", 1, None, "")])
+
+        def failing_sync(conn):
+            conn.execute("INSERT INTO phash_index VALUES (1, 7)")
+            raise sqlite3.OperationalError("disk I/O error")
+
+        db_bridge._shared_conn = conn = db_bridge.get_db()
+        try:
+            with patch.object(sort_screenshots.dup_index, 'sync', side_effect=failing_sync), \
+                    patch('sys.stderr', io.StringIO()) as stderr:
+                self.assertEqual(db_bridge.find_duplicates().collect(), [])
+            self.assertFalse(conn.in_transaction)
+            self.assertIn("disk I/O error", stderr.getvalue())
+        finally:
+            conn.close()
+            db_bridge._shared_conn = None
+
+    def test_search_fallback_pages_past_rows_without_a_date(self):
+        self._add([(f"{i}.png", "Chats", None if i % 3 == 0 else 1000 * (i % 4), None, "hello")
+                   for i in range(10)])
+        seen, cursor = [], None
+        while True:
+            page = db_bridge.search("", "{}", cursor, 3).collect()
+            seen += [r["filename"] for r in page["results"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(f"{i}.png" for i in range(10)))
+        self.assertEqual(len(seen), len(set(seen)))
+        # Newest first, undated rows last
+        self.assertEqual(seen[-4:], ["9.png", "6.png", "3.png", "0.png"])
+
+    def test_search_matches_category_names(self):
+        self._add([("bill.png", "Finance", 1000, 250.0, "Total due"),
+                   ("chat.png", "Chats", 2000, None, "see you at the finance meeting"),
+                   ("misc.png", "Chats", 3000, None, "hello")])
+        page = db_bridge.search("financ", "{}").collect()
+        self.assertEqual(sorted(r["filename"] for r in page["results"]), ["bill.png", "chat.png"])
+        # A moved file is found under its new category
+        self.conn.execute("UPDATE screenshots SET category = 'Finance' WHERE filename = 'misc.png'")
+        self.conn.commit()
+        page = db_bridge.search("Finance", '{"category": "Finance"}').collect()
+        self.assertEqual(sorted(r["filename"] for r in page["results"]), ["bill.png", "misc.png"])
+
+    def test_category_pages_cover_every_sort_without_gaps(self):
+        rows = [(f"f{i:02}.png", "Finance", None if i % 5 == 0 else 1000 * (i % 3),
+                 None if i % 4 == 0 else float(i % 2), "paid") for i in range(17)]
+        self._add(rows + [("other.png", "Chats", 500, 1.0, "hi")])
+        ids = dict(self.conn.execute("SELECT filename, id FROM screenshots"))
+        columns = {"created_at": 2, "filename": 0, "amount": 3}
+
+        for sort_by, (column, descending) in db_bridge._CATEGORY_SORTS.items():
+            def order(r):
+                key = r[columns[column]]
+                # NULL keys first ascending, so last descending
+                return (key is not None, key if key is not None else 0, ids[r[0]])
+            expected = [r[0] for r in sorted(rows, key=order, reverse=descending)]
+            for limit in (1, 2, 5):
+                seen, cursor = [], None
+                while True:
+                    page = db_bridge.get_category_files("Finance", sort_by, cursor, limit).collect()
+                    self.assertLessEqual(len(page["files"]), limit)
+                    seen += [f["name"] for f in page["files"]]
+                    cursor = page["next_cursor"]
+                    if cursor is None:
+                        break
+                self.assertEqual(seen, expected, f"{sort_by}, limit {limit}")
+
+    def test_knowledge_base_rewrites_only_changed_pages(self):
+        self._add([(f"k{i}.png", "Finance", 1700000000000 + i, 10.0, f"receipt {i}") for i in range(3)])
+        self.assertEqual(db_bridge.generate_kb()["written"], 3)
+        kb_dir = os.path.join(self.tmp, "knowledge_base")
+
+        def pages():
+            found = {}
+            for root, _, names in os.walk(kb_dir):
+                for name in names:
+                    if name.endswith(".md"):
+                        with open(os.path.join(root, name)) as f:
+                            found[name] = f.read()
+            return found
+
+        before = pages()
+        self.assertEqual(len(before), 3)
+        with patch.object(db_bridge, '_write_page') as write:
+            result = db_bridge.generate_kb()
+        write.assert_not_called()
+        self.assertEqual((result["count"], result["written"], result["deleted"]), (3, 0, 0))
+
+        self.conn.execute("UPDATE screenshots SET ai_summary = 'Edited summary' WHERE filename = 'k1.png'")
+        self.conn.commit()
+        self.assertEqual(db_bridge.generate_kb()["written"], 1)
+        after = pages()
+        changed = [name for name in after if after[name] != before[name]]
+        self.assertEqual(len(changed), 1)
+        self.assertIn("Edited summary", after[changed[0]])
+
+        self.conn.execute("DELETE FROM screenshots WHERE filename = 'k2.png'")
+        self.conn.commit()
+        result = db_bridge.generate_kb()
+        self.assertEqual((result["count"], result["written"], result["deleted"]), (2, 0, 1))
+        self.assertEqual(len(pages()), 2)
+
+
+class TestExpenseExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.conn = sqlite3.connect(":memory:")
+        sort_screenshots.db_schema.migrate(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.tmp)
+
+    def _add(self, name, day, amount, category="Finance"):
+        created = int(time.mktime((2026, 1, 1, 12, 0, 0, 0, 0, -1)) * 1000) + day * 86400 * 1000
+        self.conn.execute('''INSERT INTO screenshots (filename, category, text, amount, created_at)
+                             VALUES (?, ?, ?, ?, ?)''', (name, category, f"paid\n{amount}", amount, created))
+
+    def test_months_in_one_pass_and_unchanged_months_cached(self):
+        import expense_export
+        for i, day in enumerate([0, 3, 40, 75]):  # Jan, Jan, Feb, Mar
+            self._add(f"r{i}.png", day, 10.0 * (i + 1))
+        self._add("chat.png", 1, 99.0, category="Chats")
+        periods = expense_export.parse_periods("2026-01", "2026-04")
+
+        with patch.object(expense_export, 'BATCH_ROWS', 2):
+            files = expense_export.export(self.conn, periods, self.tmp)
+        self.assertEqual([(f["name"], f["count"], f["cached"]) for f in files],
+                         [("expenses_2026-01.csv", 2, False), ("expenses_2026-02.csv", 1, False),
+                          ("expenses_2026-03.csv", 1, False), ("expenses_2026-04.csv", 0, False)])
+        with open(os.path.join(self.tmp, "expenses_2026-01.csv")) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "Date,Amount,Filename,Summary,Text Snippet")
+        self.assertEqual([line.split(",")[1:3] for line in lines[1:]],
+                         [["10.0", "r0.png"], ["20.0", "r1.png"]])
+
+        self.conn.execute("UPDATE screenshots SET amount = 25.0 WHERE filename = 'r2.png'")
+        files = expense_export.export(self.conn, periods, self.tmp)
+        self.assertEqual([f["cached"] for f in files], [True, False, True, True])
+        with open(os.path.join(self.tmp, "expenses_2026-02.csv")) as f:
+            self.assertIn(",25.0,r2.png,", f.read())
+
+        self.assertEqual(expense_export.export(
+            self.conn, expense_export.parse_periods("2026-01-02", "2026-02-28"), self.tmp)[0]["count"], 2)
+        self.assertFalse([n for n in os.listdir(self.tmp) if n.endswith(".tmp")])
+
+    def test_fingerprint_cache_rewrites_only_on_revision_change(self):
+        import expense_export
+        self._add("r0.png", 2, 12.5)
+        self._add("r1.png", 5, 7.0)
+        periods = expense_export.parse_periods("2026-01")
+        [first] = expense_export.export(self.conn, periods, self.tmp)
+        self.assertFalse(first["cached"])
+
+        with patch.object(expense_export, 'CsvWriter') as writer:
+            [again] = expense_export.export(self.conn, periods, self.tmp)
+        writer.assert_not_called()
+        self.assertEqual((again["cached"], again["count"]), (True, 2))
+
+        # Same count and max id, different revision sum
+        self.conn.execute("UPDATE screenshots SET ai_summary = 'Coffee' WHERE filename = 'r0.png'")
+        self.assertEqual(self.conn.execute(
+            "SELECT revision FROM screenshots WHERE filename = 'r0.png'").fetchone()[0], 1)
+        [rewritten] = expense_export.export(self.conn, periods, self.tmp)
+        self.assertFalse(rewritten["cached"])
+        with open(rewritten["path"]) as f:
+            self.assertIn(",12.5,r0.png,Coffee,", f.read())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,238 @@
+"""Batched, cached translation of OCR text.
+
+Screenshot text is split into line segments, and every segment is cached
+in result_cache.py under (source language, BLAKE2b of the segment). The
+app chrome, chat headers and button labels that recur across thousands
+of screenshots are therefore translated once. Segments still missing are
+collected across a whole batch of screenshots, de-duplicated and sent to
+the backend in chunks of BATCH_SEGMENTS. Each chunk is one call, not one
+call per screenshot.
+
+Backends:
+
+- GOOGLE: googletrans, with one Translator (and its HTTP session) kept for
+  the life of the process.
+- ARGOS: Argos Translate, an offline model that runs in this process
+  (pip install argostranslate, plus the language packages).
+- any http(s):// URL: a LibreTranslate-compatible server, such as a
+  self-hosted LibreTranslate or a stub in tests. Segments are POSTed to
+  <url>/translate as {"q": [...], "source", "target"}.
+
+Language detection uses one langdetect profile set. It is loaded once and
+seeded, so the same text always gets the same language.
+"""
+import hashlib
+import json
+import logging
+import urllib.request
+
+GOOGLE = "google"
+ARGOS = "argos"
+
+# Segments per backend call
+BATCH_SEGMENTS = 64
+
+_detector = None
+
+
+def normalize_segment(line):
+    return " ".join(line.split())
+
+
+def _translatable(segment):
+    """Segments without letters (amounts, times, IDs) are kept as they are."""
+    return len(segment) > 1 and any(c.isalpha() for c in segment)
+
+
+def segments(text):
+    """Translatable segments of text: its non-blank lines, whitespace collapsed."""
+    for line in (text or "").splitlines():
+        segment = normalize_segment(line)
+        if _translatable(segment):
+            yield segment
+
+
+def segment_key(segment):
+    """BLAKE2b-128 hex digest of a segment."""
+    return hashlib.blake2b(segment.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LanguageDetector:
+    """langdetect with its language profiles loaded once."""
+
+    def __init__(self, seed=0):
+        from langdetect import DetectorFactory
+        from langdetect.detector_factory import PROFILES_DIRECTORY
+        from langdetect.lang_detect_exception import LangDetectException
+        DetectorFactory.seed = seed
+        self.factory = DetectorFactory()
+        self.factory.load_profile(PROFILES_DIRECTORY)
+        self._error = LangDetectException
+
+    def detect(self, text):
+        """Language code of text, or None when there is nothing to go on."""
+        detector = self.factory.create()
+        detector.append(text)
+        try:
+            return detector.detect()
+        except self._error:
+            return None
+
+
+def get_detector():
+    """The process-wide LanguageDetector, or None if langdetect is missing."""
+    global _detector
+    if _detector is None:
+        try:
+            _detector = LanguageDetector()
+        except ImportError:
+            logging.warning("langdetect not installed. Install with: pip install langdetect")
+            _detector = False
+    return _detector or None
+
+
+class GoogleBackend:
+    name = GOOGLE
+
+    def __init__(self):
+        from googletrans import Translator
+        self.translator = Translator()
+
+    def translate(self, batch, source, target):
+        return [r.text for r in self.translator.translate(batch, src=source or "auto", dest=target)]
+
+
+class ArgosBackend:
+    """Offline translation with the installed Argos Translate packages."""
+
+    name = ARGOS
+
+    def __init__(self):
+        import argostranslate.translate
+        self._module = argostranslate.translate
+        self._models = {}
+
+    def translate(self, batch, source, target):
+        model = self._models.get((source, target))
+        if model is None:
+            model = self._models[(source, target)] = \
+                self._module.get_translation_from_codes(source, target)
+        return [model.translate(segment) for segment in batch]
+
+
+class HttpBackend:
+    """LibreTranslate-compatible translation server."""
+
+    def __init__(self, url, timeout=30):
+        url = url.rstrip("/")
+        self.url = url if url.endswith("/translate") else url + "/translate"
+        self.name = f"http:{self.url}"
+        self.timeout = timeout
+
+    def translate(self, batch, source, target):
+        body = json.dumps({"q": batch, "source": source or "auto",
+                           "target": target, "format": "text"}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            translated = json.load(response)["translatedText"]
+        return [translated] if isinstance(translated, str) else translated
+
+
+def create_backend(spec=GOOGLE):
+    """Backend for a SCREENSORT_TRANSLATE_BACKEND value, or None if unavailable."""
+    if spec.startswith(("http://", "https://")):
+        return HttpBackend(spec)
+    if spec == ARGOS:
+        try:
+            return ArgosBackend()
+        except ImportError:
+            logging.warning("argostranslate not installed. "
+                            "Install with: pip install argostranslate")
+            return None
+    if spec != GOOGLE:
+        logging.warning(f"Unknown translation backend '{spec}'; using googletrans.")
+    try:
+        return GoogleBackend()
+    except ImportError:
+        logging.warning("googletrans not installed. "
+                        "Install with: pip install googletrans==4.0.0-rc1")
+        return None
+
+
+class Translator:
+    """Translate many texts at once through a segment cache.
+
+    cache is a result_cache.ResultCache, or None to cache only within a
+    call. Entries are versioned by backend name, so switching backends
+    does not reuse the previous backend's output.
+    """
+
+    def __init__(self, backend, cache=None, target="en", batch_size=BATCH_SEGMENTS):
+        self.backend = backend
+        self.cache = cache
+        self.target = target
+        self.batch_size = batch_size
+
+    def _kind(self, source):
+        return f"translate:{source}>{self.target}"
+
+    def _translate_missing(self, source, missing, known):
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            try:
+                translated = self.backend.translate(batch, source, self.target)
+            except Exception as e:
+                logging.error(f"Translation failed ({self.backend.name}, {source}): {e}")
+                return
+            if len(translated) != len(batch):
+                logging.error(f"Translation backend returned {len(translated)} "
+                              f"segments for {len(batch)}")
+                return
+            for segment, result in zip(batch, translated):
+                known[(source, segment)] = result
+                if self.cache is not None:
+                    self.cache.put(segment_key(segment), self._kind(source),
+                                   self.backend.name, result)
+
+    def translate_many(self, items):
+        """Translate (text, source_lang) pairs; returns one result per pair.
+
+        A result is the text with every translatable line replaced by
+        its translation, or None if the backend failed on one of them.
+        """
+        known = {}
+        missing = {}
+        for text, source in items:
+            for segment in segments(text):
+                if (source, segment) in known:
+                    continue
+                hit = None
+                if self.cache is not None:
+                    hit = self.cache.get(segment_key(segment), self._kind(source),
+                                         self.backend.name)
+                known[(source, segment)] = hit
+                if hit is None:
+                    missing.setdefault(source, []).append(segment)
+
+        for source, batch in missing.items():
+            self._translate_missing(source, batch, known)
+        sent = sum(len(batch) for batch in missing.values())
+        if known:
+            logging.info(f"Translation: {len(known) - sent} of {len(known)} distinct "
+                         f"segments cached, {sent} sent to {self.backend.name}")
+
+        results = []
+        for text, source in items:
+            lines = []
+            for line in (text or "").splitlines():
+                segment = normalize_segment(line)
+                if not _translatable(segment):
+                    lines.append(line)
+                elif known[(source, segment)] is None:
+                    lines = None
+                    break
+                else:
+                    lines.append(known[(source, segment)])
+            results.append("\n".join(lines) if lines is not None else None)
+        return results
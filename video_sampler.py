@@ -0,0 +1,194 @@
+"""Single-pass video frame sampler.
+
+Seeking to every sampled frame makes the decoder restart from the
+previous keyframe each time, which on long-GOP phone videos decodes most
+of the file several times over. iter_frames() instead walks the video
+once and yields one downscaled frame at a time, so at most one frame is
+held in memory whatever the video length:
+
+- with PyAV (pip install av) only keyframes are decoded while they are
+  at most `interval` apart; a sample is taken from the first keyframe at
+  or after each sampling time, so the interval is a minimum spacing. On
+  the first wider gap (screen recordings often have one keyframe every
+  few seconds or more), or after the last keyframe, it seeks back to the
+  previous keyframe and decodes every frame from there on.
+- with OpenCV every frame is grab()bed sequentially (decoded, but not
+  converted) and only the sampled ones are retrieved and converted.
+
+Decode throughput is logged when the generator finishes or is closed.
+
+select_distinct() sits between the sampler and the model: it keeps a
+64-bit dHash of every frame it has passed on and drops candidates within
+a few bits of any of them, so a screen recording that sits on the same
+screen for a minute costs one inference, not twelve.
+"""
+import logging
+import time
+
+import numpy as np
+from PIL import Image
+
+import dup_index
+import image_hashing
+
+AUTO = "auto"
+PYAV = "pyav"
+OPENCV = "opencv"
+
+# Frames are downscaled to this longest side; Moondream looks at 378px
+FRAME_SIDE = 768
+# Candidates within this many dHash bits of an analyzed frame are skipped
+SCENE_THRESHOLD = 10
+
+
+def _target_size(width, height, max_side):
+    scale = min(1.0, max_side / max(width, height, 1))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _pyav_frames(video_path, interval, max_frames, max_side, stats):
+    import av
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = "NONKEY"
+        keyframes_only = True
+        last_key = None
+        next_time = 0.0
+        while True:
+            for frame in container.decode(stream):
+                stats["decoded"] += 1
+                seconds = frame.time
+                if seconds is None:
+                    continue
+                if keyframes_only:
+                    if last_key is not None and seconds - last_key > interval:
+                        break
+                    last_key = seconds
+                if seconds + 1e-3 < next_time:
+                    continue
+                width, height = _target_size(frame.width, frame.height, max_side)
+                yield seconds, frame.to_image(width=width, height=height)
+                stats["sampled"] += 1
+                if stats["sampled"] >= max_frames:
+                    return
+                next_time = seconds + interval
+            if not keyframes_only or last_key is None:
+                return
+            # Keyframes sparser than the interval (a long-GOP screen
+            # recording), or a tail after the last one: decode every frame
+            # from the last keyframe on
+            keyframes_only = False
+            stream.codec_context.skip_frame = "DEFAULT"
+            container.seek(round(last_key / stream.time_base), stream=stream)
+
+
+def _opencv_frames(video_path, interval, max_frames, max_side, stats):
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            logging.warning(f"Could not open video: {video_path}")
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps * interval))
+        index = 0
+        while cap.grab():
+            stats["decoded"] += 1
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    height, width = frame.shape[:2]
+                    size = _target_size(width, height, max_side)
+                    if size != (width, height):
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    yield index / fps, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    stats["sampled"] += 1
+                    if stats["sampled"] >= max_frames:
+                        return
+            index += 1
+    finally:
+        cap.release()
+
+
+def _backend(name):
+    if name in (AUTO, PYAV):
+        try:
+            import av  # noqa: F401
+            return PYAV
+        except ImportError:
+            if name == PYAV:
+                logging.warning("PyAV not installed. Install with: pip install av")
+    try:
+        import cv2  # noqa: F401
+        return OPENCV
+    except ImportError:
+        logging.warning("opencv-python not installed. "
+                        "Install with: pip install opencv-python")
+        return None
+
+
+def iter_frames(video_path, interval, max_frames, max_side=FRAME_SIDE, backend=AUTO):
+    """Yield (seconds, PIL RGB image) about every `interval` seconds.
+
+    Yields at most max_frames frames, each no larger than max_side on
+    its longest side. Yields nothing if no decoder is installed or the
+    video cannot be read.
+    """
+    backend = _backend(backend)
+    if backend is None:
+        return
+    stats = {"decoded": 0, "sampled": 0}
+    frames = (_pyav_frames if backend == PYAV else _opencv_frames)(
+        video_path, interval, max_frames, max_side, stats)
+    # Only time spent decoding counts, not the caller's work between frames
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(frames)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.monotonic() - started
+            yield item
+    except Exception as e:
+        logging.error(f"Video frame extraction failed: {e}")
+    finally:
+        frames.close()
+        logging.info(f"Sampled {stats['sampled']} frames from {video_path} "
+                     f"({backend}, {stats['decoded']} decoded in {elapsed:.1f}s, "
+                     f"{stats['decoded'] / max(elapsed, 1e-6):.0f} frames/s)")
+
+
+def frame_signature(image):
+    """Unsigned 64-bit dHash of a frame."""
+    pixels = np.asarray(image.convert('L').resize(
+        (image_hashing.HASH_SIZE + 1, image_hashing.HASH_SIZE), Image.Resampling.BOX))
+    return dup_index.parse_hash(int(image_hashing.dhash_batch(pixels[None])[0]))
+
+
+def select_distinct(frames, budget, threshold=SCENE_THRESHOLD):
+    """Pass on at most `budget` visually distinct frames from (seconds, image) pairs.
+
+    A frame is kept when its dHash differs from every frame kept so far by
+    more than `threshold` bits. Selection is greedy and streaming, so
+    frames reach the model as they are decoded; the source is closed
+    once the budget is used up.
+    """
+    kept = []
+    seen = 0
+    try:
+        for seconds, image in frames:
+            seen += 1
+            signature = frame_signature(image)
+            if all(dup_index.hamming(signature, k) > threshold for k in kept):
+                kept.append(signature)
+                yield seconds, image
+                if len(kept) >= budget:
+                    return
+    finally:
+        close = getattr(frames, "close", None)
+        if close is not None:
+            close()
+        logging.info(f"Selected {len(kept)} distinct of {seen} candidate frames")